@@ -5,24 +5,137 @@ Chatbot Identity: Tohin - Personal Wine Concierge
 """
 
 import os
+import re
 import json
+import time
+import asyncio
+import inspect
+import threading
 import requests
-from typing import List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-import chromadb
-import google.generativeai as genai
 import logging
 
+from batching import MicroBatcher, SingleFlight
+from cache import EmbeddingCache, SemanticCache, StaleWhileRevalidateCache, TTLCache
+from config import (
+    BM25_INDEX_PATH, CHROMA_DB_PATH, EMBEDDING_CACHE_PATH, EMBEDDING_MODEL, FACTS_PATH, INTENT_KEYWORDS_PATH,
+    NUMPY_INDEX_PATH, SEMANTIC_CACHE_PATH, TRACE_PATH, check_embedding_metadata,
+    read_active_collection, read_index_version
+)
+from facts import FILLER_WORDS, FactIndex, tokenize
+from generation import (
+    STANDARD_MODEL, TRUNCATED_FINISH_REASONS, GenerationProfile, GenerationRouter, GenerationStats,
+    finish_reason, output_tokens
+)
+from intents import IntentClassifier, keyword_pattern
+from memory import ConversationMemory, estimate_tokens, format_turns
+from prompt import PromptBuilder
+from resilience import (
+    Bulkhead, BulkheadFull, CircuitBreaker, CircuitOpenError, DeadlineExceeded, HedgeBudget, Hedger,
+    await_with_timeout, caller_deadline, deadline_scope, degradation_scope, is_degraded, mark_degraded,
+    run_with_timeout, stage_timeout
+)
+from retrieval import BM25Index, ChromaRetriever, HybridRetriever, NumpyRetriever
+from tracing import Tracer, in_context
+
+# Heavy SDKs are imported on first use; see NapaValleyConciergeChatbot.genai and _get_async_client()
+if TYPE_CHECKING:
+    import httpx
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Fallback replies shown when a request cannot be completed
+GENERATION_ERROR_MESSAGE = "Hi, I'm Tohin, your personal concierge! I'm having trouble processing your request right now. Please try again or contact us directly at (707) 555-WINE."
+CHAT_ERROR_MESSAGE = "Hi, I'm Tohin! I apologize for the inconvenience. Please try rephrasing your question or contact us directly at info@napavalleypremiumwines.com."
+NEWS_ERROR_MESSAGE = "I'm sorry, I couldn't retrieve the latest information at this time."
+
+# Question sent to Perplexity for news queries that mention a pre-warmed topic
+NEWS_TOPIC_QUERY = "What's the latest news on Napa Valley {topic}?"
+
+# Words that add nothing to a topic question beyond what NEWS_TOPIC_QUERY already asks
+GENERIC_NEWS_WORDS = {
+    'news', 'latest', 'recent', 'new', 'current', 'upcoming', 'coming', 'up', 'happening', 'going', 'in', 'around',
+    'napa', 'valley', 'local', 'area', 'update', 'updates', 'have', 'has', 'been',
+}
+
+# External service endpoints
+PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
+OPENWEATHERMAP_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+# Upstream responses worth retrying with backoff
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+TOHIN_IDENTITY_CONTEXT = "You are Tohin, a friendly personal wine concierge at Napa Valley Premium Wines. You help visitors discover the best of Napa Valley wines and experiences."
+
+# External dependencies guarded by a circuit breaker, with the longest one call may take (seconds)
+UPSTREAM_TIMEOUTS = {
+    'gemini': 20.0,
+    'embedding': 5.0,
+    'chroma': 5.0,
+    'perplexity': 30.0,
+    'openweathermap': 10.0,
+}
+
+# Threads each dependency may tie up with blocking calls, so one slow upstream can't starve the others
+UPSTREAM_WORKERS = {
+    'gemini': 16,
+    'embedding': 8,
+    'chroma': 4,
+    'perplexity': 8,
+    'openweathermap': 4,
+}
+
+# Calls each dependency may queue per worker before further calls are refused
+UPSTREAM_QUEUE_FACTOR = 8
+
+# Dependencies whose requests are safe to duplicate when hedging is turned on
+HEDGEABLE_DEPENDENCIES = ('gemini', 'perplexity')
+
+# Intents in the order their persona takes precedence for multi-intent queries
+INTENT_PRIORITY = ['business', 'weather', 'news', 'chitchat']
+
+# Context sources consulted for each intent
+CONTEXT_SOURCES = {
+    'business': ['knowledge'],
+    'weather': ['weather'],
+    'news': ['news'],
+    'chitchat': ['identity'],
+}
+
+# News keywords that only say when, which a lookup like "what are your hours today?" uses too
+NEWS_TIME_WORDS = {'today', 'current', 'currently'}
+
+# Intents whose answers come only from the knowledge base and are safe to reuse
+CACHEABLE_INTENTS = {'business'}
+
+# Section headings used when several sources are merged into one context
+CONTEXT_SOURCE_LABELS = {
+    'knowledge': 'Business Information',
+    'weather': 'Weather',
+    'news': 'Latest News',
+    'identity': 'About Tohin',
+}
+
+# Context used in place of a source that didn't answer within the request deadline
+UNAVAILABLE_CONTEXT = {
+    'knowledge': "No specific information found in knowledge base.",
+    'weather': "Weather data is unavailable right now.",
+    'news': "The latest news is unavailable right now.",
+    'identity': TOHIN_IDENTITY_CONTEXT,
+}
+
 
 class NapaValleyConciergeChatbot:
     """Main chatbot class that handles conversation and query routing."""
 
-    def __init__(self):
-        """Initialize the chatbot with all necessary services."""
+    def __init__(self, warm_up: Optional[bool] = None):
+        """Initialize the chatbot; backends connect on first use or in a background warm-up."""
         load_dotenv()
 
         # Initialize API keys
@@ -32,285 +145,1578 @@ class NapaValleyConciergeChatbot:
         if not self.gemini_api_key:
             raise ValueError("GEMINI_API_KEY is required!")
 
-        # Configure Gemini
-        genai.configure(api_key=self.gemini_api_key)
-        self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-
-        # Initialize ChromaDB
-        self.setup_chromadb()
+        # Per-stage latency tracing; TRACE_FILE= (empty) keeps only the in-memory histograms
+        self.tracer = Tracer(os.getenv('TRACE_FILE', TRACE_PATH) or None)
+        metrics_port = os.getenv('METRICS_PORT')
+        if metrics_port:
+            self.tracer.serve_metrics(int(metrics_port), os.getenv('METRICS_HOST', '127.0.0.1'))
+
+        # Backends built on first use, so the first page renders without waiting for them
+        self._init_lock = threading.RLock()
+        self._genai = None
+        self._gemini_model = None
+        self._gemini_model_assigned = False
+        self._models = {}
+        self._http_session = None
+        self._retriever = None
+        self._retriever_loaded = False
+        # Why the knowledge base couldn't be searched, reported by the health check
+        self.retriever_error = None
+        self.knowledge_index_version = None
+        self.warm_up_thread = None
+        self.news_prewarm_thread = None
+
+        # Knowledge base search backend ('chroma' or 'numpy')
+        self.retriever_backend = os.getenv('RETRIEVER_BACKEND', 'chroma').lower()
+        self.hybrid_retrieval = os.getenv('HYBRID_RETRIEVAL', 'true').lower() in ('1', 'true', 'yes')
+
+        # Per-intent model, sampling settings and stop sequences, with escalation from the fast model
+        self.generation_router = GenerationRouter.load(
+            os.getenv('GENERATION_PROFILES_PATH') or None,
+            tiering=os.getenv('MODEL_TIERING', 'true').lower() in ('1', 'true', 'yes')
+        )
+        self.profile_stats = GenerationStats()
+
+        # Intent classifier compiled once from the keyword config
+        self.intent_classifier = IntentClassifier.load(os.getenv('INTENT_KEYWORDS_PATH', INTENT_KEYWORDS_PATH))
+        self.intent_embedding_fallback = os.getenv('INTENT_EMBEDDING_FALLBACK', 'false').lower() in ('1', 'true', 'yes')
+        self.intent_similarity_threshold = float(os.getenv('INTENT_SIMILARITY_THRESHOLD', '0.65'))
+
+        # Token-budgeted prompts; the static system prompt travels as a system instruction when supported
+        self.prompt_builder = PromptBuilder()
+        self.system_instruction = os.getenv('SYSTEM_INSTRUCTION', 'true').lower() in ('1', 'true', 'yes')
+
+        # Templated answers for simple lookups (hours, contacts, prices) from facts ingest.py extracted
+        self.fast_path = os.getenv('FAST_PATH', 'true').lower() in ('1', 'true', 'yes')
+        self.fast_path_min_confidence = float(os.getenv('FAST_PATH_MIN_CONFIDENCE', '0.8'))
+        self._facts = None
+        self._facts_mtime = None
+
+        # Weather readings shared across sessions, keyed by location
+        self.weather_cache = TTLCache(
+            ttl_seconds=float(os.getenv('WEATHER_CACHE_TTL_SECONDS', '600')),
+            max_entries=int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '64'))
+        )
+
+        # Perplexity answers shared across sessions, keyed by topic or normalized query; stale
+        # answers are served immediately while a background refresh fetches a new one
+        self.news_cache = StaleWhileRevalidateCache(
+            soft_ttl_seconds=float(os.getenv('NEWS_CACHE_SOFT_TTL_SECONDS', '600')),
+            hard_ttl_seconds=float(os.getenv('NEWS_CACHE_HARD_TTL_SECONDS', '3600')),
+            max_entries=int(os.getenv('NEWS_CACHE_MAX_ENTRIES', '256')),
+            name='news-refresh'
+        )
+
+        # Common news topics kept warm on a schedule once the backends warm up
+        self.news_topics = []
+        for topic in os.getenv('NEWS_PREWARM_TOPICS', 'events,festivals,harvest').split(','):
+            topic = topic.strip().lower()
+            if topic:
+                singular = topic[:-1] if topic.endswith('s') else topic
+                self.news_topics.append((topic, re.compile(rf"\b{keyword_pattern(singular)}(?:e?s)?\b", re.IGNORECASE)))
+        self.news_prewarm_interval = float(os.getenv('NEWS_PREWARM_INTERVAL_SECONDS', '300'))
+
+        # Memoized query embeddings, persisted across restarts
+        self.embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_PATH,
+            max_memory_entries=int(os.getenv('EMBEDDING_CACHE_MEMORY_ENTRIES', '2048')),
+            max_disk_entries=int(os.getenv('EMBEDDING_CACHE_DISK_ENTRIES', '100000'))
+        )
+
+        # Merge concurrent query embeddings into one batched API call; worthwhile under concurrent load
+        self.embedding_batcher = None
+        if os.getenv('EMBEDDING_BATCHING', 'false').lower() in ('1', 'true', 'yes'):
+            self.embedding_batcher = MicroBatcher(
+                self.embed_queries,
+                max_batch_size=int(os.getenv('EMBEDDING_BATCH_SIZE', '32')),
+                max_wait_ms=float(os.getenv('EMBEDDING_BATCH_WAIT_MS', '5')),
+                name='embedding-batcher'
+            )
 
-        # Configuration
-        self.temperature = 0.7
-        self.max_tokens = 1000
+        # Identical requests already in flight share one computation instead of each calling upstream
+        self.single_flight = SingleFlight()
+
+        # Answers to earlier business questions, matched by query embedding
+        self.response_cache = SemanticCache(
+            SEMANTIC_CACHE_PATH,
+            threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92')),
+            ttl_seconds=float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', '86400')),
+            max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000')),
+            version_fn=read_index_version
+        )
+
+        # Shared pool for fetching context sources in parallel
+        self.context_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CONTEXT_FETCH_WORKERS', '8')),
+            thread_name_prefix='context-fetch'
+        )
+
+        # Conversation summaries are slow Gemini calls, so they get their own small pool rather than
+        # tying up the context fetches that every turn waits on
+        self.compaction_executor = Bulkhead(
+            'memory-compaction',
+            int(os.getenv('MEMORY_COMPACTION_WORKERS', '2')),
+            int(os.getenv('MEMORY_COMPACTION_MAX_QUEUED', '32'))
+        )
+
+        # Per-session conversation memory, dropped after a period of inactivity
+        self.memory_token_budget = int(os.getenv('MEMORY_TOKEN_BUDGET', '1200'))
+        self.memory_recent_turns = int(os.getenv('MEMORY_RECENT_TURNS', '3'))
+        self.sessions = TTLCache(
+            ttl_seconds=float(os.getenv('SESSION_TTL_SECONDS', '21600')),
+            max_entries=int(os.getenv('SESSION_MAX_ENTRIES', '1000'))
+        )
+        self.sessions_lock = threading.Lock()
+
+        # Pooled keep-alive HTTP connections for Perplexity and OpenWeatherMap
+        self.http_pool_size = int(os.getenv('HTTP_POOL_SIZE', '10'))
+        self.http_max_retries = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+        self.http_backoff_factor = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+
+        # Circuit breakers and per-call timeouts for every external dependency
+        self.upstream_timeouts = {
+            name: float(os.getenv(f"{name.upper()}_TIMEOUT_SECONDS", str(timeout)))
+            for name, timeout in UPSTREAM_TIMEOUTS.items()
+        }
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                failure_threshold=float(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '0.5')),
+                min_calls=int(os.getenv('CIRCUIT_MIN_CALLS', '5')),
+                window_size=int(os.getenv('CIRCUIT_WINDOW_SIZE', '20')),
+                open_seconds=float(os.getenv('CIRCUIT_OPEN_SECONDS', '30'))
+            )
+            for name in UPSTREAM_TIMEOUTS
+        }
+
+        # Time budget for a whole chat turn (0 disables it); context fetching gets a share, generation the rest
+        self.request_deadline = float(os.getenv('REQUEST_DEADLINE_SECONDS', '25'))
+        self.context_deadline_share = float(os.getenv('CONTEXT_DEADLINE_SHARE', '0.4'))
+
+        # Opt-in backup requests for slow Gemini and Perplexity calls, capped by a shared budget
+        self.hedge_budget = HedgeBudget(max_rate=float(os.getenv('HEDGE_MAX_RATE', '0.05')))
+        self.hedgers = {}
+        for name in os.getenv('HEDGE_DEPENDENCIES', '').split(','):
+            name = name.strip().lower()
+            if name in HEDGEABLE_DEPENDENCIES:
+                self.hedgers[name] = Hedger(
+                    name,
+                    self.hedge_budget,
+                    percentile=float(os.getenv('HEDGE_PERCENTILE', '0.95')),
+                    min_samples=int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+                )
+            elif name:
+                logger.warning(f"Ignoring HEDGE_DEPENDENCIES entry {name!r}; only {', '.join(HEDGEABLE_DEPENDENCIES)} can be hedged")
+
+        # Blocking SDK calls run on their dependency's own pool so a caller can stop waiting once they
+        # overrun their timeout without a hung dependency starving the others of threads. Queued calls
+        # hold no thread and are dropped when their caller's timeout runs out, so bursts queue rather
+        # than being refused
+        self.bulkheads = {}
+        for name, workers in UPSTREAM_WORKERS.items():
+            workers = int(os.getenv(f"{name.upper()}_WORKERS", str(workers)))
+            max_queued = int(os.getenv(f"{name.upper()}_MAX_QUEUED", str(workers * UPSTREAM_QUEUE_FACTOR)))
+            self.bulkheads[name] = Bulkhead(name, workers, max_queued)
+
+        # Async HTTP client for achat(), created on first use
+        self.async_http_client = None
+        self.async_http_retries = 0
 
         logger.info("Tohin - Napa Valley Concierge Chatbot initialized successfully!")
 
+        if warm_up is None:
+            warm_up = os.getenv('WARM_UP', 'false').lower() in ('1', 'true', 'yes')
+        if warm_up:
+            self.start_warm_up()
+
+    @property
+    def genai(self):
+        """The Gemini SDK, imported and configured on first use."""
+        if self._genai is None:
+            with self._init_lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.gemini_api_key)
+                    self._genai = genai
+        return self._genai
+
+    @property
+    def gemini_model(self):
+        """The standard Gemini model, created on first use."""
+        if self._gemini_model is None:
+            self._gemini_model = self.generative_model(STANDARD_MODEL)
+        return self._gemini_model
+
+    @gemini_model.setter
+    def gemini_model(self, model):
+        # An assigned model (e.g. a benchmark stub) answers every profile and gets the full prompt
+        self._gemini_model = model
+        self._gemini_model_assigned = True
+
+    def generative_model(self, model_name: str, intent: Optional[str] = None):
+        """Gemini model by name, carrying the intent's system prompt if one is given; created on first use."""
+        key = (model_name, intent)
+        model = self._models.get(key)
+        if model is None:
+            with self._init_lock:
+                model = self._models.get(key)
+                if model is None:
+                    options = {'system_instruction': self.prompt_builder.system_prompt(intent)} if intent else {}
+                    model = self._models[key] = self.genai.GenerativeModel(model_name, **options)
+        return model
+
+    def uses_system_instruction(self) -> bool:
+        """Whether system prompts travel as system instructions, which needs a recent enough Gemini SDK."""
+        if self.system_instruction and 'system_instruction' not in inspect.signature(self.genai.GenerativeModel).parameters:
+            logger.info("Gemini SDK has no system instructions; sending system prompts inline")
+            self.system_instruction = False
+        return self.system_instruction
+
+    @property
+    def http_session(self) -> requests.Session:
+        """The pooled HTTP session for Perplexity and OpenWeatherMap, created on first use."""
+        if self._http_session is None:
+            with self._init_lock:
+                if self._http_session is None:
+                    self._http_session = self._create_http_session()
+        return self._http_session
+
+    @property
+    def retriever(self):
+        """The knowledge base search backend, connected on first use; None if it is unavailable."""
+        if not self._retriever_loaded:
+            self.refresh_knowledge_base()
+        return self._retriever
+
+    @retriever.setter
+    def retriever(self, retriever):
+        self._retriever = retriever
+
+    def warm_up(self):
+        """Build every backend now rather than on the first message that needs it."""
+        started_at = time.perf_counter()
+        try:
+            self.gemini_model
+            self.http_session
+            self.refresh_knowledge_base()
+            logger.info(f"Backends warmed up in {time.perf_counter() - started_at:.2f}s")
+        except Exception as e:
+            logger.error(f"Error warming up backends: {e}")
+
+        self.start_news_prewarm()
+
+    def start_warm_up(self) -> threading.Thread:
+        """Warm up the backends on a background thread so the caller can start serving immediately."""
+        with self._init_lock:
+            if self.warm_up_thread is None:
+                self.warm_up_thread = threading.Thread(target=self.warm_up, name='warm-up', daemon=True)
+                self.warm_up_thread.start()
+        return self.warm_up_thread
+
+    def backend_status(self) -> dict:
+        """Report which lazily built backends are ready."""
+        warm_up_thread = self.warm_up_thread
+        return {
+            'gemini': self._gemini_model is not None,
+            'retriever': type(self._retriever).__name__ if self._retriever is not None else None,
+            'retriever_error': self.retriever_error,
+            'http_session': self._http_session is not None,
+            'warming_up': warm_up_thread is not None and warm_up_thread.is_alive(),
+            'news_prewarm': self.news_prewarm_thread is not None,
+            'circuits': {name: breaker.state for name, breaker in self.breakers.items()},
+        }
+
+    def call_upstream(self, dependency: str, fn, timeout: Optional[float] = None):
+        """Call a dependency through its circuit breaker, giving up once the call overruns its timeout.
+
+        The timeout defaults to the dependency's own, shortened to what is left
+        of the request deadline. Hedged dependencies may get a backup request.
+        Only the dependency's own errors and timeouts count against its circuit.
+        """
+        own_timeout = self.upstream_timeouts[dependency]
+        if timeout is None:
+            timeout = stage_timeout(own_timeout)
+        hedger = self.hedgers.get(dependency)
+
+        def attempt():
+            with caller_deadline(timeout, own_timeout):
+                if hedger is not None:
+                    return hedger.call(self.bulkheads[dependency], fn, timeout)
+                return run_with_timeout(self.bulkheads[dependency], in_context(fn), timeout)
+
+        return self.breakers[dependency].call(attempt)
+
+    async def acall_upstream(self, dependency: str, coro_fn, timeout: Optional[float] = None):
+        """Async variant of call_upstream(); the call is cancelled when it overruns."""
+        own_timeout = self.upstream_timeouts[dependency]
+        if timeout is None:
+            timeout = stage_timeout(own_timeout)
+        hedger = self.hedgers.get(dependency)
+
+        async def attempt():
+            with caller_deadline(timeout, own_timeout):
+                if hedger is not None:
+                    return await hedger.acall(coro_fn, timeout)
+                return await await_with_timeout(coro_fn(), timeout)
+
+        return await self.breakers[dependency].acall(attempt)
+
+    def setup_retriever(self):
+        """Set up the configured knowledge base search backend."""
+        version = read_index_version()
+        retriever = None
+        error = None
+        try:
+            retriever = self.build_retriever()
+            if retriever is None:
+                error = (f"The {self.retriever_backend} knowledge base could not be loaded. "
+                         f"Run `python ingest.py` to build it.")
+        except ValueError as e:
+            # The message says how to fix it, e.g. `python ingest.py --migrate` after an embedding model change
+            error = str(e)
+            logger.error(f"Knowledge base is unusable: {e}")
+        finally:
+            # Published only once loading finished, so concurrent readers never see a half-built backend
+            self.retriever = retriever
+            self.retriever_error = error
+            self.knowledge_index_version = version
+            self._retriever_loaded = True
+
+    def build_retriever(self):
+        """Build the configured knowledge base search backend, or return None if it is unavailable."""
+        if self.retriever_backend == 'numpy':
+            try:
+                retriever = NumpyRetriever(NUMPY_INDEX_PATH)
+                logger.info("Loaded NumPy knowledge base index")
+            except Exception as e:
+                logger.error(f"Error loading NumPy index: {e}")
+                return None
+        else:
+            self.setup_chromadb()
+            if self.knowledge_collection is None:
+                return None
+            retriever = ChromaRetriever(self.knowledge_collection)
+
+        # Layer exact lexical matching over the vector search when the BM25 index exists
+        if self.hybrid_retrieval and os.path.exists(BM25_INDEX_PATH):
+            try:
+                retriever = HybridRetriever(retriever, BM25Index.load(BM25_INDEX_PATH))
+                logger.info("Loaded BM25 index for hybrid retrieval")
+            except Exception as e:
+                logger.error(f"Error loading BM25 index: {e}")
+
+        # Refuse to search documents embedded by a different model than queries use
+        check_embedding_metadata(retriever.metadata)
+        return retriever
+
     def setup_chromadb(self):
         """Set up ChromaDB connection and collection."""
+        # Imported here so the NumPy backend never pays for loading Chroma
+        import chromadb
+
         try:
-            chroma_db_path = './chroma_db'
-            self.chroma_client = chromadb.PersistentClient(path=chroma_db_path)
+            self.chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
 
-            # Get the knowledge collection
-            self.knowledge_collection = self.chroma_client.get_collection("wine_business_knowledge")
+            # Get the knowledge collection currently serving queries
+            self.knowledge_collection = self.chroma_client.get_collection(read_active_collection())
             logger.info("Connected to ChromaDB knowledge base")
 
         except Exception as e:
             logger.error(f"Error connecting to ChromaDB: {e}")
             self.knowledge_collection = None
 
-    def classify_query_intent(self, query: str) -> str:
-        """Classify the user's query to determine the appropriate response strategy."""
-        query_lower = query.lower()
-
-        # Business-related keywords
-        business_keywords = [
-            'wine', 'tasting', 'vineyard', 'winery', 'hours', 'reservation',
-            'price', 'cost', 'shipping', 'club', 'tour', 'location', 'address',
-            'cabernet', 'chardonnay', 'pinot', 'merlot', 'bottle', 'vintage',
-            'cellar', 'harvest', 'barrels', 'sommelier', 'pairing', 'taste',
-            'flavor', 'aroma', 'notes'
-        ]
-
-        # Weather keywords
-        weather_keywords = [
-            'weather', 'temperature', 'rain', 'sunny', 'forecast', 'climate',
-            'hot', 'cold', 'warm', 'degrees', 'fahrenheit', 'celsius'
-        ]
-
-        # News/real-time keywords
-        news_keywords = [
-            'news', 'latest', 'recent', 'current', 'today', 'happening',
-            'events', 'festival', 'what\'s new', 'updates'
-        ]
-
-        # Check for business queries first
-        if any(keyword in query_lower for keyword in business_keywords):
-            return 'business'
-
-        # Check for weather queries
-        if any(keyword in query_lower for keyword in weather_keywords):
-            return 'weather'
-
-        # Check for news queries
-        if any(keyword in query_lower for keyword in news_keywords):
-            return 'news'
+    def refresh_knowledge_base(self):
+        """Connect on first use, and reconnect when ingest.py has changed or swapped the knowledge base."""
+        if self._retriever_loaded and read_index_version() == self.knowledge_index_version:
+            return
+
+        with self._init_lock:
+            # Another thread may have connected while we waited
+            if self._retriever_loaded and read_index_version() == self.knowledge_index_version:
+                return
+            if self._retriever_loaded:
+                logger.info("Knowledge base changed on disk, reconnecting")
+            self.setup_retriever()
+
+    @property
+    def facts(self) -> FactIndex:
+        """Extracted business facts, reloaded whenever ingest.py rewrites them."""
+        try:
+            mtime = os.path.getmtime(FACTS_PATH)
+        except OSError:
+            mtime = None
+
+        if self._facts is None or mtime != self._facts_mtime:
+            with self._init_lock:
+                if self._facts is None or mtime != self._facts_mtime:
+                    self._facts = FactIndex.load(FACTS_PATH, self.fast_path_min_confidence)
+                    self._facts_mtime = mtime
+        return self._facts
+
+    def answer_from_facts(self, user_input: str, intents: Set[str]) -> Optional[str]:
+        """Answer a confident business lookup from the extracted facts, or return None to use the full pipeline."""
+        if not self.fast_path or not self.lookup_intents(user_input, intents) <= {'business', 'chitchat'}:
+            return None
+
+        with self.tracer.span('fast_path') as span:
+            response = self.facts.answer(user_input)
+            span.set('hit', response is not None)
+        self.tracer.annotate(fast_path=response is not None)
+        return response
+
+    def lookup_intents(self, user_input: str, intents: Set[str]) -> Set[str]:
+        """Drop a news intent that only a time word such as "today" matched, for lookups and context routing."""
+        if 'news' in intents:
+            hits = self.intent_classifier.keyword_hits(user_input)['news']
+            if hits and set(hits) <= NEWS_TIME_WORDS:
+                return intents - {'news'}
+        return intents
+
+    def score_query_intent(self, query: str) -> Dict[str, float]:
+        """Return keyword hit counts for every intent."""
+        return self.intent_classifier.keyword_scores(query)
+
+    def classify_query_intent(self, query: str) -> Set[str]:
+        """Classify the user's query into every intent it touches."""
+        scores = self.score_query_intent(query)
+
+        # A query can match several buckets, e.g. weather for a wine tour
+        intents = {intent for intent, score in scores.items() if score > 0}
+
+        # Fall back to embedding similarity when no keyword matched
+        if not intents and self.intent_embedding_fallback:
+            intents = self.classify_by_embedding(query)
 
         # Everything else is chitchat
+        return intents or {'chitchat'}
+
+    def classify_by_embedding(self, query: str) -> Set[str]:
+        """Pick the intent whose example queries the query is most similar to, if any is close enough."""
+        try:
+            if self.intent_classifier.prototypes is None:
+                self.intent_classifier.build_prototypes(self.embed_query)
+
+            # The query embedding is memoized, so retrieval reuses it if this turns out to be a business query
+            scores = self.intent_classifier.embedding_scores(self.embed_query(query))
+        except Exception as e:
+            logger.error(f"Error classifying intent by embedding: {e}")
+            return set()
+
+        if not scores:
+            return set()
+        intent, similarity = max(scores.items(), key=lambda item: item[1])
+        if similarity < self.intent_similarity_threshold or intent == 'chitchat':
+            return set()
+
+        logger.info(f"Classified by embedding similarity as {intent} ({similarity:.2f})")
+        return {intent}
+
+    @staticmethod
+    def primary_intent(intents: Set[str]) -> str:
+        """Pick the intent whose persona drives the response prompt."""
+        for intent in INTENT_PRIORITY:
+            if intent in intents:
+                return intent
         return 'chitchat'
 
-    def search_knowledge_base(self, query: str, n_results: int = 3) -> List[str]:
-        """Search the ChromaDB knowledge base for relevant information."""
-        if not self.knowledge_collection:
+    def is_lexical_query(self, query: str) -> bool:
+        """Return True if the query can be answered by exact term matching alone."""
+        return self.retriever is not None and self.retriever.lexical_search(query, 1) is not None
+
+    def embed_query(self, query: str) -> List[float]:
+        """Generate the retrieval embedding for a user query, reusing memoized results."""
+        with self.tracer.span('embed', cache_hit=True) as span:
+            def compute_embedding():
+                span.set('cache_hit', False)
+                if self.embedding_batcher is not None:
+                    return self.embedding_batcher.submit(query).result(stage_timeout(self.upstream_timeouts['embedding']))
+
+                result = self.call_upstream('embedding', lambda: self.genai.embed_content(
+                    model=EMBEDDING_MODEL,
+                    content=query,
+                    task_type="retrieval_query"
+                ))
+                return result['embedding']
+
+            return self.embedding_cache.get_or_compute(EMBEDDING_MODEL, query, "retrieval_query", compute_embedding)
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several user queries in one API call."""
+        with self.tracer.span('embed.batch', size=len(queries)):
+            result = self.call_upstream('embedding', lambda: self.genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=queries,
+                task_type="retrieval_query"
+            ))
+        return result['embedding']
+
+    def search_knowledge_base(self, query: str, n_results: int = 3,
+                              query_embedding: Optional[List[float]] = None) -> List[str]:
+        """Search the knowledge base for relevant information."""
+        relevant_docs, degraded = self.coalesce(
+            self.single_flight_key('knowledge', query, n_results),
+            lambda: self._search_knowledge_base(query, n_results, query_embedding)
+        )
+        # Marked here rather than in the search so requests sharing a degraded search are marked too
+        if degraded:
+            mark_degraded(degraded)
+        return relevant_docs
+
+    def _search_knowledge_base(self, query: str, n_results: int,
+                               query_embedding: Optional[List[float]]) -> Tuple[List[str], Optional[str]]:
+        """Return the relevant documents and, if the search fell short, why."""
+        self.refresh_knowledge_base()
+        if not self.retriever:
             logger.error("Knowledge collection not available")
-            return []
+            return [], 'retriever_unavailable'
 
         try:
-            # Generate embedding for the query
-            query_embedding = genai.embed_content(
-                model="models/text-embedding-004",
-                content=query,
-                task_type="retrieval_query"
-            )
-
-            # Search similar documents
-            results = self.knowledge_collection.query(
-                query_embeddings=[query_embedding['embedding']],
-                n_results=n_results
-            )
-
-            # Extract relevant documents
-            relevant_docs = results['documents'][0] if results['documents'] else []
+            # Exact lexical lookups are answered without an embedding call
+            if query_embedding is None:
+                with self.tracer.span('retrieve.lexical') as span:
+                    lexical_docs = self.retriever.lexical_search(query, n_results)
+                    span.set('hit', bool(lexical_docs))
+                if lexical_docs:
+                    logger.info(f"Found {len(lexical_docs)} relevant documents by exact match")
+                    return lexical_docs, None
+
+            # Generate embedding for the query unless the caller already has one
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+
+            # Search similar documents; the in-process NumPy index needs no breaker
+            with self.tracer.span('retrieve', backend=type(self.retriever).__name__):
+                if self.retriever_backend == 'numpy':
+                    relevant_docs = self.retriever.search(query, query_embedding, n_results)
+                else:
+                    relevant_docs = self.call_upstream(
+                        'chroma', lambda: self.retriever.search(query, query_embedding, n_results)
+                    )
             logger.info(f"Found {len(relevant_docs)} relevant documents")
 
-            return relevant_docs
+            return relevant_docs, None
 
         except Exception as e:
             logger.error(f"Error searching knowledge base: {e}")
-            return []
+
+        # Without an embedding or the vector index, weaker keyword matches still beat no context
+        try:
+            relevant_docs = self.retriever.keyword_search(query, n_results)
+        except Exception as e:
+            logger.error(f"Error searching knowledge base by keyword: {e}")
+            return [], 'retrieval_failed'
+        if relevant_docs:
+            logger.info(f"Fell back to {len(relevant_docs)} keyword matches")
+            self.tracer.annotate(retrieval_degraded=True)
+        return relevant_docs, 'keyword_fallback'
+
+    def _realtime_request(self, query: str) -> Tuple[dict, dict]:
+        """Build the Perplexity request payload and headers for a query."""
+        payload = {
+            "model": "llama-3.1-sonar-small-128k-online",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are helping Tohin, a helpful assistant, provide current information about Napa Valley, wine industry, and related topics."
+                },
+                {
+                    "role": "user",
+                    "content": query
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": 500
+        }
+
+        headers = {
+            "Authorization": f"Bearer {self.perplexity_api_key}",
+            "Content-Type": "application/json"
+        }
+
+        return payload, headers
+
+    @staticmethod
+    def news_topic_request(topic: str) -> Tuple[tuple, str]:
+        """Return the news cache key and Perplexity question for a pre-warmed topic."""
+        return ('news', f"topic:{topic}"), NEWS_TOPIC_QUERY.format(topic=topic)
+
+    def news_request(self, query: str) -> Tuple[tuple, str]:
+        """Return the news cache key for a query and the question to send to Perplexity.
+
+        Generic questions about a pre-warmed topic share that topic's answer;
+        any other query, including one that qualifies a topic ("wine events
+        for kids this weekend"), is sent as asked and cached under its
+        normalized text.
+        """
+        for topic, pattern in self.news_topics:
+            if pattern.search(query):
+                other_words = [word for word in tokenize(pattern.sub(' ', query))
+                               if word not in FILLER_WORDS and word not in GENERIC_NEWS_WORDS]
+                if not other_words:
+                    return self.news_topic_request(topic)
+                break
+        return self.single_flight_key('news', query), query
 
     def get_realtime_info(self, query: str) -> str:
         """Get real-time information using Perplexity API."""
         if not self.perplexity_api_key:
             return "Real-time information service is currently unavailable."
 
+        key, request_query = self.news_request(query)
         try:
-            url = "https://api.perplexity.ai/chat/completions"
-
-            payload = {
-                "model": "llama-3.1-sonar-small-128k-online",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are helping Tohin, a helpful assistant, provide current information about Napa Valley, wine industry, and related topics."
-                    },
-                    {
-                        "role": "user",
-                        "content": query
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 500
-            }
+            info, status = self.news_cache.get(key, lambda: self._load_news(key, request_query))
+        except Exception:
+            mark_degraded('news_unavailable')
+            return NEWS_ERROR_MESSAGE
 
-            headers = {
-                "Authorization": f"Bearer {self.perplexity_api_key}",
-                "Content-Type": "application/json"
-            }
+        self.tracer.annotate(news_cache=status)
+        return info
 
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
+    async def aget_realtime_info(self, query: str) -> str:
+        """Async variant of get_realtime_info()."""
+        if not self.perplexity_api_key:
+            return "Real-time information service is currently unavailable."
+
+        key, request_query = self.news_request(query)
+        info, status = self.news_cache.peek(key)
+        if status == 'stale':
+            self.news_cache.refresh(key, lambda: self._load_news(key, request_query))
+        elif status == 'miss':
+            try:
+                info = await self.acoalesce(key, lambda: self._afetch_realtime_info(request_query))
+            except Exception:
+                mark_degraded('news_unavailable')
+                return NEWS_ERROR_MESSAGE
+            self.news_cache.set(key, info)
+
+        self.tracer.annotate(news_cache=status)
+        return info
+
+    def _load_news(self, key: tuple, request_query: str) -> str:
+        """Fetch news for the cache, sharing the request with identical ones already in flight."""
+        return self.coalesce(key, lambda: self._fetch_realtime_info(request_query))
+
+    def _fetch_realtime_info(self, query: str) -> str:
+        """Call Perplexity; raises on failure so error replies are never cached."""
+        try:
+            payload, headers = self._realtime_request(query)
+            timeout = stage_timeout(self.upstream_timeouts['perplexity'])
+
+            def fetch() -> str:
+                response = self.http_session.post(PERPLEXITY_URL, json=payload, headers=headers, timeout=timeout)
+                response.raise_for_status()
 
-            data = response.json()
-            return data['choices'][0]['message']['content']
+                data = response.json()
+                return data['choices'][0]['message']['content']
+
+            return self.call_upstream('perplexity', fetch, timeout)
 
         except Exception as e:
             logger.error(f"Error fetching real-time information: {e}")
-            return "I'm sorry, I couldn't retrieve the latest information at this time."
+            raise
+
+    async def _afetch_realtime_info(self, query: str) -> str:
+        """Async variant of _fetch_realtime_info()."""
+        try:
+            payload, headers = self._realtime_request(query)
+            timeout = stage_timeout(self.upstream_timeouts['perplexity'])
+
+            async def fetch() -> str:
+                response = await self._arequest("POST", PERPLEXITY_URL, json=payload, headers=headers, timeout=timeout)
+                response.raise_for_status()
+
+                data = response.json()
+                return data['choices'][0]['message']['content']
+
+            return await self.acall_upstream('perplexity', fetch, timeout)
+
+        except Exception as e:
+            logger.error(f"Error fetching real-time information: {e}")
+            raise
+
+    def prewarm_news(self):
+        """Refresh every pre-warm topic that is missing from the news cache or past its soft TTL."""
+        for topic, _ in self.news_topics:
+            key, request_query = self.news_topic_request(topic)
+            if self.news_cache.needs_refresh(key):
+                self.news_cache.refresh(key, lambda key=key, request_query=request_query: self._load_news(key, request_query))
+
+    def start_news_prewarm(self) -> Optional[threading.Thread]:
+        """Keep the pre-warm topics fresh on a background schedule, if Perplexity is configured."""
+        if not self.perplexity_api_key or not self.news_topics or self.news_prewarm_interval <= 0:
+            return None
+
+        with self._init_lock:
+            if self.news_prewarm_thread is None:
+                self.news_prewarm_thread = threading.Thread(target=self._news_prewarm_loop, name='news-prewarm', daemon=True)
+                self.news_prewarm_thread.start()
+        return self.news_prewarm_thread
+
+    def _news_prewarm_loop(self):
+        while True:
+            self.prewarm_news()
+            time.sleep(self.news_prewarm_interval)
+
+    @staticmethod
+    def _weather_api_key() -> Optional[str]:
+        """Return the OpenWeatherMap API key from the environment."""
+        # Try both possible environment variable names for the API key
+        return os.getenv('WEATHER_API_KEY') or os.getenv('OPENWEATHERMAP_API_KEY')
+
+    @staticmethod
+    def format_weather(data: dict) -> str:
+        """Format an OpenWeatherMap response for user-friendly output."""
+        weather_info = f"""
+Current weather in {data['name']}:
+• Temperature: {data['main']['temp']}°F (feels like {data['main']['feels_like']}°F)
+• Condition: {data['weather'][0]['description'].title()}
+• Humidity: {data['main']['humidity']}%
+• Wind Speed: {data['wind'].get('speed', 'N/A')} mph
+"""
+        return weather_info.strip()
+
+    @staticmethod
+    def _weather_error_message(status_code: int, error: Exception) -> str:
+        """Map an OpenWeatherMap HTTP error to a user-facing message."""
+        if status_code == 401:
+            return "The weather API key is invalid or not activated yet. Please check your API key."
+        elif status_code == 404:
+            return "I couldn't find weather information for the specified location."
+        else:
+            return f"Sorry, I couldn't fetch the weather information. Error: {error}"
 
     def get_weather_info(self, location: str = "Napa, CA") -> str:
         """Get current weather information for specified location."""
-        # Try both possible environment variable names for the API key
-        api_key = os.getenv('WEATHER_API_KEY') or os.getenv('OPENWEATHERMAP_API_KEY')
+        api_key = self._weather_api_key()
         if not api_key:
             return "Weather service is currently unavailable."
 
+        # Serve from the shared cache while the reading is fresh
+        cache_key = location.strip().lower()
+        cached_weather = self.weather_cache.get(cache_key)
+        self.tracer.annotate(weather_cache_hit=cached_weather is not None)
+        if cached_weather is not None:
+            return cached_weather
+
         try:
-            # Use HTTPS URL for OpenWeatherMap API
-            url = "https://api.openweathermap.org/data/2.5/weather"
             params = {
                 'q': location,
                 'appid': api_key,
                 'units': 'imperial'  # Fahrenheit units
             }
 
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
+            timeout = stage_timeout(self.upstream_timeouts['openweathermap'])
 
-            data = response.json()
+            def fetch() -> dict:
+                response = self.http_session.get(OPENWEATHERMAP_URL, params=params, timeout=timeout)
+                response.raise_for_status()
+                return response.json()
 
-            # Format the weather information for user-friendly output
-            weather_info = f"""
-Current weather in {data['name']}:
-• Temperature: {data['main']['temp']}°F (feels like {data['main']['feels_like']}°F)
-• Condition: {data['weather'][0]['description'].title()}
-• Humidity: {data['main']['humidity']}%
-• Wind Speed: {data['wind'].get('speed', 'N/A')} mph
-"""
-            return weather_info.strip()
+            weather_info = self.format_weather(self.call_upstream('openweathermap', fetch, timeout))
+            self.weather_cache.set(cache_key, weather_info)
+            return weather_info
 
         except requests.exceptions.HTTPError as e:
             # Specific handling for HTTP errors
-            if response.status_code == 401:
-                return "The weather API key is invalid or not activated yet. Please check your API key."
-            elif response.status_code == 404:
-                return "I couldn't find weather information for the specified location."
-            else:
-                return f"Sorry, I couldn't fetch the weather information. Error: {e}"
+            return self._weather_error_message(e.response.status_code, e)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Skipping weather: {e}")
+            mark_degraded('weather_unavailable')
+            return "Weather service is currently unavailable."
         except Exception as e:
             # General exception catcher
             return f"Sorry, I couldn't fetch the weather information due to an unexpected error: {e}"
 
-    def generate_response(self, query: str, context: str, intent: str) -> str:
-        """Generate a response using Gemini with appropriate context."""
+    async def aget_weather_info(self, location: str = "Napa, CA") -> str:
+        """Async variant of get_weather_info()."""
+        import httpx
 
-        # Create system prompt based on intent
-        if intent == 'business':
-            system_prompt = """You are Tohin, a friendly and knowledgeable personal concierge for Napa Valley Premium Wines. 
-            Use the provided business information to answer questions about our winery, wines, tastings, 
-            tours, and services. Be warm, professional, and helpful. Always introduce yourself as Tohin when 
-            meeting someone new or when asked about yourself."""
-
-        elif intent == 'weather':
-            system_prompt = """You are Tohin, a helpful personal concierge providing weather information for visitors 
-            to Napa Valley. If weather data is unavailable, provide general seasonal advice for Napa Valley 
-            and suggest indoor/outdoor activities. Always identify yourself as Tohin when asked."""
-
-        elif intent == 'news':
-            system_prompt = """You are Tohin, a knowledgeable personal concierge sharing information about 
-            Napa Valley, wine industry, and local events. Present information in an engaging way. 
-            Always introduce yourself as Tohin when appropriate."""
-
-        elif intent == 'chitchat':
-            system_prompt = """You are Tohin, a friendly and personable concierge at Napa Valley Premium Wines. 
-            You love casual conversation and are great at small talk. When someone asks about yourself, 
-            introduce yourself as Tohin - a personal wine concierge who helps visitors discover the best 
-            of Napa Valley. Keep responses warm, engaging, and conversational. Answer questions naturally 
-            and try to steer conversation toward wine, the winery, or visiting Napa Valley when appropriate. 
-            Be helpful and friendly, and remember you are Tohin."""
+        api_key = self._weather_api_key()
+        if not api_key:
+            return "Weather service is currently unavailable."
 
-        else:
-            system_prompt = """You are Tohin, a friendly personal concierge for Napa Valley Premium Wines. 
-            Be helpful, warm, and professional in your responses. Always identify yourself as Tohin."""
+        # Serve from the shared cache while the reading is fresh
+        cache_key = location.strip().lower()
+        cached_weather = self.weather_cache.get(cache_key)
+        self.tracer.annotate(weather_cache_hit=cached_weather is not None)
+        if cached_weather is not None:
+            return cached_weather
+
+        try:
+            params = {
+                'q': location,
+                'appid': api_key,
+                'units': 'imperial'  # Fahrenheit units
+            }
 
-        # Create the full prompt
-        full_prompt = f"""
-{system_prompt}
+            timeout = stage_timeout(self.upstream_timeouts['openweathermap'])
 
-Context Information:
-{context}
+            async def fetch() -> dict:
+                response = await self._arequest("GET", OPENWEATHERMAP_URL, params=params, timeout=timeout)
+                response.raise_for_status()
+                return response.json()
 
-User Question: {query}
+            weather_info = self.format_weather(await self.acall_upstream('openweathermap', fetch, timeout))
+            self.weather_cache.set(cache_key, weather_info)
+            return weather_info
 
-Please provide a helpful, friendly, and informative response as Tohin:
-"""
+        except httpx.HTTPStatusError as e:
+            # Specific handling for HTTP errors
+            return self._weather_error_message(e.response.status_code, e)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Skipping weather: {e}")
+            mark_degraded('weather_unavailable')
+            return "Weather service is currently unavailable."
+        except Exception as e:
+            # General exception catcher
+            return f"Sorry, I couldn't fetch the weather information due to an unexpected error: {e}"
 
-        try:
-            # Generate response using Gemini
-            response = self.gemini_model.generate_content(
-                full_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=self.temperature,
-                    max_output_tokens=self.max_tokens,
-                )
-            )
+    def build_prompt(self, query: str, context: str, intent: str, history: str = "") -> str:
+        """Build the full Gemini prompt for the given intent and context."""
+        return self.prompt_builder.build(query, context, intent, history)
+
+    def prepare_generation(self, query: str, context: str, intent: str, profile: GenerationProfile,
+                           history: str = "") -> tuple:
+        """Return the model to answer with and the prompt to send it.
+
+        A model that carries the intent's system prompt only needs the
+        per-request part, so the static instructions aren't resent every call.
+        """
+        if self._gemini_model_assigned:
+            return self._gemini_model, self.build_prompt(query, context, intent, history)
+        if self.uses_system_instruction():
+            return (self.generative_model(profile.model, intent),
+                    self.prompt_builder.user_prompt(query, context, history))
+        return self.generative_model(profile.model), self.build_prompt(query, context, intent, history)
+
+    def generation_config(self, profile: GenerationProfile):
+        """Return the Gemini generation config for a profile."""
+        return self.genai.types.GenerationConfig(
+            temperature=profile.temperature,
+            max_output_tokens=profile.max_output_tokens,
+            stop_sequences=profile.stop_sequences or None,
+        )
+
+    def record_generation(self, profile: GenerationProfile, span, prompt_tokens: int, completion_tokens: int,
+                          reason: Optional[str], escalated: bool):
+        """Record a profile's latency and token usage so its settings can be tuned from data."""
+        self.tracer.observe(f"generate.{profile.name}", span.duration)
+        self.profile_stats.record(profile, prompt_tokens, completion_tokens,
+                                  escalated=escalated, truncated=reason in TRUNCATED_FINISH_REASONS)
+
+    def generate_response(self, query: str, context: str, intent: str, history: str = "",
+                          intents: Optional[Set[str]] = None) -> str:
+        """Generate a response using Gemini with appropriate context."""
+        profile = self.generation_router.select(query, intents or {intent}, intent)
 
-            return response.text
+        try:
+            text, reason = self._generate(query, context, intent, history, profile)
+            if self.generation_router.should_escalate(profile, text, reason):
+                logger.info(f"Escalating {profile.name} answer ({reason or 'empty'}) to {profile.escalate_to}")
+                try:
+                    text, _ = self._generate(query, context, intent, history, profile.escalated(), escalated=True)
+                except Exception as e:
+                    # A truncated answer beats none when the stronger model is down or out of time
+                    if not text.strip():
+                        raise
+                    logger.warning(f"Keeping the {profile.name} answer; escalation failed: {e}")
+                    mark_degraded('escalation_failed')
+            return text
 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return "Hi, I'm Tohin, your personal concierge! I'm having trouble processing your request right now. Please try again or contact us directly at (707) 555-WINE."
+            return GENERATION_ERROR_MESSAGE
+
+    def _generate(self, query: str, context: str, intent: str, history: str,
+                  profile: GenerationProfile, escalated: bool = False) -> Tuple[str, Optional[str]]:
+        model, prompt = self.prepare_generation(query, context, intent, profile, history)
+        prompt_tokens = estimate_tokens(prompt)
+
+        # Generate response using Gemini
+        with self.tracer.span('generate', intent=intent, profile=profile.name, model=profile.model,
+                              prompt_tokens=prompt_tokens) as span:
+            config = self.generation_config(profile)
+            response = self.call_upstream('gemini', lambda: model.generate_content(prompt, generation_config=config))
+            text, reason, completion_tokens = self.read_response(response, span)
+
+        self.record_generation(profile, span, prompt_tokens, completion_tokens, reason, escalated)
+        return text, reason
+
+    @staticmethod
+    def read_response(response, span) -> Tuple[str, Optional[str], int]:
+        """Return a response's text, finish reason and output tokens, noting the latter two on the span."""
+        try:
+            text = response.text
+        except ValueError:
+            # No text parts, e.g. the answer was blocked or empty
+            text = ""
+        reason = finish_reason(response)
+        completion_tokens = output_tokens(response, text)
+        span.set('finish_reason', reason)
+        span.set('output_tokens', completion_tokens)
+        return text, reason, completion_tokens
+
+    async def agenerate_response(self, query: str, context: str, intent: str, history: str = "",
+                                 intents: Optional[Set[str]] = None) -> str:
+        """Async variant of generate_response() using the async Gemini API."""
+        profile = self.generation_router.select(query, intents or {intent}, intent)
 
-    def chat(self, user_input: str) -> str:
-        """Main chat function that processes user input and returns response."""
         try:
-            # Classify the query intent
-            intent = self.classify_query_intent(user_input)
-            logger.info(f"Classified query intent: {intent}")
+            text, reason = await self._agenerate(query, context, intent, history, profile)
+            if self.generation_router.should_escalate(profile, text, reason):
+                logger.info(f"Escalating {profile.name} answer ({reason or 'empty'}) to {profile.escalate_to}")
+                try:
+                    text, _ = await self._agenerate(query, context, intent, history, profile.escalated(), escalated=True)
+                except Exception as e:
+                    if not text.strip():
+                        raise
+                    logger.warning(f"Keeping the {profile.name} answer; escalation failed: {e}")
+                    mark_degraded('escalation_failed')
+            return text
 
-            context = ""
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return GENERATION_ERROR_MESSAGE
+
+    async def _agenerate(self, query: str, context: str, intent: str, history: str,
+                         profile: GenerationProfile, escalated: bool = False) -> Tuple[str, Optional[str]]:
+        model, prompt = self.prepare_generation(query, context, intent, profile, history)
+        prompt_tokens = estimate_tokens(prompt)
+
+        with self.tracer.span('generate', intent=intent, profile=profile.name, model=profile.model,
+                              prompt_tokens=prompt_tokens) as span:
+            config = self.generation_config(profile)
+            response = await self.acall_upstream(
+                'gemini', lambda: model.generate_content_async(prompt, generation_config=config)
+            )
+            text, reason, completion_tokens = self.read_response(response, span)
 
-            # Route based on intent
-            if intent == 'business':
-                # Search knowledge base for business information
-                relevant_docs = self.search_knowledge_base(user_input)
-                context = "\n\n".join(relevant_docs) if relevant_docs else "No specific information found in knowledge base."
+        self.record_generation(profile, span, prompt_tokens, completion_tokens, reason, escalated)
+        return text, reason
 
-            elif intent == 'weather':
-                # Get weather information
-                context = self.get_weather_info()
+    def generate_response_stream(self, query: str, context: str, intent: str, history: str = "",
+                                 intents: Optional[Set[str]] = None) -> Iterator[str]:
+        """Generate a response using Gemini, yielding text chunks as they arrive."""
+        profile = self.generation_router.select(query, intents or {intent}, intent)
+        streamed = []
 
-            elif intent == 'news':
-                # Get real-time information
-                news_info = self.get_realtime_info(user_input)
-                context = news_info
+        try:
+            yield from self._generate_stream(query, context, intent, history, profile, streamed)
 
-            elif intent == 'chitchat':
-                # For chitchat, provide context about Tohin's identity
-                context = "You are Tohin, a friendly personal wine concierge at Napa Valley Premium Wines. You help visitors discover the best of Napa Valley wines and experiences."
+            # Nothing has been shown yet, so an empty answer can still be retried on a stronger model
+            if not streamed and profile.escalate_to:
+                logger.info(f"Escalating empty {profile.name} answer to {profile.escalate_to}")
+                yield from self._generate_stream(query, context, intent, history, profile.escalated(),
+                                                 streamed, escalated=True)
 
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            if not streamed:
+                yield GENERATION_ERROR_MESSAGE
+
+    def _generate_stream(self, query: str, context: str, intent: str, history: str, profile: GenerationProfile,
+                         streamed: List[str], escalated: bool = False) -> Iterator[str]:
+        model, prompt = self.prepare_generation(query, context, intent, profile, history)
+        prompt_tokens = estimate_tokens(prompt)
+
+        with self.tracer.span('generate', intent=intent, profile=profile.name, model=profile.model,
+                              prompt_tokens=prompt_tokens, stream=True) as span:
+            config = self.generation_config(profile)
+            with self.breakers['gemini'].guard():
+                # Opening the stream waits for the first chunk, so only that wait is bounded by the deadline
+                timeout = stage_timeout(self.upstream_timeouts['gemini'])
+                with caller_deadline(timeout, self.upstream_timeouts['gemini']):
+                    response = run_with_timeout(
+                        self.bulkheads['gemini'],
+                        in_context(lambda: model.generate_content(prompt, generation_config=config, stream=True)),
+                        timeout
+                    )
+
+                # Stream response chunks from Gemini
+                for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata only)
+                        continue
+                    if text:
+                        if not streamed:
+                            span.set('first_chunk_ms', round((time.perf_counter() - span.started_at) * 1000, 3))
+                        streamed.append(text)
+                        yield text
+
+            reason = finish_reason(response)
+            completion_tokens = output_tokens(response, "".join(streamed))
+            span.set('finish_reason', reason)
+            span.set('output_tokens', completion_tokens)
+
+        self.record_generation(profile, span, prompt_tokens, completion_tokens, reason, escalated)
+
+    def context_sources(self, intents: Set[str]) -> List[str]:
+        """Return the context sources needed to answer a query with the given intents."""
+        sources = []
+        for intent in INTENT_PRIORITY:
+            if intent not in intents:
+                continue
+            for source in CONTEXT_SOURCES[intent]:
+                if source not in sources:
+                    sources.append(source)
+        return sources or ['knowledge']
+
+    @staticmethod
+    def merge_context(sources: List[str], results: List[str]) -> str:
+        """Merge per-source context into one block, labelling sections when there are several."""
+        if len(results) == 1:
+            return results[0]
+        return "\n\n".join(f"{CONTEXT_SOURCE_LABELS[source]}:\n{result}" for source, result in zip(sources, results))
+
+    def _knowledge_context(self, user_input: str, query_embedding: Optional[List[float]] = None) -> str:
+        """Search the knowledge base and join the results into a context block."""
+        relevant_docs = self.search_knowledge_base(user_input, query_embedding=query_embedding)
+        if not relevant_docs:
+            return "No specific information found in knowledge base."
+        # Retrieved chunks overlap; keep each passage once, within the business context budget
+        return self.prompt_builder.compress_chunks(relevant_docs, 'business')
+
+    def fetch_context(self, source: str, user_input: str, query_embedding: Optional[List[float]] = None) -> str:
+        """Fetch context from a single source."""
+        if source == 'knowledge':
+            # Search knowledge base for business information
+            return self._knowledge_context(user_input, query_embedding)
+
+        elif source == 'weather':
+            # Get weather information
+            with self.tracer.span('weather'):
+                return self.prompt_builder.fit_context(self.get_weather_info(), 'weather')
+
+        elif source == 'news':
+            # Get real-time information
+            with self.tracer.span('news'):
+                return self.prompt_builder.fit_context(self.get_realtime_info(user_input), 'news')
+
+        # For chitchat, provide context about Tohin's identity
+        return TOHIN_IDENTITY_CONTEXT
+
+    async def afetch_context(self, source: str, user_input: str,
+                             query_embedding: Optional[List[float]] = None) -> str:
+        """Async variant of fetch_context()."""
+        if source == 'knowledge':
+            # Embedding and Chroma calls are blocking, so run them off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, in_context(self._knowledge_context), user_input, query_embedding)
+
+        elif source == 'weather':
+            with self.tracer.span('weather'):
+                return self.prompt_builder.fit_context(await self.aget_weather_info(), 'weather')
+
+        elif source == 'news':
+            with self.tracer.span('news'):
+                return self.prompt_builder.fit_context(await self.aget_realtime_info(user_input), 'news')
+
+        return TOHIN_IDENTITY_CONTEXT
+
+    def build_context(self, user_input: str, intents: Set[str],
+                      query_embedding: Optional[List[float]] = None) -> str:
+        """Collect context from every source the query needs, fetching them concurrently."""
+        # "What are your hours today?" needs the knowledge base, not a Perplexity news search
+        sources = self.context_sources(self.lookup_intents(user_input, intents))
+
+        # Context gets its share of the request deadline; generation keeps the rest
+        with deadline_scope(stage_timeout(None, self.context_deadline_share)) as stage:
+            if len(sources) == 1:
+                results = [self.fetch_context(sources[0], user_input, query_embedding)]
             else:
-                # For general queries, search business knowledge base
-                relevant_docs = self.search_knowledge_base(user_input, n_results=1)
-                context = relevant_docs[0] if relevant_docs else "General conversation context."
+                # Fan out so latency tracks the slowest source rather than the sum
+                futures = [
+                    self.context_executor.submit(in_context(self.fetch_context), source, user_input, query_embedding)
+                    for source in sources
+                ]
+                results = [self.context_result(source, future, stage) for source, future in zip(sources, futures)]
+
+        return self.merge_context(sources, results)
 
-            # Generate final response
-            response = self.generate_response(user_input, context, intent)
-            return response
+    def context_result(self, source: str, future, stage) -> str:
+        """Wait for a source's context until the stage deadline, then answer without it."""
+        try:
+            return future.result(stage.remaining() if stage is not None else None)
+        except FutureTimeoutError:
+            return self.context_timed_out(source)
+
+    def context_timed_out(self, source: str) -> str:
+        logger.warning(f"No {source} context within the request deadline")
+        mark_degraded(f"{source}_timed_out")
+        self.tracer.annotate(**{f"{source}_timed_out": True})
+        return UNAVAILABLE_CONTEXT[source]
+
+    async def abuild_context(self, user_input: str, intents: Set[str],
+                             query_embedding: Optional[List[float]] = None) -> str:
+        """Collect context concurrently from every source the query needs."""
+        sources = self.context_sources(self.lookup_intents(user_input, intents))
+
+        with deadline_scope(stage_timeout(None, self.context_deadline_share)) as stage:
+            async def fetch(source: str) -> str:
+                try:
+                    return await await_with_timeout(
+                        self.afetch_context(source, user_input, query_embedding),
+                        stage.remaining() if stage is not None else None
+                    )
+                except DeadlineExceeded:
+                    return self.context_timed_out(source)
+
+            results = await asyncio.gather(*(fetch(source) for source in sources))
+        return self.merge_context(sources, list(results))
+
+    @staticmethod
+    def intent_key(intents: Set[str]) -> str:
+        """Return a stable cache key for a set of intents."""
+        return "+".join(sorted(intents))
+
+    @staticmethod
+    def single_flight_key(kind: str, query: str, *parts) -> tuple:
+        """Return the key under which identical in-flight requests are coalesced."""
+        return (kind, EmbeddingCache.normalize_text(query)) + parts
+
+    def answer_key(self, user_input: str, intents: Set[str]) -> tuple:
+        """Coalescing key for a fresh answer; only used for turns without conversation history."""
+        return self.single_flight_key('answer', user_input, self.intent_key(intents))
+
+    def coalesce(self, key: tuple, fn):
+        """Run fn, or share the result of the identical request already in flight."""
+        # Waiting on a stuck leader gives up with the time left, and the request runs on its own
+        result, shared = self.single_flight.do(key, fn, timeout=stage_timeout(None))
+        if shared:
+            self.tracer.annotate(**{f"{key[0]}_coalesced": True})
+        return result
+
+    async def acoalesce(self, key: tuple, coro_fn):
+        """Async variant of coalesce()."""
+        result, shared = await self.single_flight.ado(key, coro_fn)
+        if shared:
+            self.tracer.annotate(**{f"{key[0]}_coalesced": True})
+        return result
+
+    def lookup_cached_response(self, user_input: str, intents: Set[str],
+                               history: str = "") -> Tuple[Optional[str], Optional[List[float]]]:
+        """Look up a semantically equivalent earlier answer.
+
+        Returns the cached response (or None) together with the query embedding,
+        which is reused for retrieval on a miss.
+        """
+        # Weather and news answers depend on live data, so only knowledge base answers are cached
+        if not intents <= CACHEABLE_INTENTS:
+            return None, None
+
+        # Answers to follow-ups depend on the conversation, so only opening questions are shared
+        if history:
+            return None, None
 
+        try:
+            with self.tracer.span('response_cache'):
+                if self.is_lexical_query(user_input):
+                    # Lexical lookups skip the embedding call; only consult the cache if it is memoized
+                    query_embedding = self.embedding_cache.get(EMBEDDING_MODEL, user_input, "retrieval_query")
+                    if query_embedding is None:
+                        return None, None
+                else:
+                    query_embedding = self.embed_query(user_input)
+                cached_response = self.response_cache.get(query_embedding, self.intent_key(intents))
         except Exception as e:
-            logger.error(f"Error in chat processing: {e}")
-            return "Hi, I'm Tohin! I apologize for the inconvenience. Please try rephrasing your question or contact us directly at info@napavalleypremiumwines.com."
+            logger.error(f"Error checking response cache: {e}")
+            return None, None
+
+        self.tracer.annotate(cache_hit=cached_response is not None)
+        if cached_response is not None:
+            logger.info("Answered from semantic response cache")
+        return cached_response, query_embedding
+
+    def store_cached_response(self, query_embedding: Optional[List[float]], intents: Set[str], response: str):
+        """Remember a generated answer for semantically similar future queries."""
+        if query_embedding is None or not response.strip():
+            return
+        if response in (GENERATION_ERROR_MESSAGE, CHAT_ERROR_MESSAGE):
+            return
+        # An answer built around a missing source or a fallback would outlive the outage that caused it
+        if is_degraded():
+            logger.info("Not caching a degraded answer")
+            return
+
+        try:
+            self.response_cache.put(query_embedding, self.intent_key(intents), response)
+        except Exception as e:
+            logger.error(f"Error storing response in cache: {e}")
+
+    def get_memory(self, session_id: str) -> ConversationMemory:
+        """Return the conversation memory for a session, creating it on first use."""
+        with self.sessions_lock:
+            memory = self.sessions.get(session_id)
+            if memory is None:
+                memory = ConversationMemory(
+                    token_budget=self.memory_token_budget,
+                    min_recent_turns=self.memory_recent_turns,
+                    summarizer=self.summarize_turns
+                )
+
+            # Storing it again restarts the inactivity timeout
+            self.sessions.set(session_id, memory)
+            return memory
+
+    def end_session(self, session_id: str):
+        """Forget a session's conversation memory."""
+        self.sessions.pop(session_id)
+
+    def summarize_turns(self, previous_summary: str, turns: List[Tuple[str, str]]) -> str:
+        """Fold older conversation turns into the session's running summary using Gemini."""
+        summary_tokens = max(64, self.memory_token_budget // 3)
+        prompt = f"""
+Update the running summary of a conversation between a visitor and Tohin, the personal wine concierge
+at Napa Valley Premium Wines. Keep the visitor's name, preferences, plans and any open questions.
+Reply with the updated summary only, in under {summary_tokens * 3 // 4} words.
+
+Current Summary:
+{previous_summary or "None yet."}
+
+New Conversation Turns:
+{format_turns(turns)}
+"""
+        with self.tracer.span('summarize'):
+            config = self.genai.types.GenerationConfig(temperature=0.2, max_output_tokens=summary_tokens)
+            response = self.call_upstream('gemini', lambda: self.gemini_model.generate_content(prompt, generation_config=config))
+        return response.text
+
+    @staticmethod
+    def followup_context(intents: Set[str], memory: Optional[ConversationMemory]) -> Optional[str]:
+        """Reuse the previous answer's context for follow-ups that don't name a new topic."""
+        if memory is None or intents != {'chitchat'}:
+            return None
+        return memory.last_context
+
+    def remember_turn(self, memory: Optional[ConversationMemory], user_input: str,
+                      response: str, context: Optional[str]):
+        """Record a finished exchange, compacting the history in the background once it is over budget."""
+        if memory is None or not response.strip():
+            return
+        if response in (GENERATION_ERROR_MESSAGE, CHAT_ERROR_MESSAGE):
+            return
+
+        memory.add_turn(user_input, response, context)
+        if memory.needs_compaction():
+            try:
+                self.compaction_executor.submit(memory.compact)
+            except BulkheadFull:
+                # Still over budget after the next turn, so it will be retried then
+                logger.info("Compaction backlog is full; leaving this session's history as is for now")
+
+    def chat(self, user_input: str, session_id: Optional[str] = None) -> str:
+        """Main chat function that processes user input and returns response."""
+        with self.tracer.trace('chat', session=session_id is not None), deadline_scope(self.request_deadline), \
+                degradation_scope():
+            try:
+                # Classify the query intents
+                with self.tracer.span('classify'):
+                    intents = self.classify_query_intent(user_input)
+                intent = self.primary_intent(intents)
+                self.tracer.annotate(intents=sorted(intents))
+                logger.info(f"Classified query intents: {sorted(intents)}")
+
+                # Earlier turns of this conversation, if the caller tracks one
+                memory = self.get_memory(session_id) if session_id else None
+                history = memory.render() if memory else ""
+
+                # Simple lookups are answered from extracted facts without retrieval or generation
+                fact_response = self.answer_from_facts(user_input, intents)
+                if fact_response is not None:
+                    self.remember_turn(memory, user_input, fact_response, None)
+                    return fact_response
+
+                # Answer repeated questions without retrieval or generation
+                cached_response, query_embedding = self.lookup_cached_response(user_input, intents, history)
+                if cached_response is not None:
+                    self.remember_turn(memory, user_input, cached_response, None)
+                    return cached_response
+
+                def answer() -> Tuple[str, str]:
+                    context = (self.followup_context(intents, memory)
+                               or self.build_context(user_input, intents, query_embedding))
+
+                    # Generate final response
+                    response = self.generate_response(user_input, context, intent, history, intents)
+                    self.store_cached_response(query_embedding, intents, response)
+                    return response, context
+
+                # Identical opening questions asked at the same moment share one answer
+                if history:
+                    response, context = answer()
+                else:
+                    response, context = self.coalesce(self.answer_key(user_input, intents), answer)
+                self.remember_turn(memory, user_input, response, context)
+                return response
+
+            except Exception as e:
+                logger.error(f"Error in chat processing: {e}")
+                return CHAT_ERROR_MESSAGE
+
+    def chat_stream(self, user_input: str, session_id: Optional[str] = None) -> Iterator[str]:
+        """Streaming variant of chat() that yields response chunks as they are generated."""
+        with self.tracer.trace('chat_stream', session=session_id is not None), deadline_scope(self.request_deadline), \
+                degradation_scope() as degraded:
+            context = None
+            # (key, future) while this stream leads an answer that identical requests are waiting on
+            flight = None
+            try:
+                # Classify the query intents
+                with self.tracer.span('classify'):
+                    intents = self.classify_query_intent(user_input)
+                intent = self.primary_intent(intents)
+                self.tracer.annotate(intents=sorted(intents))
+                logger.info(f"Classified query intents: {sorted(intents)}")
+
+                memory = self.get_memory(session_id) if session_id else None
+                history = memory.render() if memory else ""
+
+                # Fact answers and cached answers are both sent as a single chunk
+                cached_response = self.answer_from_facts(user_input, intents)
+                if cached_response is None:
+                    cached_response, query_embedding = self.lookup_cached_response(user_input, intents, history)
+
+                # Identical opening questions asked at the same moment share one answer;
+                # waiting requests receive it whole once the leading stream finishes
+                if cached_response is None and not history:
+                    key = self.answer_key(user_input, intents)
+                    in_flight, is_leader = self.single_flight.join(key)
+                    if is_leader:
+                        flight = (key, in_flight)
+                    else:
+                        try:
+                            cached_response, context = in_flight.result(timeout=stage_timeout(None))
+                            self.tracer.annotate(answer_coalesced=True)
+                        except FutureTimeoutError:
+                            logger.warning("Shared answer is taking too long, answering independently")
+                        except Exception as e:
+                            logger.warning(f"Shared answer failed, answering independently: {e}")
+
+                if cached_response is None:
+                    context = (self.followup_context(intents, memory)
+                               or self.build_context(user_input, intents, query_embedding))
+
+            except Exception as e:
+                logger.error(f"Error in chat processing: {e}")
+                if flight is not None:
+                    self.single_flight.complete(*flight, error=e)
+                yield CHAT_ERROR_MESSAGE
+                return
+
+            if cached_response is not None:
+                self.remember_turn(memory, user_input, cached_response, context)
+                yield cached_response
+                return
+
+            # Stream final response, keeping the full text for the cache and the session history
+            chunks = []
+            finished = False
+            try:
+                for chunk in self.generate_response_stream(user_input, context, intent, history, intents):
+                    chunks.append(chunk)
+                    yield chunk
+                finished = True
+            finally:
+                # Never leave waiting requests hanging, even if this client disconnects mid-stream
+                if flight is not None:
+                    if finished:
+                        self.single_flight.complete(*flight, ("".join(chunks), context))
+                    else:
+                        self.single_flight.complete(*flight, error=RuntimeError("Answer stream was abandoned"))
+            response = "".join(chunks)
+            # The stream may be resumed outside this turn's context, so check the turn's own reasons
+            if not degraded:
+                self.store_cached_response(query_embedding, intents, response)
+            self.remember_turn(memory, user_input, response, context)
+
+    async def achat(self, user_input: str, session_id: Optional[str] = None) -> str:
+        """Async chat entry point for serving many concurrent sessions from one event loop."""
+        with self.tracer.trace('achat', session=session_id is not None), deadline_scope(self.request_deadline), \
+                degradation_scope():
+            try:
+                # Classify the query intents
+                with self.tracer.span('classify'):
+                    intents = self.classify_query_intent(user_input)
+                intent = self.primary_intent(intents)
+                self.tracer.annotate(intents=sorted(intents))
+                logger.info(f"Classified query intents: {sorted(intents)}")
+
+                memory = self.get_memory(session_id) if session_id else None
+                history = memory.render() if memory else ""
+
+                fact_response = self.answer_from_facts(user_input, intents)
+                if fact_response is not None:
+                    self.remember_turn(memory, user_input, fact_response, None)
+                    return fact_response
+
+                # The cache lookup embeds the query, which is a blocking call
+                loop = asyncio.get_running_loop()
+                cached_response, query_embedding = await loop.run_in_executor(
+                    None, in_context(self.lookup_cached_response), user_input, intents, history
+                )
+                if cached_response is not None:
+                    self.remember_turn(memory, user_input, cached_response, None)
+                    return cached_response
+
+                async def answer() -> Tuple[str, str]:
+                    context = self.followup_context(intents, memory)
+                    if context is None:
+                        context = await self.abuild_context(user_input, intents, query_embedding)
+
+                    # Generate final response
+                    response = await self.agenerate_response(user_input, context, intent, history, intents)
+                    self.store_cached_response(query_embedding, intents, response)
+                    return response, context
+
+                # Identical opening questions asked at the same moment share one answer
+                if history:
+                    response, context = await answer()
+                else:
+                    response, context = await self.acoalesce(self.answer_key(user_input, intents), answer)
+                self.remember_turn(memory, user_input, response, context)
+                return response
+
+            except Exception as e:
+                logger.error(f"Error in chat processing: {e}")
+                return CHAT_ERROR_MESSAGE
+
+    def _create_http_session(self) -> requests.Session:
+        """Create a pooled HTTP session with keep-alive and retry on transient upstream errors."""
+        retry = Retry(
+            total=self.http_max_retries,
+            read=0,  # A timed-out read already cost the full timeout; don't repeat it
+            backoff_factor=self.http_backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=self.http_pool_size,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _get_async_client(self) -> 'httpx.AsyncClient':
+        """Return the shared async HTTP client, creating it on first use."""
+        # Only the async entry points need httpx, so it is imported here
+        import httpx
+
+        if self.async_http_client is None:
+            self.async_http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.http_pool_size,
+                    max_keepalive_connections=self.http_pool_size
+                )
+            )
+        return self.async_http_client
+
+    async def _arequest(self, method: str, url: str, **kwargs) -> 'httpx.Response':
+        """Send an async request, retrying connection errors and 429/5xx with exponential backoff."""
+        import httpx
+
+        client = self._get_async_client()
+
+        for attempt in range(self.http_max_retries + 1):
+            is_last_attempt = attempt == self.http_max_retries
+            delay = self.http_backoff_factor * (2 ** attempt)
+
+            try:
+                response = await client.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if is_last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or is_last_attempt:
+                    return response
+
+                # Honour the upstream's Retry-After hint when it asks for a longer wait
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+
+            self.async_http_retries += 1
+            await asyncio.sleep(delay)
+
+    def http_pool_stats(self) -> dict:
+        """Return connection pool usage so the pool size can be tuned."""
+        if self._http_session is None:
+            return {'pool_size': self.http_pool_size, 'max_retries': self.http_max_retries,
+                    'hosts': {}, 'async_retries': self.async_http_retries}
+
+        adapter = self.http_session.get_adapter('https://')
+        pools = adapter.poolmanager.pools
+
+        hosts = {}
+        for pool_key in pools.keys():
+            pool = pools[pool_key]
+            idle_connections = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            hosts[f"{pool.scheme}://{pool.host}"] = {
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': idle_connections,
+            }
+
+        return {
+            'pool_size': self.http_pool_size,
+            'max_retries': self.http_max_retries,
+            'hosts': hosts,
+            'async_retries': self.async_http_retries,
+        }
+
+    def cache_stats(self) -> dict:
+        """Return hit/miss counters for the chatbot's caches."""
+        stats = {
+            'weather': self.weather_cache.stats(),
+            'news': self.news_cache.stats(),
+            'responses': self.response_cache.stats(),
+            'embeddings': self.embedding_cache.stats(),
+            'sessions': self.sessions.stats(),
+            'single_flight': self.single_flight.stats(),
+        }
+        if self.embedding_batcher is not None:
+            stats['embedding_batches'] = self.embedding_batcher.stats()
+        return stats
+
+    def generation_stats(self) -> dict:
+        """Return each generation profile's settings, calls, token usage and latency percentiles."""
+        latency = self.tracer.stats()
+        return {
+            name: dict(stats, latency=latency.get(f"generate.{name}", {}))
+            for name, stats in self.profile_stats.snapshot().items()
+        }
+
+    def circuit_stats(self) -> dict:
+        """Return each dependency's circuit state, timeout, bulkhead usage and call, failure and rejection counts."""
+        return {
+            name: dict(breaker.stats(), timeout_seconds=self.upstream_timeouts[name],
+                       bulkhead=self.bulkheads[name].stats())
+            for name, breaker in self.breakers.items()
+        }
+
+    def hedge_stats(self) -> dict:
+        """Return the shared hedge budget and each hedged dependency's hedges and backup wins."""
+        return {
+            'budget': self.hedge_budget.stats(),
+            'dependencies': {name: hedger.stats() for name, hedger in self.hedgers.items()},
+        }
+
+    def latency_stats(self) -> dict:
+        """Return p50/p95/p99 latency per pipeline stage."""
+        return self.tracer.stats()
+
+    async def aclose(self):
+        """Close the async HTTP client."""
+        if self.async_http_client is not None:
+            await self.async_http_client.aclose()
+            self.async_http_client = None
 
 
 def main():
@@ -322,8 +1728,8 @@ def main():
     print("Type 'quit' or 'exit' to end the conversation.\n")
 
     try:
-        # Initialize the chatbot
-        chatbot = NapaValleyConciergeChatbot()
+        # Initialize the chatbot, connecting backends while the visitor types
+        chatbot = NapaValleyConciergeChatbot(warm_up=True)
 
         # Chat loop
         while True:
@@ -336,10 +1742,11 @@ def main():
             if not user_input:
                 continue
 
-            # Get chatbot response
-            print("\nTohin: ", end="")
-            response = chatbot.chat(user_input)
-            print(response)
+            # Stream chatbot response as it is generated
+            print("\nTohin: ", end="", flush=True)
+            for chunk in chatbot.chat_stream(user_input, session_id="cli"):
+                print(chunk, end="", flush=True)
+            print()
 
     except KeyboardInterrupt:
         print("\n\nTohin: Goodbye! I'm Tohin, and thank you for visiting Napa Valley Premium Wines! 🍷")
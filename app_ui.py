@@ -2,6 +2,7 @@ import streamlit as st
 from app import NapaValleyConciergeChatbot
 import logging
 import time
+import uuid
 from datetime import datetime
 
 # Set page config first
@@ -20,7 +21,8 @@ logger = logging.getLogger(__name__)
 def init_chatbot():
     """Initialize chatbot with error handling."""
     try:
-        return NapaValleyConciergeChatbot()
+        # Backends load in the background so the page renders straight away
+        return NapaValleyConciergeChatbot(warm_up=True)
     except Exception as e:
         st.error(f"Failed to initialize chatbot: {e}")
         return None
@@ -47,7 +49,9 @@ def create_new_conversation():
     st.session_state["conversations"][conversation_id] = {
         "title": "New Conversation",
         "messages": [],
-        "created_at": datetime.now()
+        "created_at": datetime.now(),
+        # Unique across browser sessions, since the chatbot instance is shared
+        "session_id": uuid.uuid4().hex
     }
     st.session_state["current_conversation_id"] = conversation_id
     return conversation_id
@@ -67,6 +71,21 @@ def update_conversation_title(conversation_id, first_message):
         title = first_message
     st.session_state["conversations"][conversation_id]["title"] = title
 
+def render_message(content, is_user):
+    """Render a single chat message as ChatGPT-style HTML."""
+    role = "user" if is_user else "assistant"
+    avatar = "U" if is_user else "T"
+    return f"""
+        <div class="message-container {role}">
+            <div class="message-content">
+                <div class="message-avatar {role}">{avatar}</div>
+                <div class="message-text">
+                    <p>{content}</p>
+                </div>
+            </div>
+        </div>
+    """
+
 # ChatGPT-style CSS with compact welcome screen
 st.markdown("""
 <style>
@@ -513,6 +532,7 @@ with st.sidebar:
             with col2:
                 if st.button("🗑️", key=f"del_{conv_id}", help="Delete conversation"):
                     if conv_id in st.session_state["conversations"]:
+                        chatbot.end_session(conv_data["session_id"])
                         del st.session_state["conversations"][conv_id]
                         if conv_id == st.session_state["current_conversation_id"]:
                             if st.session_state["conversations"]:
@@ -529,6 +549,8 @@ with st.sidebar:
     st.markdown('<div class="sidebar-footer">', unsafe_allow_html=True)
     st.markdown('<div class="clear-history-btn">', unsafe_allow_html=True)
     if st.button("🗑️ Clear All Conversations", use_container_width=True, key="clear_all"):
+        for conv_data in st.session_state["conversations"].values():
+            chatbot.end_session(conv_data["session_id"])
         st.session_state["conversations"] = {}
         st.session_state["current_conversation_id"] = None
         st.session_state["conversation_counter"] = 0
@@ -546,28 +568,7 @@ st.markdown('<div class="chat-messages">', unsafe_allow_html=True)
 if current_conversation["messages"]:
     # Display messages ChatGPT style
     for i, message in enumerate(current_conversation["messages"]):
-        if message["is_user"]:
-            st.markdown(f"""
-                <div class="message-container user">
-                    <div class="message-content">
-                        <div class="message-avatar user">U</div>
-                        <div class="message-text">
-                            <p>{message['content']}</p>
-                        </div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
-        else:
-            st.markdown(f"""
-                <div class="message-container assistant">
-                    <div class="message-content">
-                        <div class="message-avatar assistant">T</div>
-                        <div class="message-text">
-                            <p>{message['content']}</p>
-                        </div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+        st.markdown(render_message(message["content"], message["is_user"]), unsafe_allow_html=True)
 else:
     # Compact Welcome screen
     st.markdown("""
@@ -614,10 +615,22 @@ if submitted and user_input.strip():
     if len(current_conversation["messages"]) == 1:
         update_conversation_title(st.session_state["current_conversation_id"], user_input)
     
-    # Get bot response
+    # Show the user message right away while the reply streams in
+    st.markdown(render_message(user_input, True), unsafe_allow_html=True)
+    response_placeholder = st.empty()
+    
+    # Stream bot response, rendering chunks as they arrive
+    response = ""
     try:
+        response_stream = chatbot.chat_stream(user_input, session_id=current_conversation["session_id"])
         with st.spinner("Tohin is thinking..."):
-            response = chatbot.chat(user_input)
+            response = next(response_stream, "")
+        response_placeholder.markdown(render_message(response + "▌", False), unsafe_allow_html=True)
+
+        for chunk in response_stream:
+            response += chunk
+            response_placeholder.markdown(render_message(response + "▌", False), unsafe_allow_html=True)
+        response_placeholder.markdown(render_message(response, False), unsafe_allow_html=True)
         
         if not response or not response.strip():
             response = "I'm sorry, I didn't generate a proper response. Please try asking again."
@@ -0,0 +1,204 @@
+"""
+Request batching and coalescing for the Tohin concierge chatbot
+Merges items submitted concurrently from many threads into batched calls, so
+N simultaneous query embeddings cost one API request instead of N, and lets
+identical in-flight requests share a single computation
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class MicroBatcher:
+    """Collects concurrently submitted items and processes them in batches.
+
+    A collector thread waits up to max_wait_ms after the first item of a batch
+    for more to arrive, then hands the batch to batch_fn on a small pool so a
+    slow batch doesn't hold up the next one. Duplicate items in a batch are
+    processed once.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], List[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, max_concurrent_batches: int = 4, name: str = 'micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix=name)
+        self._collector = None
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item: Hashable) -> Future:
+        """Queue an item and return a future for its result."""
+        with self._lock:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                self._collector.start()
+
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._executor.submit(self._process, batch)
+
+    def _process(self, batch: List[tuple]):
+        unique_items = list(dict.fromkeys(item for item, _ in batch))
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+
+        try:
+            results = self.batch_fn(unique_items)
+            if len(results) != len(unique_items):
+                raise ValueError(f"{self.name} returned {len(results)} results for {len(unique_items)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        by_item = dict(zip(unique_items, results))
+        for item, future in batch:
+            future.set_result(by_item[item])
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many batches were sent and their average size."""
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight computation.
+
+    The first caller for a key (the leader) runs the computation; callers that
+    arrive while it is running wait for and share its result or exception.
+    Nothing is cached once the computation finishes.
+    A waiting caller given a timeout runs the computation itself once it expires.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timed_out = 0
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Return the in-flight future for key and whether the caller leads, and so must complete it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+
+            future = self._calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def complete(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        """Publish the leader's result (or error) to every waiting caller."""
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """Run fn, or wait up to timeout for the identical call already in flight.
+
+        Returns the result and whether it was shared from another caller's call.
+        """
+        future, is_leader = self.join(key)
+        if not is_leader:
+            try:
+                return future.result(timeout), True
+            except FutureTimeoutError:
+                # The leader is stuck; don't let it take this caller down with it
+                with self._lock:
+                    self.timed_out += 1
+                return fn(), False
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.complete(key, future, error=e)
+            raise
+        self.complete(key, future, result)
+        return result, False
+
+    async def ado(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async variant of do() for callers on one event loop."""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            is_leader = future is None
+            if is_leader:
+                future = self._async_calls[loop_key] = loop.create_future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            # Shielded so a cancelled follower doesn't cancel the shared result
+            return await asyncio.shield(future), True
+
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._async_calls.pop(loop_key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many calls ran and how many were served by another caller's call."""
+        with self._lock:
+            total = self.leaders + self.coalesced
+            return {
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'coalesced_rate': self.coalesced / total if total else 0.0,
+                'timed_out': self.timed_out,
+                'in_flight': len(self._calls) + len(self._async_calls),
+            }
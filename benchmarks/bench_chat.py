@@ -0,0 +1,261 @@
+"""
+Offline benchmark for the Tohin chat pipeline
+Replays the recorded fixture sessions through NapaValleyConciergeChatbot.chat()
+against local stand-ins for Gemini, the embedding API, Perplexity and
+OpenWeatherMap, and reports throughput, error rate, per-stage latency
+percentiles and peak memory at each concurrency level.
+
+Run from the repository root:
+    python -m benchmarks.bench_chat
+    python -m benchmarks.bench_chat --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_chat --baseline benchmarks/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import google.generativeai as genai
+
+import config
+import app
+from facts import export_facts
+from retrieval import BM25Index, export_numpy_index
+from tracing import LatencyHistogram, QUANTILES
+from benchmarks.stubs import Latency, StubEmbedder, StubGenerativeModel, StubHTTPServer, stub_embedding
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+FIXTURES_PATH = os.path.join(BENCHMARK_DIR, 'fixtures.json')
+KNOWLEDGE_SOURCE = os.path.join(REPO_DIR, 'data', 'business_info.txt')
+
+# Canned replies the chatbot falls back to when a turn fails; fast, but not answers
+FALLBACK_REPLIES = {
+    app.GENERATION_ERROR_MESSAGE: 'generation_error',
+    app.CHAT_ERROR_MESSAGE: 'chat_error',
+}
+
+
+class FixtureCollection:
+    """Just enough of a Chroma collection to export the NumPy index from."""
+
+    def __init__(self, documents: List[str], embeddings: List[List[float]]):
+        self.documents = documents
+        self.embeddings = embeddings
+        self.metadata = config.embedding_metadata()
+
+    def get(self, include=None) -> dict:
+        return {'documents': self.documents, 'embeddings': self.embeddings}
+
+
+def load_documents(path: str) -> List[str]:
+    """Split the business information into one document per section."""
+    with open(path, 'r') as f:
+        return [section.strip() for section in f.read().split('\n\n') if section.strip()]
+
+
+def build_knowledge_base(workdir: str):
+    """Export NumPy and BM25 indexes and the extracted facts of the business information into workdir."""
+    documents = load_documents(KNOWLEDGE_SOURCE)
+    embeddings = [stub_embedding(document, config.EMBEDDING_DIMENSION) for document in documents]
+    export_numpy_index(FixtureCollection(documents, embeddings), app.NUMPY_INDEX_PATH)
+    BM25Index.build(documents).save(app.BM25_INDEX_PATH)
+    export_facts([KNOWLEDGE_SOURCE], app.FACTS_PATH)
+
+
+def configure_environment(workdir: str, server_url: str):
+    """Point the chatbot at the stand-ins and keep every file it writes inside workdir."""
+    os.environ.update({
+        'GEMINI_API_KEY': 'benchmark',
+        'PERPLEXITY_API_KEY': 'benchmark',
+        'WEATHER_API_KEY': 'benchmark',
+        'RETRIEVER_BACKEND': 'numpy',
+        'HYBRID_RETRIEVAL': 'true',
+        'INTENT_EMBEDDING_FALLBACK': 'false',
+        'INTENT_KEYWORDS_PATH': os.path.join(REPO_DIR, 'intent_keywords.json'),
+        'TRACE_FILE': os.path.join(workdir, 'traces.jsonl'),
+    })
+    os.environ.pop('METRICS_PORT', None)
+
+    app.PERPLEXITY_URL = f"{server_url}/perplexity"
+    app.OPENWEATHERMAP_URL = f"{server_url}/weather"
+    app.NUMPY_INDEX_PATH = os.path.join(workdir, 'numpy_index')
+    app.BM25_INDEX_PATH = os.path.join(workdir, 'bm25_index.json')
+    app.FACTS_PATH = os.path.join(workdir, 'facts.json')
+    app.SEMANTIC_CACHE_PATH = os.path.join(workdir, 'semantic_cache.sqlite3')
+    app.EMBEDDING_CACHE_PATH = os.path.join(workdir, 'embedding_cache.sqlite3')
+    config.INDEX_VERSION_PATH = os.path.join(workdir, 'index_version')
+
+
+def run_level(concurrency: int, fixtures: dict, latency: Latency, server: StubHTTPServer) -> dict:
+    """Run `concurrency` sessions at once, each replaying one fixture conversation, on a cold chatbot."""
+    with tempfile.TemporaryDirectory(prefix='tohin-bench-') as workdir:
+        configure_environment(workdir, server.url)
+        build_knowledge_base(workdir)
+
+        embedder = StubEmbedder(latency, config.EMBEDDING_DIMENSION)
+        genai.embed_content = embedder
+
+        tracemalloc.start()
+        chatbot = app.NapaValleyConciergeChatbot()
+        chatbot.gemini_model = StubGenerativeModel(fixtures['gemini_responses'], latency)
+
+        turn_latency = LatencyHistogram(window=100000)
+        errors = dict.fromkeys(FALLBACK_REPLIES.values(), 0)
+        sessions = [fixtures['sessions'][i % len(fixtures['sessions'])] for i in range(concurrency)]
+
+        def run_session(index: int):
+            session_id = f"bench-{concurrency}-{index}"
+            turns = []
+            for query in sessions[index]:
+                started_at = time.perf_counter()
+                response = chatbot.chat(query, session_id=session_id)
+                turns.append((time.perf_counter() - started_at, FALLBACK_REPLIES.get(response)))
+            return turns
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for turns in executor.map(run_session, range(concurrency)):
+                for seconds, error in turns:
+                    turn_latency.observe(seconds)
+                    if error:
+                        errors[error] += 1
+        elapsed = time.perf_counter() - started_at
+
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stages = chatbot.tracer.stats()
+        chatbot.context_executor.shutdown(wait=True)
+
+        return {
+            'concurrency': concurrency,
+            'turns': turn_latency.count,
+            'elapsed_s': elapsed,
+            'throughput_per_s': turn_latency.count / elapsed if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': sum(errors.values()) / turn_latency.count if turn_latency.count else 0.0,
+            'latency_ms': {f"p{int(q * 100)}": turn_latency.percentile(q) * 1000 for q in QUANTILES},
+            'stages': {stage: stats for stage, stats in stages.items() if stage != 'chat'},
+            'peak_memory_mb': peak_bytes / 1024 / 1024,
+            'retained_memory_mb': current_bytes / 1024 / 1024,
+            'calls': {
+                'gemini': chatbot.gemini_model.calls,
+                'embedding': embedder.calls,
+                'http': server.requests,
+            },
+        }
+
+
+def print_report(results: Dict[str, dict]):
+    """Print a summary table per concurrency level followed by stage percentiles."""
+    print(f"\n{'Sessions':>8} {'Turns':>6} {'Turns/s':>9} {'Errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'Peak MB':>8}")
+    for result in results.values():
+        latency = result['latency_ms']
+        print(f"{result['concurrency']:>8} {result['turns']:>6} {result['throughput_per_s']:>9.2f} "
+              f"{result['error_rate']:>7.1%} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} "
+              f"{result['peak_memory_mb']:>8.1f}")
+
+    for result in results.values():
+        print(f"\nStages at {result['concurrency']} concurrent sessions (calls: {result['calls']}, "
+              f"fallback replies: {result['errors']})")
+        print(f"  {'Stage':<18} {'Count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, stats in result['stages'].items():
+            print(f"  {stage:<18} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+def compare_to_baseline(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float,
+                        error_tolerance: float) -> List[str]:
+    """Return a description of every level whose throughput, p95 latency or error rate regressed beyond tolerance."""
+    regressions = []
+    for level, result in results.items():
+        previous = baseline.get(level)
+        if previous is None:
+            continue
+
+        throughput_change = result['throughput_per_s'] / previous['throughput_per_s'] - 1
+        p95_change = result['latency_ms']['p95'] / previous['latency_ms']['p95'] - 1
+        # Baselines saved before error rates were recorded were taken from error-free runs
+        error_change = result['error_rate'] - previous.get('error_rate', 0.0)
+        print(f"{level:>8} sessions: throughput {throughput_change:+.1%}, p95 latency {p95_change:+.1%}, "
+              f"error rate {error_change * 100:+.1f} points")
+
+        if throughput_change < -tolerance:
+            regressions.append(f"{level} sessions: throughput dropped {-throughput_change:.1%}")
+        if p95_change > tolerance:
+            regressions.append(f"{level} sessions: p95 latency rose {p95_change:.1%}")
+        # Fallback replies are fast, so a rise can hide behind better throughput and latency
+        if error_change > error_tolerance:
+            regressions.append(f"{level} sessions: error rate rose to {result['error_rate']:.1%}")
+    return regressions
+
+
+def main():
+    """Run the benchmark and optionally save or compare against a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the chat pipeline against local stand-ins.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100],
+                        help="Concurrent sessions per run (default: 1 10 100)")
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help="Multiplier for the fixture's injected latencies, e.g. 0.1 for a quick run")
+    parser.add_argument('--jitter', type=float, default=0.2,
+                        help="Uniform jitter applied to each injected delay (default: 0.2 = ±20%%)")
+    parser.add_argument('--fixtures', default=FIXTURES_PATH, help="Recorded fixture file")
+    parser.add_argument('--output', help="Write the full results as JSON")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Save these results as the baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Allowed throughput drop or p95 rise before failing (default: 0.10)")
+    parser.add_argument('--error-tolerance', type=float, default=0.0,
+                        help="Allowed rise in the share of fallback replies before failing (default: 0.0)")
+    args = parser.parse_args()
+
+    # Per-turn INFO logs would swamp the report
+    logging.getLogger('app').setLevel(logging.WARNING)
+
+    with open(args.fixtures, 'r') as f:
+        fixtures = json.load(f)
+    latency = Latency(fixtures['latency_ms'], jitter=args.jitter, scale=args.latency_scale)
+
+    results = {}
+    with StubHTTPServer(fixtures['perplexity_response'], fixtures['weather_response'], latency) as server:
+        for concurrency in args.concurrency:
+            print(f"Running {concurrency} concurrent session(s)...")
+            results[str(concurrency)] = run_level(concurrency, fixtures, latency, server)
+
+    print_report(results)
+
+    report = {'latency_scale': args.latency_scale, 'jitter': args.jitter, 'levels': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('latency_scale') != args.latency_scale:
+            print("\n⚠️  Baseline was recorded with a different --latency-scale; comparison may be misleading.")
+
+        print(f"\nCompared with {args.baseline}:")
+        regressions = compare_to_baseline(results, baseline['levels'], args.tolerance, args.error_tolerance)
+        if regressions:
+            print("\n❌ Performance regressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\n✅ No regressions beyond tolerance.")
+
+
+if __name__ == "__main__":
+    main()
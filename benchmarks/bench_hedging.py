@@ -0,0 +1,143 @@
+"""
+Hedging benchmark for Perplexity and Gemini calls
+Sends the same requests with hedging off and then on against local stand-ins
+whose latency has a slow tail, and reports p50/p95/p99 latency, the share of
+calls that were hedged and how much hedging improved p99.
+
+Run from the repository root:
+    python -m benchmarks.bench_hedging
+    python -m benchmarks.bench_hedging --slow-fraction 0.05 --slow-factor 10 --requests 400
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+import google.generativeai as genai
+
+import config
+import app
+from tracing import LatencyHistogram, QUANTILES
+from benchmarks.bench_chat import FIXTURES_PATH, configure_environment
+from benchmarks.stubs import Latency, StubEmbedder, StubGenerativeModel, StubHTTPServer
+
+
+def measure(call: Callable[[int], object], requests: int, concurrency: int) -> LatencyHistogram:
+    """Time `requests` calls made from `concurrency` threads."""
+    latency = LatencyHistogram(window=requests)
+
+    def timed(index: int) -> float:
+        started_at = time.perf_counter()
+        call(index)
+        return time.perf_counter() - started_at
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for seconds in executor.map(timed, range(requests)):
+            latency.observe(seconds)
+    return latency
+
+
+def run_mode(hedging: bool, args, fixtures: dict) -> Dict[str, dict]:
+    """Measure Perplexity and Gemini calls on a fresh chatbot, with or without hedging."""
+    # The same seed gives both modes the same latency distribution
+    latency = Latency(fixtures['latency_ms'], jitter=args.jitter, scale=args.latency_scale,
+                      slow_fraction=args.slow_fraction, slow_factor=args.slow_factor)
+
+    with StubHTTPServer(fixtures['perplexity_response'], fixtures['weather_response'], latency) as server, \
+            tempfile.TemporaryDirectory(prefix='tohin-hedge-') as workdir:
+        configure_environment(workdir, server.url)
+        os.environ.update({
+            'HEDGE_DEPENDENCIES': 'gemini,perplexity' if hedging else '',
+            'HEDGE_PERCENTILE': str(args.percentile),
+            'HEDGE_MAX_RATE': str(args.max_rate),
+            # Measure the calls themselves, not how the deadline cuts them short
+            'REQUEST_DEADLINE_SECONDS': '0',
+        })
+        genai.embed_content = StubEmbedder(latency, config.EMBEDDING_DIMENSION)
+
+        chatbot = app.NapaValleyConciergeChatbot()
+        chatbot.gemini_model = StubGenerativeModel(fixtures['gemini_responses'], latency)
+        queries = [query for session in fixtures['sessions'] for query in session]
+
+        results = {}
+        calls = {
+            # Straight to the upstream, past the news cache and request coalescing
+            'perplexity': lambda i: chatbot._fetch_realtime_info(f"{queries[i % len(queries)]} ({i})"),
+            'gemini': lambda i: chatbot.generate_response(queries[i % len(queries)], "", 'business'),
+        }
+        for dependency, call in calls.items():
+            histogram = measure(call, args.requests, args.concurrency)
+            hedger = chatbot.hedgers.get(dependency)
+            hedger_stats = hedger.stats() if hedger is not None else {'hedges': 0, 'hedge_wins': 0}
+            results[dependency] = {
+                'latency_ms': {f"p{int(q * 100)}": histogram.percentile(q) * 1000 for q in QUANTILES},
+                'hedge_rate': hedger_stats['hedges'] / args.requests,
+                'hedge_wins': hedger_stats['hedge_wins'],
+            }
+        results['budget'] = chatbot.hedge_budget.stats()
+        return results
+
+
+def print_report(off: Dict[str, dict], on: Dict[str, dict]):
+    print(f"\n{'Dependency':<12} {'Hedging':<8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Hedged':>8} {'Won':>5}")
+    for dependency in ('perplexity', 'gemini'):
+        for mode, results in (('off', off), ('on', on)):
+            result = results[dependency]
+            latency = result['latency_ms']
+            print(f"{dependency:<12} {mode:<8} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} "
+                  f"{result['hedge_rate']:>8.1%} {result['hedge_wins']:>5}")
+
+    print()
+    for dependency in ('perplexity', 'gemini'):
+        before = off[dependency]['latency_ms']['p99']
+        after = on[dependency]['latency_ms']['p99']
+        print(f"{dependency} p99: {before:.1f} ms -> {after:.1f} ms ({1 - after / before:+.1%} improvement)")
+    print(f"Overall hedge rate {on['budget']['hedge_rate']:.1%} of {on['budget']['calls']} calls "
+          f"(budget {on['budget']['max_rate']:.0%}, {on['budget']['denied']} hedges denied)")
+
+
+def main():
+    """Run the hedging benchmark."""
+    parser = argparse.ArgumentParser(description="Measure how request hedging changes Perplexity and Gemini tail latency.")
+    parser.add_argument('--requests', type=int, default=300, help="Calls per dependency and mode (default: 300)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Concurrent callers (default: 4)")
+    parser.add_argument('--latency-scale', type=float, default=0.2,
+                        help="Multiplier for the fixture's injected latencies (default: 0.2)")
+    parser.add_argument('--jitter', type=float, default=0.2,
+                        help="Uniform jitter applied to each injected delay (default: 0.2 = ±20%%)")
+    parser.add_argument('--slow-fraction', type=float, default=0.05,
+                        help="Share of upstream calls that are slow (default: 0.05)")
+    parser.add_argument('--slow-factor', type=float, default=10.0,
+                        help="How many times slower a slow call is (default: 10)")
+    parser.add_argument('--percentile', type=float, default=0.95,
+                        help="Latency percentile after which a backup request is sent (default: 0.95)")
+    parser.add_argument('--max-rate', type=float, default=0.1,
+                        help="Most backup requests as a share of calls (default: 0.1)")
+    parser.add_argument('--fixtures', default=FIXTURES_PATH, help="Recorded fixture file")
+    parser.add_argument('--output', help="Write the full results as JSON")
+    args = parser.parse_args()
+
+    logging.getLogger('app').setLevel(logging.WARNING)
+
+    with open(args.fixtures, 'r') as f:
+        fixtures = json.load(f)
+
+    print("Running without hedging...")
+    off = run_mode(False, args, fixtures)
+    print("Running with hedging...")
+    on = run_mode(True, args, fixtures)
+
+    print_report(off, on)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'arguments': vars(args), 'off': off, 'on': on}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Local stand-ins for Gemini, the embedding API, Perplexity and OpenWeatherMap
+Each replays recorded responses after an injected delay, so benchmark runs are
+repeatable and never touch the network or spend API quota
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List
+
+
+class Latency:
+    """Injected delays in milliseconds per service, with optional uniform jitter.
+
+    A slow_fraction of calls take slow_factor times as long, for a long tail
+    like real upstreams have.
+    """
+
+    def __init__(self, delays_ms: Dict[str, float], jitter: float = 0.2, scale: float = 1.0, seed: int = 0,
+                 slow_fraction: float = 0.0, slow_factor: float = 10.0):
+        self.delays_ms = delays_ms
+        self.jitter = jitter
+        self.scale = scale
+        self.slow_fraction = slow_fraction
+        self.slow_factor = slow_factor
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def seconds(self, service: str) -> float:
+        base = self.delays_ms.get(service, 0.0) * self.scale / 1000.0
+        with self._lock:
+            factor = 1.0 + self._random.uniform(-self.jitter, self.jitter)
+            if self.slow_fraction and self._random.random() < self.slow_fraction:
+                factor *= self.slow_factor
+        return max(0.0, base * factor)
+
+    def sleep(self, service: str):
+        time.sleep(self.seconds(service))
+
+
+def stub_embedding(text: str, dimension: int) -> List[float]:
+    """Deterministic pseudo-embedding derived from the text's hash."""
+    digest = hashlib.sha256(text.lower().encode('utf-8')).digest()
+    rng = random.Random(digest)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dimension)]
+
+
+class StubEmbedder:
+    """Drop-in for genai.embed_content."""
+
+    def __init__(self, latency: Latency, dimension: int):
+        self.latency = latency
+        self.dimension = dimension
+        self.calls = 0
+
+    def __call__(self, model: str, content, task_type: str = None, **kwargs) -> dict:
+        self.calls += 1
+        self.latency.sleep('embedding')
+        if isinstance(content, list):
+            return {'embedding': [stub_embedding(text, self.dimension) for text in content]}
+        return {'embedding': stub_embedding(content, self.dimension)}
+
+
+class StubGenerativeModel:
+    """Drop-in for genai.GenerativeModel that replays recorded answers."""
+
+    def __init__(self, responses: List[str], latency: Latency, stream_chunks: int = 8):
+        self.responses = responses
+        self.latency = latency
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+
+    def _pick(self, prompt) -> str:
+        digest = hashlib.sha256(str(prompt).encode('utf-8')).digest()
+        return self.responses[digest[0] % len(self.responses)]
+
+    def _stream(self, text: str, delay: float):
+        words = text.split(' ')
+        size = max(1, len(words) // self.stream_chunks)
+        for start in range(0, len(words), size):
+            time.sleep(delay / self.stream_chunks)
+            yield SimpleNamespace(text=' '.join(words[start:start + size]) + ' ')
+
+    def generate_content(self, prompt, generation_config=None, stream: bool = False, **kwargs):
+        self.calls += 1
+        text = self._pick(prompt)
+        delay = self.latency.seconds('gemini')
+        if stream:
+            return self._stream(text, delay)
+        time.sleep(delay)
+        return SimpleNamespace(text=text)
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency.seconds('gemini'))
+        return SimpleNamespace(text=self._pick(prompt))
+
+
+class StubHTTPServer:
+    """Serves recorded Perplexity and OpenWeatherMap payloads on localhost."""
+
+    def __init__(self, perplexity_response: dict, weather_response: dict, latency: Latency):
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so the chatbot's connection pooling is exercised
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, service: str, payload: dict):
+                stub.requests += 1
+                latency.sleep(service)
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply('weather', weather_response)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(length)
+                self._reply('perplexity', perplexity_response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> 'StubHTTPServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
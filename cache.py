@@ -0,0 +1,484 @@
+"""
+Caching utilities for the Tohin concierge chatbot
+Thread-safe caches shared by every session served from one chatbot instance
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after a time-to-live."""
+
+    def __init__(self, ttl_seconds: Optional[float], max_entries: int = 128,
+                 clock: Callable[[], float] = time.monotonic):
+        """Create a cache; a ttl_seconds of None keeps entries until they are evicted."""
+        self.clock = clock
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                # Expired entries are dropped on access
+                del self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries when full."""
+        expires_at = None if self.ttl_seconds is None else self.clock() + self.ttl_seconds
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key from the cache and return its value."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+
+class StaleWhileRevalidateCache:
+    """Bounded, thread-safe cache that keeps serving entries while they refresh in the background.
+
+    Entries younger than soft_ttl_seconds are fresh. Older entries are still
+    served, and the first lookup that finds one stale schedules a single
+    background reload. Entries older than hard_ttl_seconds are never served;
+    the caller has to load them again.
+    """
+
+    def __init__(self, soft_ttl_seconds: float, hard_ttl_seconds: float, max_entries: int = 128,
+                 refresh_workers: int = 2, name: str = 'swr-refresh', clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.soft_ttl_seconds = soft_ttl_seconds
+        self.hard_ttl_seconds = max(hard_ttl_seconds, soft_ttl_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix=name)
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def peek(self, key: Hashable) -> Tuple[Any, str]:
+        """Return the cached value and whether it is 'fresh', 'stale' or a 'miss' (value None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = self.clock() - stored_at
+                if age < self.hard_ttl_seconds:
+                    self._entries.move_to_end(key)
+                    if age < self.soft_ttl_seconds:
+                        self.hits += 1
+                        return value, 'fresh'
+                    self.stale_hits += 1
+                    return value, 'stale'
+
+                # Entries past the hard TTL are dropped on access
+                del self._entries[key]
+
+            self.misses += 1
+            return None, 'miss'
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        """Return the cached value, serving stale entries while they refresh and loading misses inline."""
+        value, status = self.peek(key)
+        if status == 'stale':
+            self.refresh(key, loader)
+        elif status == 'miss':
+            value = loader()
+            self.set(key, value)
+        return value, status
+
+    def set(self, key: Hashable, value: Any):
+        """Store a freshly loaded value, evicting the least recently used entries when full."""
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def needs_refresh(self, key: Hashable) -> bool:
+        """Return whether key is missing or past its soft TTL, without counting a lookup."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is None or self.clock() - entry[1] >= self.soft_ttl_seconds
+
+    def refresh(self, key: Hashable, loader: Callable[[], Any]) -> bool:
+        """Reload key in the background unless a reload is already running; return whether one was scheduled."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+
+        self._executor.submit(self._refresh, key, loader)
+        return True
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any]):
+        try:
+            value = loader()
+        except Exception:
+            # The stale value keeps being served until a later refresh succeeds
+            with self._lock:
+                self.refresh_errors += 1
+            return
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+        self.set(key, value)
+        with self._lock:
+            self.refreshes += 1
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/stale/miss counters, background refresh outcomes and current size."""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'refreshing': len(self._refreshing),
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'soft_ttl_seconds': self.soft_ttl_seconds,
+                'hard_ttl_seconds': self.hard_ttl_seconds,
+            }
+
+
+class SemanticCache:
+    """Response cache that matches new queries to earlier ones by embedding similarity.
+
+    Entries are kept in memory for lookups and mirrored to a SQLite file so the
+    cache survives restarts. The whole cache is dropped when version_fn reports
+    a different knowledge base version than the one the entries were built on.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.92, ttl_seconds: float = 86400,
+                 max_entries: int = 1000, version_fn: Optional[Callable[[], str]] = None,
+                 clock: Callable[[], float] = time.time):
+        # Wall-clock time, as created_at is persisted across restarts
+        self.clock = clock
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version_fn = version_fn or (lambda: '')
+        self._lock = threading.Lock()
+
+        # entry id -> (intent, unit vector, response, created_at), in LRU order
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # WAL lets server worker processes read while another one writes
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, intent TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        """Load persisted entries, discarding them if the knowledge base changed."""
+        self._index_version = self.version_fn()
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'index_version'").fetchone()
+        if row is None or row[0] != self._index_version:
+            self._reset()
+            return
+
+        rows = self._conn.execute(
+            "SELECT id, intent, embedding, response, created_at FROM entries ORDER BY last_used"
+        ).fetchall()
+        for entry_id, intent, blob, response, created_at in rows:
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self._entries[entry_id] = (intent, vector, response, created_at)
+
+    def _reset(self):
+        """Drop every entry and record the current knowledge base version."""
+        self._entries.clear()
+        self._conn.execute("DELETE FROM entries")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('index_version', ?)", (self._index_version,)
+        )
+        self._conn.commit()
+
+    def _check_version(self):
+        """Invalidate the cache if the knowledge base was rebuilt since it was filled."""
+        current_version = self.version_fn()
+        if current_version != self._index_version:
+            self._index_version = current_version
+            self._reset()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding: List[float], intent: str) -> Optional[str]:
+        """Return the stored response for the most similar earlier query, if close enough."""
+        query_vector = self._normalize(embedding)
+
+        with self._lock:
+            self._check_version()
+            now = self.clock()
+            best_id, best_score = None, self.threshold
+            expired = []
+
+            for entry_id, (entry_intent, vector, _, created_at) in self._entries.items():
+                if now - created_at > self.ttl_seconds:
+                    expired.append(entry_id)
+                    continue
+                if entry_intent != intent or vector.shape != query_vector.shape:
+                    continue
+                score = float(np.dot(vector, query_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if expired:
+                self._delete(expired)
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE id = ?", (now, best_id))
+            self._conn.commit()
+            return self._entries[best_id][2]
+
+    def put(self, embedding: List[float], intent: str, response: str):
+        """Store a response for the query embedding, evicting least recently used entries."""
+        vector = self._normalize(embedding)
+
+        with self._lock:
+            self._check_version()
+            now = self.clock()
+            cursor = self._conn.execute(
+                "INSERT INTO entries (intent, embedding, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (intent, vector.tobytes(), response, now, now)
+            )
+            self._entries[cursor.lastrowid] = (intent, vector, response, now)
+
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self.evictions += overflow
+                self._delete(list(self._entries)[:overflow])
+            self._conn.commit()
+
+    def _delete(self, entry_ids: List[int]):
+        for entry_id in entry_ids:
+            del self._entries[entry_id]
+        self._conn.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+        self._conn.commit()
+
+    def clear(self):
+        """Remove every entry from memory and disk."""
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'threshold': self.threshold,
+            }
+
+
+class EmbeddingCache:
+    """Memoizes embeddings by normalized text and model.
+
+    A small in-memory LRU sits in front of a SQLite store of float32 blobs, so
+    repeated queries skip the embedding call and warm restarts keep their hits.
+    """
+
+    def __init__(self, path: str, max_memory_entries: int = 2048, max_disk_entries: int = 100000):
+        self.max_disk_entries = max_disk_entries
+        self._memory = TTLCache(ttl_seconds=None, max_entries=max_memory_entries)
+        self._lock = threading.Lock()
+
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # WAL lets server worker processes read while another one writes
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normalize query text so trivial variations share one cache entry."""
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def make_key(self, model: str, text: str, task_type: str) -> str:
+        """Return the cache key for a text embedded with a given model and task type."""
+        raw_key = f"{model}\n{task_type}\n{self.normalize_text(text)}"
+        return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, text: str, task_type: str) -> Optional[List[float]]:
+        """Return a memoized embedding without calling the embedding API."""
+        key = self.make_key(model, text, task_type)
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            return vector.tolist()
+
+        with self._lock:
+            row = self._conn.execute("SELECT embedding FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        self._memory.set(key, vector)
+        return vector.tolist()
+
+    def put(self, model: str, text: str, task_type: str, embedding: List[float]):
+        """Memoize an embedding in memory and on disk."""
+        key = self.make_key(model, text, task_type)
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._memory.set(key, vector)
+
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                (key, vector.tobytes(), time.time())
+            )
+            self._disk_count += cursor.rowcount
+
+            # Trim the least recently used rows once the store outgrows its budget
+            overflow = self._disk_count - self.max_disk_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (overflow,)
+                )
+                self._disk_count -= overflow
+            self._conn.commit()
+
+    def get_or_compute(self, model: str, text: str, task_type: str,
+                       compute_fn: Callable[[], List[float]]) -> List[float]:
+        """Return the memoized embedding, calling compute_fn only on a miss."""
+        embedding = self.get(model, text, task_type)
+        if embedding is None:
+            embedding = compute_fn()
+            self.put(model, text, task_type, embedding)
+        return embedding
+
+    def stats(self) -> Dict[str, Any]:
+        """Return memory/disk hit counters and store sizes."""
+        memory_stats = self._memory.stats()
+        with self._lock:
+            lookups = memory_stats['hits'] + self.disk_hits + self.misses
+            return {
+                'memory_hits': memory_stats['hits'],
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (memory_stats['hits'] + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_size': memory_stats['size'],
+                'disk_size': self._disk_count,
+            }
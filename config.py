@@ -0,0 +1,99 @@
+"""
+Shared configuration for the Tohin concierge chatbot and the ingestion script
+"""
+
+import os
+import uuid
+
+# Vector store location and collection
+CHROMA_DB_PATH = './chroma_db'
+COLLECTION_NAME = 'wine_business_knowledge'
+
+# Stamp rewritten by ingest.py whenever the knowledge base changes
+INDEX_VERSION_PATH = os.path.join(CHROMA_DB_PATH, 'index_version')
+
+# Name of the collection currently serving queries; swapped atomically by migrations
+ACTIVE_COLLECTION_PATH = os.path.join(CHROMA_DB_PATH, 'active_collection')
+
+# Exact in-process index exported by ingest.py for the 'numpy' retriever backend
+NUMPY_INDEX_PATH = os.path.join(CHROMA_DB_PATH, 'numpy_index')
+
+# Precomputed BM25 inverted index exported by ingest.py for hybrid retrieval
+BM25_INDEX_PATH = os.path.join(CHROMA_DB_PATH, 'bm25_index.json')
+
+# Hours, contacts, prices and club tiers extracted by ingest.py for templated answers
+FACTS_PATH = os.path.join(CHROMA_DB_PATH, 'facts.json')
+
+# Embedding model for both documents and queries; recorded in the collection metadata
+EMBEDDING_MODEL = 'models/text-embedding-004'
+EMBEDDING_DIMENSION = 768
+
+# Keyword rules and fallback examples for intent classification
+INTENT_KEYWORDS_PATH = './intent_keywords.json'
+
+# Local caches that survive restarts
+CACHE_DIR = './.cache'
+SEMANTIC_CACHE_PATH = os.path.join(CACHE_DIR, 'semantic_cache.sqlite3')
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, 'embedding_cache.sqlite3')
+
+# Per-turn latency traces, one JSON object per line
+TRACE_PATH = os.path.join(CACHE_DIR, 'traces.jsonl')
+
+
+def _atomic_write(path: str, text: str):
+    """Write a small file via rename so readers never see a partial write."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _read_text(path: str) -> str:
+    """Return a small file's stripped contents, or an empty string if it does not exist."""
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ''
+
+
+def embedding_metadata() -> dict:
+    """Collection metadata describing how its documents were embedded."""
+    return {'embedding_model': EMBEDDING_MODEL, 'embedding_dimension': EMBEDDING_DIMENSION}
+
+
+def check_embedding_metadata(metadata: dict):
+    """Raise ValueError if an index was built with a different embedding model than queries use."""
+    metadata = metadata or {}
+    indexed_model = metadata.get('embedding_model')
+    indexed_dimension = metadata.get('embedding_dimension')
+
+    if indexed_model != EMBEDDING_MODEL or indexed_dimension != EMBEDDING_DIMENSION:
+        raise ValueError(
+            f"Knowledge base was embedded with {indexed_model or 'an unrecorded model'} "
+            f"({indexed_dimension or 'unknown'} dims) but queries use {EMBEDDING_MODEL} "
+            f"({EMBEDDING_DIMENSION} dims). Run `python ingest.py --migrate` to re-embed it."
+        )
+
+
+def read_active_collection() -> str:
+    """Return the name of the collection that should serve queries."""
+    return _read_text(ACTIVE_COLLECTION_PATH) or COLLECTION_NAME
+
+
+def write_active_collection(name: str):
+    """Atomically point queries at a different collection."""
+    _atomic_write(ACTIVE_COLLECTION_PATH, name)
+
+
+def read_index_version() -> str:
+    """Return the current knowledge base version, or an empty string if it was never stamped."""
+    return _read_text(INDEX_VERSION_PATH)
+
+
+def bump_index_version() -> str:
+    """Stamp the knowledge base with a new version so dependent caches invalidate themselves."""
+    version = uuid.uuid4().hex
+    _atomic_write(INDEX_VERSION_PATH, version)
+    return version
@@ -0,0 +1,263 @@
+"""
+Structured business facts for the Tohin concierge chatbot
+ingest.py extracts hours, contacts, prices, tasting experiences and wine club
+tiers from the source documents into facts.json, and the chatbot answers
+simple lookups about them from templates without retrieval or generation.
+"""
+
+import os
+import re
+import json
+from typing import Iterable, List, Optional, Set, Tuple
+
+# Headings of the source sections whose priced items are wines or tasting experiences
+WINE_SECTIONS = ('WINE PORTFOLIO',)
+TASTING_SECTIONS = ('TASTING EXPERIENCES',)
+
+# "Label: value" contact lines
+CONTACT_LABELS = {
+    'address': 'Address',
+    'phone': 'Phone',
+    'email': 'Email',
+    'website': 'Website',
+}
+
+PRICED_ITEM = re.compile(r'^(?P<name>[A-Z][^$]*?)\s+-\s+\$(?P<price>\d+(?:\.\d{2})?)\s*(?P<unit>.*)$')
+OPENING_HOURS = re.compile(
+    r'^Open (?P<days>[^:]+):\s*(?P<opens>\d{1,2}:\d{2}\s*[AP]M)\s*-\s*(?P<closes>\d{1,2}:\d{2}\s*[AP]M)',
+    re.IGNORECASE
+)
+CLUB_TIER = re.compile(r'(?P<name>[A-Z][a-z]+) \(\$(?P<price>\d+(?:\.\d{2})?)/(?P<period>\w+)\)')
+CLUB_DISCOUNT = re.compile(r'(\d+%) off')
+
+# Question words and filler that don't change what a lookup is about
+FILLER_WORDS = {
+    'a', 'about', 'an', 'and', 'any', 'are', 'at', 'bottle', 'can', 'could', 'do', 'does', 'for', 'get', 'give',
+    'hello', 'hey', 'hi', 'how', 'i', 'is', 'it', 'its', 'know', 'let', 'me', 'my', 'of', 'on', 'please',
+    'reach', 's', 'tell', 'thanks', 'the', 'there', 'to', 'us', 'wanted', 'we', 'what', 'whats', 'when', 'where',
+    'which', 'you', 'your', 'yours',
+}
+
+# Words that ask for each kind of fact, plus words that merely set its context
+QUESTION_TERMS = {
+    'hours': ({'hours', 'hour', 'open', 'opening', 'close', 'closing', 'closed'},
+              {'tasting', 'room', 'winery', 'today', 'daily', 'weekend', 'weekends', 'time', 'times', 'are', 'what'}),
+    'phone': ({'phone', 'call', 'telephone', 'number'}, {'contact'}),
+    'email': ({'email', 'e-mail', 'mail'}, {'address', 'contact'}),
+    'address': ({'address', 'located', 'location'}, {'winery', 'street', 'find'}),
+    'website': ({'website', 'site', 'url', 'web'}, {'online'}),
+    'club': ({'club', 'membership', 'tiers', 'tier', 'levels', 'join'}, {'wine', 'member', 'members', 'cost', 'price', 'prices'}),
+}
+PRICE_TERMS = {'price', 'prices', 'cost', 'costs', 'much', 'priced', 'charge', 'fee'}
+# Only units the facts are priced in; a question about another unit, like a glass, is left unexplained
+PRICE_CONTEXT_TERMS = {'wine', 'tasting', 'per', 'person', 'bottle'}
+
+# Words shared by the whole portfolio, which can't tell one item from another
+GENERIC_ITEM_WORDS = {'napa', 'valley'}
+
+TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with apostrophes dropped, so "what's" reads as "whats"."""
+    return TOKEN.findall(text.lower().replace("'", "").replace("’", ""))
+
+
+def stem(token: str) -> str:
+    """Crude plural folding, enough to match "tour" against "Private Tours"."""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def is_heading(line: str) -> bool:
+    """Section headings in the source documents are written in capitals."""
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and all(c.isupper() for c in letters)
+
+
+def extract_facts(text: str) -> dict:
+    """Pull hours, contacts, priced wines and tastings, and wine club tiers out of a source document."""
+    facts = {'contacts': {}, 'hours': None, 'wines': [], 'tastings': [], 'club': None}
+    section = ''
+    last_item = None
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            last_item = None
+            continue
+        if is_heading(line):
+            section = line
+            last_item = None
+            continue
+
+        label, _, value = line.partition(':')
+        for key, expected_label in CONTACT_LABELS.items():
+            if label.strip() == expected_label and value.strip():
+                facts['contacts'].setdefault(key, value.strip())
+
+        hours = OPENING_HOURS.match(line)
+        if hours:
+            facts['hours'] = {
+                'days': hours.group('days').strip(),
+                'opens': hours.group('opens'),
+                'closes': hours.group('closes'),
+                'notes': [],
+            }
+            last_item = facts['hours']['notes']
+            continue
+
+        item = PRICED_ITEM.match(line)
+        if item and section in WINE_SECTIONS + TASTING_SECTIONS:
+            last_item = {
+                'name': item.group('name').strip(),
+                'price': float(item.group('price')),
+                'unit': item.group('unit').strip(),
+                'description': '',
+            }
+            facts['wines' if section in WINE_SECTIONS else 'tastings'].append(last_item)
+            continue
+
+        tiers = CLUB_TIER.findall(line)
+        if tiers and 'CLUB' in section:
+            discount = CLUB_DISCOUNT.search(line)
+            facts['club'] = {
+                'tiers': [{'name': name, 'price': float(price), 'period': period} for name, price, period in tiers],
+                'discount': discount.group(1) if discount else None,
+            }
+            continue
+
+        # Lines right after an item describe it; lines after the hours are notes
+        if isinstance(last_item, dict) and not last_item['description']:
+            last_item['description'] = line
+        elif isinstance(last_item, list):
+            last_item.append(line)
+
+    return facts
+
+
+def merge_facts(documents: Iterable[dict]) -> dict:
+    """Combine facts from several documents; the first document to state a scalar fact wins."""
+    merged = {'contacts': {}, 'hours': None, 'wines': [], 'tastings': [], 'club': None}
+    for facts in documents:
+        for key, value in facts['contacts'].items():
+            merged['contacts'].setdefault(key, value)
+        merged['hours'] = merged['hours'] or facts['hours']
+        merged['club'] = merged['club'] or facts['club']
+        merged['wines'].extend(facts['wines'])
+        merged['tastings'].extend(facts['tastings'])
+    return merged
+
+
+def export_facts(paths: List[str], path: str) -> dict:
+    """Extract facts from the source documents and write them to path."""
+    documents = []
+    for source_path in paths:
+        with open(source_path, 'r') as f:
+            documents.append(extract_facts(f.read()))
+    facts = merge_facts(documents)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(facts, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    return facts
+
+
+def format_price(price: float) -> str:
+    return f"${price:,.0f}" if price == int(price) else f"${price:,.2f}"
+
+
+class FactIndex:
+    """Answers simple business lookups from extracted facts, or declines.
+
+    A query is answered only when every content word in it is explained by the
+    facts it asks about (question words, item names or their context), so
+    anything more nuanced than a lookup falls through to retrieval and Gemini.
+    """
+
+    def __init__(self, facts: Optional[dict] = None, min_confidence: float = 0.8):
+        self.facts = facts or {'contacts': {}, 'hours': None, 'wines': [], 'tastings': [], 'club': None}
+        self.min_confidence = min_confidence
+        self.items = [(item, self.item_terms(item['name'])) for item in self.facts['wines'] + self.facts['tastings']]
+
+    @classmethod
+    def load(cls, path: str, min_confidence: float = 0.8) -> 'FactIndex':
+        """Load facts.json, or return an index that declines everything if it hasn't been built."""
+        try:
+            with open(path, 'r') as f:
+                return cls(json.load(f), min_confidence)
+        except FileNotFoundError:
+            return cls(min_confidence=min_confidence)
+
+    @staticmethod
+    def item_terms(name: str) -> Set[str]:
+        """Distinctive words of an item name, plural-folded, leaving out vintages."""
+        return {stem(token) for token in tokenize(name) if not token.isdigit() and token not in GENERIC_ITEM_WORDS}
+
+    def available(self, kind: str) -> bool:
+        """Return whether the extracted facts can answer a kind of question."""
+        if kind in CONTACT_LABELS:
+            return kind in self.facts['contacts']
+        return bool(self.facts.get(kind))
+
+    def match(self, query: str) -> Tuple[List[str], Optional[dict], float]:
+        """Return the fact kinds a query asks for, the priced item it names, and how fully they explain it."""
+        tokens = [token for token in tokenize(query) if token not in FILLER_WORDS]
+        if not tokens:
+            return [], None, 0.0
+        words = set(tokens)
+
+        kinds = [kind for kind, (ask_terms, _) in QUESTION_TERMS.items()
+                 if words & ask_terms and self.available(kind)]
+        explained = set()
+        for kind in kinds:
+            ask_terms, context_terms = QUESTION_TERMS[kind]
+            explained |= words & (ask_terms | context_terms)
+
+        # A price question names exactly one wine or tasting; ties between items decline
+        item = None
+        if words & PRICE_TERMS:
+            stems = {stem(word) for word in words}
+            scores = sorted(((len(stems & terms), index) for index, (_, terms) in enumerate(self.items)), reverse=True)
+            if scores and scores[0][0] and (len(scores) == 1 or scores[0][0] > scores[1][0]):
+                item, terms = self.items[scores[0][1]]
+                explained |= {word for word in words if stem(word) in terms} | (words & (PRICE_TERMS | PRICE_CONTEXT_TERMS))
+
+        confidence = sum(1 for token in tokens if token in explained) / len(tokens)
+        return kinds, item, confidence
+
+    def answer(self, query: str) -> Optional[str]:
+        """Return a templated answer for a confident lookup, or None to decline."""
+        kinds, item, confidence = self.match(query)
+        if not (kinds or item) or confidence < self.min_confidence:
+            return None
+
+        sentences = []
+        contacts = self.facts['contacts']
+        if item is not None:
+            price = format_price(item['price'])
+            unit = f" {item['unit']}" if item['unit'] else ""
+            description = f" {item['description']}" if item['description'] else ""
+            sentences.append(f"{item['name']} - {price}{unit}.{description}")
+        for kind in kinds:
+            if kind == 'hours':
+                hours = self.facts['hours']
+                sentences.append(f"We're open {hours['days']} from {hours['opens']} to {hours['closes']}.")
+                sentences.extend(hours['notes'])
+            elif kind == 'phone':
+                sentences.append(f"You can call us at {contacts['phone']}.")
+            elif kind == 'email':
+                sentences.append(f"You can email us at {contacts['email']}.")
+            elif kind == 'address':
+                sentences.append(f"You'll find us at {contacts['address']}.")
+            elif kind == 'website':
+                sentences.append(f"Our website is {contacts['website']}.")
+            elif kind == 'club':
+                club = self.facts['club']
+                tiers = ", ".join(f"{tier['name']} ({format_price(tier['price'])}/{tier['period']})" for tier in club['tiers'])
+                perks = f" Members enjoy {club['discount']} off all purchases." if club.get('discount') else ""
+                sentences.append(f"Our wine club has {len(club['tiers'])} tiers: {tiers}.{perks}")
+
+        return " ".join(sentences) + " Is there anything else I can help you with?"
@@ -0,0 +1,163 @@
+"""
+Generation profiles for the Tohin concierge chatbot
+Each intent gets its own model, temperature, output cap and stop sequences.
+Short, simple intents start on a cheaper and faster model and are escalated
+to the stronger one when the answer comes back truncated or empty, or when
+the query looks too involved for the small model.
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from memory import estimate_tokens
+
+# Models available to the router, cheapest first
+FAST_MODEL = 'gemini-1.5-flash-8b'
+STANDARD_MODEL = 'gemini-1.5-flash'
+
+# Stop before the model starts writing the visitor's next turn itself
+TRANSCRIPT_STOP_SEQUENCES = ['\nVisitor:', '\nUser Question:']
+
+DEFAULT_PROFILES = {
+    'business': {'model': STANDARD_MODEL, 'temperature': 0.4, 'max_output_tokens': 600},
+    'weather': {'model': FAST_MODEL, 'temperature': 0.5, 'max_output_tokens': 250, 'escalate_to': STANDARD_MODEL},
+    'news': {'model': STANDARD_MODEL, 'temperature': 0.6, 'max_output_tokens': 500},
+    'chitchat': {'model': FAST_MODEL, 'temperature': 0.8, 'max_output_tokens': 200, 'escalate_to': STANDARD_MODEL},
+    'default': {'model': STANDARD_MODEL, 'temperature': 0.7, 'max_output_tokens': 1000},
+}
+
+# Queries longer than this, or spanning several intents, skip straight to the escalation model
+COMPLEX_QUERY_TOKENS = 40
+
+# Finish reasons that mean the answer should be retried on the escalation model
+TRUNCATED_FINISH_REASONS = {'MAX_TOKENS'}
+
+
+class GenerationProfile:
+    """Model and sampling settings used to answer one intent."""
+
+    def __init__(self, name: str, model: str = STANDARD_MODEL, temperature: float = 0.7,
+                 max_output_tokens: int = 1000, stop_sequences: Optional[List[str]] = None,
+                 escalate_to: Optional[str] = None):
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+        self.max_output_tokens = max_output_tokens
+        self.stop_sequences = TRANSCRIPT_STOP_SEQUENCES if stop_sequences is None else stop_sequences
+        self.escalate_to = escalate_to
+
+    def escalated(self) -> 'GenerationProfile':
+        """The same profile on the escalation model, with room for a longer answer."""
+        return GenerationProfile(
+            f"{self.name}.escalated",
+            model=self.escalate_to,
+            temperature=self.temperature,
+            max_output_tokens=self.max_output_tokens * 2,
+            stop_sequences=self.stop_sequences,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'model': self.model,
+            'temperature': self.temperature,
+            'max_output_tokens': self.max_output_tokens,
+            'stop_sequences': self.stop_sequences,
+            'escalate_to': self.escalate_to,
+        }
+
+
+def finish_reason(response) -> Optional[str]:
+    """Name of the first candidate's finish reason, if the response reports one."""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return None
+    return getattr(reason, 'name', str(reason))
+
+
+def output_tokens(response, text: str) -> int:
+    """Tokens in the answer, from the response's usage metadata when the SDK provides it."""
+    usage = getattr(response, 'usage_metadata', None)
+    count = getattr(usage, 'candidates_token_count', None)
+    return count if count else estimate_tokens(text)
+
+
+class GenerationRouter:
+    """Picks a generation profile per intent and decides when to escalate.
+
+    With tiering off, every profile runs on the standard model and nothing
+    is escalated; the per-intent sampling settings still apply.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, dict]] = None, tiering: bool = True):
+        settings = {name: dict(values) for name, values in DEFAULT_PROFILES.items()}
+        for name, overrides in (profiles or {}).items():
+            settings.setdefault(name, {}).update(overrides)
+
+        self.tiering = tiering
+        self.profiles = {}
+        for name, values in settings.items():
+            profile = GenerationProfile(name, **values)
+            if not tiering:
+                profile.model = STANDARD_MODEL
+                profile.escalate_to = None
+            self.profiles[name] = profile
+
+    @classmethod
+    def load(cls, path: Optional[str], tiering: bool = True) -> 'GenerationRouter':
+        """Create a router, applying per-profile overrides from a JSON file if one is given."""
+        overrides = None
+        if path:
+            with open(path, 'r') as f:
+                overrides = json.load(f)
+        return cls(overrides, tiering)
+
+    def profile(self, intent: str) -> GenerationProfile:
+        return self.profiles.get(intent) or self.profiles['default']
+
+    def select(self, query: str, intents: Set[str], intent: str) -> GenerationProfile:
+        """Return the profile to answer with, escalating up front for involved queries."""
+        profile = self.profile(intent)
+        if profile.escalate_to and (len(intents) > 1 or estimate_tokens(query) > COMPLEX_QUERY_TOKENS):
+            return profile.escalated()
+        return profile
+
+    @staticmethod
+    def should_escalate(profile: GenerationProfile, text: str, reason: Optional[str]) -> bool:
+        """Whether an answer from profile was cut off or empty and can be retried on a stronger model."""
+        return bool(profile.escalate_to) and (not text.strip() or reason in TRUNCATED_FINISH_REASONS)
+
+
+class GenerationStats:
+    """Per-profile call, escalation and token counters."""
+
+    def __init__(self):
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, profile: GenerationProfile, prompt_tokens: int, completion_tokens: int,
+               escalated: bool = False, truncated: bool = False):
+        with self._lock:
+            stats = self._profiles.setdefault(profile.name, {
+                'profile': profile.to_dict(),
+                'calls': 0, 'escalations': 0, 'truncated': 0, 'prompt_tokens': 0, 'output_tokens': 0,
+            })
+            stats['calls'] += 1
+            stats['escalations'] += int(escalated)
+            stats['truncated'] += int(truncated)
+            stats['prompt_tokens'] += prompt_tokens
+            stats['output_tokens'] += completion_tokens
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return the counters per profile, with mean tokens per call."""
+        with self._lock:
+            result = {}
+            for name, stats in self._profiles.items():
+                calls = stats['calls'] or 1
+                result[name] = dict(
+                    stats,
+                    mean_prompt_tokens=stats['prompt_tokens'] / calls,
+                    mean_output_tokens=stats['output_tokens'] / calls,
+                )
+            return result
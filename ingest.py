@@ -1,57 +1,302 @@
+"""
+Knowledge base ingestion for the Tohin concierge chatbot
+Incrementally syncs source documents into the ChromaDB collection: only new or
+changed chunks are embedded, in bounded concurrent batches, and chunks that
+disappeared from the sources are removed, so the live collection stays
+queryable throughout.
+"""
+
 import os
 import sys
-from typing import List
+import time
+import random
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Tuple
 from dotenv import load_dotenv
 import chromadb
-from chromadb.utils import embedding_functions
 import google.generativeai as genai
 from langchain_community.document_loaders import TextLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config import (
+    BM25_INDEX_PATH, CHROMA_DB_PATH, COLLECTION_NAME, EMBEDDING_DIMENSION, EMBEDDING_MODEL, FACTS_PATH,
+    NUMPY_INDEX_PATH, bump_index_version, check_embedding_metadata, embedding_metadata,
+    read_active_collection, write_active_collection
+)
+from facts import export_facts
+from retrieval import export_bm25_index, export_numpy_index
 
-# Load environment variables from .env file
-load_dotenv()
+# Source files picked up when ingesting a directory
+SOURCE_EXTENSIONS = ('.txt', '.md')
 
-# Configure the Generative AI client
-try:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-except AttributeError:
-    print("Error: GOOGLE_API_KEY not found. Please set it in your .env file.")
-    sys.exit(1)
+# Collection being built by an unfinished --migrate run, so a re-run resumes it
+MIGRATION_TARGET_PATH = os.path.join(CHROMA_DB_PATH, 'migration_target')
 
-# --- 1. Data Loading and Splitting ---
-loader = TextLoader("data/business_info.txt")
-documents = loader.load()
 
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-docs = text_splitter.split_documents(documents)
-texts = [doc.page_content for doc in docs]
+def configure_genai():
+    """Configure the Generative AI client from the environment."""
+    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GOOGLE_API_KEY not found. Please set it in your .env file.")
+        sys.exit(1)
+    genai.configure(api_key=api_key)
 
-print(f"Split document into {len(docs)} chunks.")
 
-# --- 2. Create Embeddings ---
-model = 'models/embedding-001'
-embeddings = genai.embed_content(model=model,
-                                 content=texts,
-                                 task_type="retrieval_document")['embedding']
+def find_source_files(source: str) -> List[str]:
+    """Return the document paths to ingest from a file or a directory of files."""
+    if os.path.isfile(source):
+        return [source]
 
-print(f"Successfully created {len(embeddings)} embeddings.")
+    paths = []
+    for root, _, filenames in os.walk(source):
+        for filename in sorted(filenames):
+            if filename.endswith(SOURCE_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
 
-# --- 3. Store in ChromaDB ---
-client = chromadb.PersistentClient(path="./chroma_db")
 
-# Delete the collection if it exists, to ensure a fresh start
-if "wine_business_knowledge" in [c.name for c in client.list_collections()]:
-    client.delete_collection(name="wine_business_knowledge")
-    print("Existing collection 'wine_business_knowledge' deleted.")
+def chunk_id(source_name: str, text: str) -> str:
+    """Derive a stable chunk ID from its source and content."""
+    return hashlib.sha256(f"{source_name}\n{text}".encode('utf-8')).hexdigest()
 
-collection = client.create_collection("wine_business_knowledge")
 
-collection.add(
-    ids=[f"doc_{i}" for i in range(len(texts))],
-    embeddings=embeddings,
-    documents=texts,
-    metadatas=[{'source': 'business_info.txt'} for _ in texts]
-)
+def iter_chunks(source: str) -> Iterator[Tuple[str, str, dict]]:
+    """Stream (id, text, metadata) chunks from the source documents one file at a time."""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    base_dir = source if os.path.isdir(source) else os.path.dirname(source)
+
+    for path in find_source_files(source):
+        source_name = os.path.relpath(path, base_dir)
+        documents = TextLoader(path).load()
+
+        for doc in text_splitter.split_documents(documents):
+            text = doc.page_content
+            yield chunk_id(source_name, text), text, {'source': source_name}
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batch(texts: List[str], max_retries: int) -> List[List[float]]:
+    """Embed one batch of texts, backing off exponentially on rate limits and transient errors."""
+    for attempt in range(max_retries + 1):
+        try:
+            return genai.embed_content(model=EMBEDDING_MODEL,
+                                       content=texts,
+                                       task_type="retrieval_document")['embedding']
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+            print(f"⚠️  Embedding batch failed ({e}); retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+class IngestProgress:
+    """Tracks and reports ingestion throughput."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.scanned = 0
+        self.skipped = 0
+        self.embedded = 0
+
+    def report(self):
+        elapsed = time.monotonic() - self.started_at
+        rate = self.embedded / elapsed if elapsed else 0.0
+        print(f"  scanned {self.scanned} chunks, skipped {self.skipped} unchanged, "
+              f"embedded {self.embedded} ({rate:.1f} chunks/sec)")
+
+
+def sync_collection(collection, source: str, batch_size: int, max_workers: int,
+                    max_retries: int, progress: IngestProgress) -> Tuple[int, int]:
+    """Stream chunks through batched, concurrent embedding into the collection.
+
+    Each batch is added as soon as it is embedded, so an interrupted run keeps
+    its finished batches and a re-run resumes by skipping chunks whose IDs are
+    already stored. Stale chunks are deleted only after a complete pass.
+    """
+    existing_ids = set(collection.get(include=[])['ids'])
+    seen_ids = set()
+
+    def new_chunks():
+        for doc_id, text, metadata in iter_chunks(source):
+            progress.scanned += 1
+            if doc_id in seen_ids:
+                continue
+            seen_ids.add(doc_id)
+            if doc_id in existing_ids:
+                progress.skipped += 1
+                continue
+            yield doc_id, text, metadata
+
+    def store(batch, future):
+        embeddings = future.result()
+        if len(embeddings[0]) != EMBEDDING_DIMENSION:
+            raise ValueError(f"{EMBEDDING_MODEL} returned {len(embeddings[0])}-dim embeddings, "
+                             f"expected {EMBEDDING_DIMENSION}; update config.EMBEDDING_DIMENSION")
+
+        # Writes happen on the main thread; only embedding runs concurrently
+        collection.add(
+            ids=[doc_id for doc_id, _, _ in batch],
+            embeddings=embeddings,
+            documents=[text for _, text, _ in batch],
+            metadatas=[metadata for _, _, metadata in batch]
+        )
+        progress.embedded += len(batch)
+        progress.report()
+
+    # Bound in-flight batches so memory and request concurrency stay flat
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in batched(new_chunks(), batch_size):
+            if len(in_flight) >= max_workers:
+                store(*in_flight.popleft())
+            future = executor.submit(embed_batch, [text for _, text, _ in batch], max_retries)
+            in_flight.append((batch, future))
+
+        while in_flight:
+            store(*in_flight.popleft())
+
+    # Delete chunks that disappeared only once every current chunk is stored
+    stale_ids = list(existing_ids - seen_ids)
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    return progress.embedded, len(stale_ids)
+
+
+def update_active_collection(client, args, progress: IngestProgress):
+    """Incrementally sync the collection that is currently serving queries."""
+    collection = client.get_or_create_collection(read_active_collection())
+
+    # A fresh collection records the embedding model; an existing one must match it
+    if collection.count() == 0:
+        collection.modify(metadata=embedding_metadata())
+    elif not (collection.metadata or {}).get('embedding_model'):
+        raise ValueError(
+            f"'{collection.name}' was built before ingest.py recorded its embedding model, so it can't be "
+            f"synced in place. Run `python ingest.py --migrate` once to re-embed it; later runs sync incrementally."
+        )
+    check_embedding_metadata(collection.metadata)
+
+    removed = 0
+    try:
+        _, removed = sync_collection(collection, args.source, args.batch_size,
+                                     args.workers, args.max_retries, progress)
+
+        # Keep the NumPy and BM25 indexes in step with the collection
+        if progress.embedded or removed or not os.path.exists(NUMPY_INDEX_PATH):
+            export_numpy_index(collection, NUMPY_INDEX_PATH)
+        if progress.embedded or removed or not os.path.exists(BM25_INDEX_PATH):
+            export_bm25_index(collection, BM25_INDEX_PATH)
+    finally:
+        # Invalidate cached answers whenever the knowledge base changed, even partially
+        if progress.embedded or removed:
+            bump_index_version()
+
+    print(f"\nEmbedded {progress.embedded} new chunks and removed {removed} stale chunks.")
+    return collection
+
+
+def migrate_collection(client, args, progress: IngestProgress):
+    """Re-embed every chunk into a new collection, then atomically swap it in.
+
+    The current collection keeps serving queries while the new one is built.
+    The previous generation is kept after the swap for processes that still
+    hold it; anything older is deleted.
+    """
+    previous_name = read_active_collection()
+
+    if os.path.exists(MIGRATION_TARGET_PATH):
+        with open(MIGRATION_TARGET_PATH, 'r') as f:
+            target_name = f.read().strip()
+        print(f"Resuming migration into '{target_name}'.")
+    else:
+        target_name = f"{COLLECTION_NAME}_{time.strftime('%Y%m%d%H%M%S')}"
+        os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+        with open(MIGRATION_TARGET_PATH, 'w') as f:
+            f.write(target_name)
+        print(f"Migrating knowledge base to {EMBEDDING_MODEL} in '{target_name}'.")
+
+    collection = client.get_or_create_collection(target_name)
+    if collection.count() == 0:
+        collection.modify(metadata=embedding_metadata())
+
+    sync_collection(collection, args.source, args.batch_size, args.workers, args.max_retries, progress)
+    export_numpy_index(collection, NUMPY_INDEX_PATH)
+    export_bm25_index(collection, BM25_INDEX_PATH)
+
+    # Swap the new index in for every reader at once
+    write_active_collection(target_name)
+    os.remove(MIGRATION_TARGET_PATH)
+    bump_index_version()
+    print(f"\nSwapped '{target_name}' in for '{previous_name}'.")
+
+    for old_collection in client.list_collections():
+        if old_collection.name.startswith(COLLECTION_NAME) and old_collection.name not in (target_name, previous_name):
+            client.delete_collection(name=old_collection.name)
+            print(f"Deleted old collection '{old_collection.name}'.")
+
+    return collection
+
+
+def main():
+    """Sync the knowledge base with the source documents."""
+    parser = argparse.ArgumentParser(description="Ingest business documents into the Tohin knowledge base.")
+    parser.add_argument('--source', default='data',
+                        help="Source file or directory of .txt/.md files (default: data)")
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help="Chunks per embedding request (default: 100)")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Concurrent embedding requests (default: 4)")
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help="Retries per batch before giving up (default: 5)")
+    parser.add_argument('--migrate', action='store_true',
+                        help=f"Re-embed everything with {EMBEDDING_MODEL} into a new collection and swap it in")
+    args = parser.parse_args()
+
+    # Load environment variables from .env file
+    load_dotenv()
+    configure_genai()
+
+    client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+
+    # --- Load, split, embed and store in streaming batches ---
+    progress = IngestProgress()
+    try:
+        if args.migrate:
+            collection = migrate_collection(client, args, progress)
+        else:
+            collection = update_active_collection(client, args, progress)
+
+        # Cheap to redo on every run; the chatbot answers simple lookups from it
+        facts = export_facts(find_source_files(args.source), FACTS_PATH)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        sys.exit(1)
+    except (Exception, KeyboardInterrupt) as e:
+        print(f"\n❌ Ingestion stopped: {e!r}")
+        print(f"{progress.embedded} chunks were stored; re-run to resume from where it stopped.")
+        sys.exit(1)
+
+    elapsed = time.monotonic() - progress.started_at
+    print(f"✅ Knowledge base is up to date with {collection.count()} documents ({elapsed:.1f}s).")
+    print(f"Extracted {len(facts['wines'])} wines, {len(facts['tastings'])} tastings and "
+          f"{len(facts['contacts'])} contact details to {FACTS_PATH}.")
+    print("You can now run app.py to chat with your knowledge base.")
+
 
-print(f"\n✅ Successfully created and populated the vector store with {collection.count()} documents.")
-print("You can now run app.py to chat with your knowledge base.")
+if __name__ == "__main__":
+    main()
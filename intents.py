@@ -0,0 +1,88 @@
+"""
+Intent classification for the Tohin concierge chatbot
+Keyword rules are compiled once into a single regular expression; example
+queries give an optional embedding-similarity fallback for inputs no keyword
+covers
+"""
+
+import json
+import re
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Inflections accepted after a keyword, with an optional doubled final consonant,
+# so "rain" matches "raining" and "rainy" and "hot" matches "hotter"
+INFLECTION_SUFFIX = r"(?:[bdgmnprt]?(?:e?s|e?d|ing|y|i?er|i?est)|ly)?"
+
+
+def keyword_pattern(keyword: str) -> str:
+    """Turn a keyword or phrase into a regex fragment tolerant of spacing and apostrophes."""
+    words = [re.escape(word).replace("'", "'?") for word in keyword.lower().split()]
+    return r"\s+".join(words)
+
+
+class IntentClassifier:
+    """Scores queries against per-intent keyword lists in one regex pass.
+
+    Every keyword list becomes a named group of a single alternation anchored
+    on word boundaries, with an optional inflection suffix, so "hot" matches
+    "hotter" but not "photo" and matching costs one scan of the query
+    regardless of how many keywords are configured.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], examples: Optional[Dict[str, List[str]]] = None):
+        self.intents = list(keywords)
+        self.examples = examples or {}
+
+        groups = []
+        for intent, intent_keywords in keywords.items():
+            # Longest first so phrases win over the single words they contain
+            alternatives = sorted({keyword_pattern(keyword) for keyword in intent_keywords}, key=len, reverse=True)
+            groups.append(f"(?P<{intent}>{'|'.join(alternatives)})")
+        self.pattern = re.compile(rf"\b(?:{'|'.join(groups)}){INFLECTION_SUFFIX}\b", re.IGNORECASE)
+
+        # Unit-length mean embedding of each intent's examples, built on first fallback
+        self.prototypes: Optional[Dict[str, np.ndarray]] = None
+
+    @classmethod
+    def load(cls, path: str) -> 'IntentClassifier':
+        """Load keywords and fallback examples from a JSON config file."""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['keywords'], data.get('examples'))
+
+    def keyword_scores(self, query: str) -> Dict[str, float]:
+        """Return the number of keyword hits per intent."""
+        scores = dict.fromkeys(self.intents, 0.0)
+        for match in self.pattern.finditer(query):
+            scores[match.lastgroup] += 1.0
+        return scores
+
+    def keyword_hits(self, query: str) -> Dict[str, List[str]]:
+        """Return the lowercased text of every keyword hit, per intent."""
+        hits = {intent: [] for intent in self.intents}
+        for match in self.pattern.finditer(query):
+            hits[match.lastgroup].append(match.group(0).lower())
+        return hits
+
+    def build_prototypes(self, embed_fn: Callable[[str], List[float]]):
+        """Embed the example queries and average them into one prototype per intent."""
+        prototypes = {}
+        for intent, examples in self.examples.items():
+            if not examples:
+                continue
+            vectors = np.asarray([embed_fn(example) for example in examples], dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            prototypes[intent] = centroid / np.linalg.norm(centroid)
+        self.prototypes = prototypes
+
+    def embedding_scores(self, query_embedding: List[float]) -> Dict[str, float]:
+        """Return the cosine similarity between the query and each intent prototype."""
+        if not self.prototypes:
+            return {}
+
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+        return {intent: float(prototype @ query_vector) for intent, prototype in self.prototypes.items()}
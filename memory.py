@@ -0,0 +1,132 @@
+"""
+Conversation memory for the Tohin concierge chatbot
+Keeps recent turns verbatim and folds older ones into a rolling summary so the
+history sent to Gemini stays within a fixed token budget
+"""
+
+import threading
+from typing import Callable, List, Optional, Tuple
+
+# Rough characters-per-token ratio for English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimate how many tokens a piece of text will use."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    """Render (visitor, assistant) turns as a transcript."""
+    return "\n".join(f"Visitor: {user}\nTohin: {assistant}" for user, assistant in turns)
+
+
+class ConversationMemory:
+    """Token-budgeted history for one conversation.
+
+    Once the rendered history exceeds token_budget, the oldest turns beyond
+    min_recent_turns are folded into the rolling summary by calling
+    summarizer(previous_summary, turns). Only the newly folded turns are
+    summarized each time, so compaction cost does not grow with the
+    conversation.
+    """
+
+    def __init__(self, token_budget: int = 1200, min_recent_turns: int = 3,
+                 summarizer: Optional[Callable[[str, List[Tuple[str, str]]], str]] = None):
+        self.token_budget = token_budget
+        self.min_recent_turns = min_recent_turns
+        self.summarizer = summarizer
+
+        self.summary = ""
+        self.turns: List[Tuple[str, str]] = []
+
+        # Context behind the latest answer, reused for follow-up questions
+        self.last_context: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    def add_turn(self, user_message: str, assistant_message: str, context: Optional[str] = None):
+        """Record a completed exchange."""
+        with self._lock:
+            self.turns.append((user_message, assistant_message))
+            if context is not None:
+                self.last_context = context
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return not self.turns and not self.summary
+
+    def render(self) -> str:
+        """Render the summary and recent turns for inclusion in a prompt."""
+        with self._lock:
+            sections = []
+            if self.summary:
+                sections.append(f"Summary of earlier conversation:\n{self.summary}")
+            if self.turns:
+                sections.append(f"Recent conversation:\n{format_turns(self.turns)}")
+            return "\n\n".join(sections)
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.render())
+
+    def needs_compaction(self) -> bool:
+        """Return True when the history is over budget and has turns old enough to fold."""
+        with self._lock:
+            if self._compacting or len(self.turns) <= self.min_recent_turns:
+                return False
+        return self.token_count() > self.token_budget
+
+    def compact(self):
+        """Fold the oldest turns into the rolling summary until the history fits the budget."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+            # Keep the newest turns verbatim; fold the rest, oldest first
+            summary_budget = self.token_budget // 3
+            recent_budget = self.token_budget - summary_budget
+            fold_count = len(self.turns) - self.min_recent_turns
+            while fold_count > 0:
+                kept = self.turns[fold_count - 1:]
+                if estimate_tokens(format_turns(kept)) <= recent_budget:
+                    fold_count -= 1
+                else:
+                    break
+            turns_to_fold = self.turns[:fold_count]
+            previous_summary = self.summary
+
+        try:
+            if not turns_to_fold:
+                return
+            new_summary = self._summarize(previous_summary, turns_to_fold)
+
+            # New turns may have arrived meanwhile, but only ever at the end
+            with self._lock:
+                self.turns = self.turns[len(turns_to_fold):]
+                self.summary = self._truncate(new_summary, summary_budget)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _summarize(self, previous_summary: str, turns: List[Tuple[str, str]]) -> str:
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(previous_summary, turns)
+                if summary and summary.strip():
+                    return summary.strip()
+            except Exception:
+                pass
+
+        # Without a summarizer, keep the visitor's side of the folded turns
+        folded = " ".join(user for user, _ in turns)
+        return f"{previous_summary} {folded}".strip()
+
+    @staticmethod
+    def _truncate(text: str, token_budget: int) -> str:
+        max_chars = token_budget * CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text
+        # Drop the oldest material first
+        return "..." + text[-max_chars:]
@@ -0,0 +1,157 @@
+"""
+Prompt assembly for the Tohin concierge chatbot
+Builds Gemini prompts from a static per-intent system prompt and a context
+block trimmed to a per-intent token budget, dropping text that retrieved
+chunks repeat (ingest.py splits documents with a 100-character overlap).
+"""
+
+import re
+from typing import Dict, List, Optional
+
+from memory import estimate_tokens
+
+SYSTEM_PROMPTS = {
+    'business': (
+        "You are Tohin, a friendly and knowledgeable personal concierge for Napa Valley Premium Wines. "
+        "Use the provided business information to answer questions about our winery, wines, tastings, "
+        "tours, and services. Be warm, professional, and helpful. Always introduce yourself as Tohin when "
+        "meeting someone new or when asked about yourself."
+    ),
+    'weather': (
+        "You are Tohin, a helpful personal concierge providing weather information for visitors "
+        "to Napa Valley. If weather data is unavailable, provide general seasonal advice for Napa Valley "
+        "and suggest indoor/outdoor activities. Always identify yourself as Tohin when asked."
+    ),
+    'news': (
+        "You are Tohin, a knowledgeable personal concierge sharing information about "
+        "Napa Valley, wine industry, and local events. Present information in an engaging way. "
+        "Always introduce yourself as Tohin when appropriate."
+    ),
+    'chitchat': (
+        "You are Tohin, a friendly and personable concierge at Napa Valley Premium Wines. "
+        "You love casual conversation and are great at small talk. When someone asks about yourself, "
+        "introduce yourself as Tohin - a personal wine concierge who helps visitors discover the best "
+        "of Napa Valley. Keep responses warm, engaging, and conversational. Answer questions naturally "
+        "and try to steer conversation toward wine, the winery, or visiting Napa Valley when appropriate. "
+        "Be helpful and friendly, and remember you are Tohin."
+    ),
+}
+DEFAULT_SYSTEM_PROMPT = (
+    "You are Tohin, a friendly personal concierge for Napa Valley Premium Wines. "
+    "Be helpful, warm, and professional in your responses. Always identify yourself as Tohin."
+)
+
+# Tokens of context kept per intent; three full knowledge chunks are roughly 750 tokens
+CONTEXT_TOKEN_BUDGETS = {
+    'business': 450,
+    'weather': 120,
+    'news': 350,
+    'chitchat': 100,
+}
+DEFAULT_CONTEXT_TOKENS = 400
+
+# Shortest repeated text worth stripping from the start of a chunk
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 300
+
+
+def normalize_line(line: str) -> str:
+    return re.sub(r'\s+', ' ', line).strip().lower()
+
+
+def strip_overlap(previous: str, chunk: str) -> str:
+    """Remove the start of chunk that repeats the end of previous."""
+    longest = min(len(previous), len(chunk), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(chunk[:size]):
+            return chunk[size:].lstrip()
+    return chunk
+
+
+def dedupe_chunks(chunks: List[str]) -> List[str]:
+    """Drop lines already present in higher-ranked chunks and the overlap between neighbouring chunks."""
+    kept_chunks = []
+    seen_lines = set()
+
+    for chunk in chunks:
+        for previous in kept_chunks:
+            chunk = strip_overlap(previous, chunk)
+
+        lines = []
+        for line in chunk.split('\n'):
+            normalized = normalize_line(line)
+            repeated = normalized in seen_lines or (
+                len(normalized) >= MIN_OVERLAP_CHARS and any(normalized in seen for seen in seen_lines)
+            )
+            if normalized and repeated:
+                continue
+            lines.append(line)
+            if normalized:
+                seen_lines.add(normalized)
+
+        text = '\n'.join(lines).strip()
+        if text:
+            kept_chunks.append(text)
+    return kept_chunks
+
+
+def trim_to_budget(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, at a line boundary where possible and otherwise at a word."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for line in text.split('\n'):
+        cost = estimate_tokens(line + '\n')
+        if used + cost > max_tokens:
+            if not kept:
+                # A single line longer than the budget is cut at a word boundary
+                words = line[:max_tokens * 4].rsplit(' ', 1)[0]
+                kept.append(words)
+            break
+        kept.append(line)
+        used += cost
+    return '\n'.join(kept).rstrip()
+
+
+class PromptBuilder:
+    """Assembles token-budgeted Gemini prompts."""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, default_budget: int = DEFAULT_CONTEXT_TOKENS):
+        self.budgets = dict(CONTEXT_TOKEN_BUDGETS, **(budgets or {}))
+        self.default_budget = default_budget
+
+    @staticmethod
+    def system_prompt(intent: str) -> str:
+        """The static instructions for an intent, identical on every call."""
+        return SYSTEM_PROMPTS.get(intent, DEFAULT_SYSTEM_PROMPT)
+
+    def context_budget(self, intent: str) -> int:
+        return self.budgets.get(intent, self.default_budget)
+
+    def compress_chunks(self, chunks: List[str], intent: str) -> str:
+        """Deduplicate retrieved chunks, best first, and join as many as fit the intent's budget."""
+        return self.fit_context("\n\n".join(dedupe_chunks(chunks)), intent)
+
+    def fit_context(self, context: str, intent: str) -> str:
+        """Trim a context block to the intent's token budget."""
+        return trim_to_budget(context, self.context_budget(intent))
+
+    @staticmethod
+    def user_prompt(query: str, context: str, history: str = "") -> str:
+        """The per-request part of the prompt: context, history and the question."""
+        # Earlier turns let Tohin resolve follow-up questions
+        history_section = f"\nConversation So Far:\n{history}\n" if history else ""
+
+        return f"""Context Information:
+{context}
+{history_section}
+User Question: {query}
+
+Please provide a helpful, friendly, and informative response as Tohin:
+"""
+
+    def build(self, query: str, context: str, intent: str, history: str = "") -> str:
+        """The full prompt, for models that don't carry the system prompt themselves."""
+        return f"{self.system_prompt(intent)}\n\n{self.user_prompt(query, context, history)}"
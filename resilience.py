@@ -0,0 +1,566 @@
+"""
+Failure isolation for the Tohin concierge chatbot
+Circuit breakers stop calling an upstream (Gemini, embeddings, Chroma,
+Perplexity, OpenWeatherMap) while it keeps failing and probe it again after a
+cool-down, and a per-request deadline caps how long each stage of a chat turn
+may wait, so a struggling dependency costs a fast degraded answer instead of a
+30-second stall. Opt-in hedging sends a backup request when a call runs slower
+than most recent ones, within a global budget so it can't multiply load.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from tracing import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# Circuit states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Shortest timeout handed to a stage, so an almost-spent deadline still allows a quick call
+MIN_STAGE_TIMEOUT = 0.25
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call doesn't finish within its share of the request deadline."""
+
+
+class CallerDeadlineExceeded(DeadlineExceeded):
+    """Raised when a call ran out of time only because the request's deadline cut its own timeout short."""
+
+
+class BulkheadFull(Exception):
+    """Raised instead of queueing a call behind a dependency that already has too many in flight."""
+
+
+class CircuitBreaker:
+    """Stops calling a dependency whose recent calls mostly fail.
+
+    While closed, the outcomes of the last window_size calls are kept; once
+    at least min_calls are recorded and the failure rate reaches
+    failure_threshold the circuit opens and calls fail immediately with
+    CircuitOpenError. After open_seconds it turns half-open and lets up to
+    half_open_probes calls through: a success closes it, a failure opens it
+    for another cool-down.
+    """
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, min_calls: int = 5, window_size: int = 20,
+                 open_seconds: float = 30.0, half_open_probes: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+
+        self._state = CLOSED
+        self._outcomes = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def acquire(self):
+        """Claim permission for one call, or raise CircuitOpenError."""
+        with self._lock:
+            if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probes = 0
+                logger.info(f"Circuit {self.name} half-open, probing")
+
+            if self._state == OPEN or (self._state == HALF_OPEN and self._probes >= self.half_open_probes):
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+            if self._state == HALF_OPEN:
+                self._probes += 1
+            self.calls += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                logger.info(f"Circuit {self.name} closed")
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+
+            self._outcomes.append(False)
+            failed = self._outcomes.count(False)
+            if (self._state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and failed / len(self._outcomes) >= self.failure_threshold):
+                self._open()
+
+    def release(self):
+        """Give back a call's permission without recording an outcome, e.g. when it was cancelled."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def _open(self):
+        logger.warning(f"Circuit {self.name} opened for {self.open_seconds:.0f}s")
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        self.opened += 1
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run the enclosed call under the breaker, recording whether it raised.
+
+        Rejections made on this side (a full bulkhead, a request out of time)
+        say nothing about the dependency and aren't counted against it.
+        """
+        self.acquire()
+        try:
+            yield
+        except (BulkheadFull, CallerDeadlineExceeded):
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled or abandoned (e.g. a stream the client closed); says nothing about the dependency
+            self.release()
+            raise
+        else:
+            self.record_success()
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        with self.guard():
+            return fn()
+
+    async def acall(self, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        with self.guard():
+            return await coro_fn()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the circuit's state and call, failure and rejection counts."""
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'calls': self.calls,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'opened': self.opened,
+                'window_failure_rate': self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0,
+            }
+
+
+class Bulkhead(Executor):
+    """A dependency's own bounded thread pool.
+
+    Blocking SDK calls that overrun their timeout keep their thread until they
+    return, so each dependency gets its own pool: a hung Gemini can only tie
+    up Gemini's threads. Beyond max_workers running and max_queued waiting
+    calls, submit() raises BulkheadFull instead of queueing.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queued: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_calls = max_workers + (max_workers if max_queued is None else max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_calls)
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise BulkheadFull(f"{self.name} has {self.max_calls} calls in flight")
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def shutdown(self, wait: bool = True, **kwargs):
+        self._executor.shutdown(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'max_workers': self.max_workers, 'max_calls': self.max_calls,
+                    'in_flight': self.in_flight, 'rejected': self.rejected}
+
+
+class Deadline:
+    """A point in time by which a request, or one stage of it, must finish."""
+
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.clock() >= self.expires_at
+
+
+# The deadline of the request being handled; copied into worker threads by tracing.in_context
+_current_deadline: ContextVar = ContextVar('tohin_deadline', default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """Give the enclosed work at most seconds, never extending a deadline already in force.
+
+    A falsy seconds leaves the current deadline (if any) unchanged.
+    """
+    outer = _current_deadline.get()
+    if not seconds:
+        yield outer
+        return
+
+    deadline = Deadline(seconds if outer is None else min(seconds, outer.remaining()))
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            _current_deadline.reset(token)
+        except ValueError:
+            # A streaming generator closed from a different context
+            pass
+
+
+# Why the current turn's answer is degraded; one list shared with the worker threads the turn spawns
+_degraded_reasons: ContextVar = ContextVar('tohin_degraded', default=None)
+
+
+@contextmanager
+def degradation_scope() -> Iterator[List[str]]:
+    """Collect the reasons, if any, that the enclosed turn answered with less than it needed."""
+    reasons = []
+    token = _degraded_reasons.set(reasons)
+    try:
+        yield reasons
+    finally:
+        try:
+            _degraded_reasons.reset(token)
+        except ValueError:
+            # A streaming generator closed from a different context
+            pass
+
+
+def mark_degraded(reason: str):
+    """Note that the current turn is answering without a source, on a fallback, or out of time."""
+    reasons = _degraded_reasons.get()
+    if reasons is not None and reason not in reasons:
+        reasons.append(reason)
+
+
+def is_degraded() -> bool:
+    return bool(_degraded_reasons.get())
+
+
+@contextmanager
+def caller_deadline(timeout: Optional[float], own_timeout: Optional[float]) -> Iterator[None]:
+    """Blame a timeout on the request, not the dependency, when the request's deadline set it.
+
+    Inside, a call given less than its own_timeout that times out, or fails
+    after the current deadline expired, raises CallerDeadlineExceeded instead.
+    """
+    try:
+        yield
+    except CallerDeadlineExceeded:
+        raise
+    except Exception as e:
+        deadline = _current_deadline.get()
+        cut_short = timeout is not None and own_timeout is not None and timeout < own_timeout
+        if cut_short and (isinstance(e, DeadlineExceeded) or (deadline is not None and deadline.expired())):
+            raise CallerDeadlineExceeded(f"Request deadline ran out: {e}") from e
+        raise
+
+
+def stage_timeout(default: Optional[float], share: float = 1.0) -> Optional[float]:
+    """Timeout for the next call or stage: its share of the time left, capped at default.
+
+    Without a deadline in force the default applies unchanged.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    budget = max(MIN_STAGE_TIMEOUT, deadline.remaining() * share)
+    return budget if default is None else min(default, budget)
+
+
+def run_with_timeout(executor: Executor, fn: Callable[[], Any], timeout: Optional[float]) -> Any:
+    """Run fn on executor and wait at most timeout seconds for it.
+
+    A blocking SDK call can't be interrupted, so on timeout it is abandoned to
+    finish in the background and DeadlineExceeded is raised.
+    """
+    future = executor.submit(fn)
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(f"No answer within {timeout:.2f}s")
+
+
+async def await_with_timeout(awaitable: Awaitable[Any], timeout: Optional[float]) -> Any:
+    """Await with a timeout, cancelling the call and raising DeadlineExceeded when it runs out."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"No answer within {timeout:.2f}s")
+
+
+class HedgeBudget:
+    """Caps backup requests at a fraction of all calls, shared by every hedged dependency.
+
+    Each call earns max_rate of a token, up to burst tokens, and each hedge
+    spends a whole one, so however slow upstreams get, hedges stay under
+    max_rate of the calls made.
+    """
+
+    def __init__(self, max_rate: float = 0.05, burst: float = 5.0):
+        self.max_rate = max_rate
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.calls = 0
+        self.hedges = 0
+        self.denied = 0
+
+    def deposit(self):
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.burst, self._tokens + self.max_rate)
+
+    def withdraw(self) -> bool:
+        """Spend a token on a hedge, or return False if the budget is spent."""
+        with self._lock:
+            if self._tokens < 1.0:
+                self.denied += 1
+                return False
+            self._tokens -= 1.0
+            self.hedges += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_rate': self.max_rate,
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'denied': self.denied,
+                'hedge_rate': self.hedges / self.calls if self.calls else 0.0,
+            }
+
+
+class Hedger:
+    """Sends a backup request when a call outlasts most recent calls, and keeps whichever answers first.
+
+    The hedge delay is the given percentile of the dependency's recent
+    latencies, measured on first attempts only so hedging doesn't skew it;
+    nothing is hedged until min_samples calls have been seen. The slower
+    attempt is cancelled once the other succeeds (a blocking call already
+    running is abandoned to finish in the background).
+    """
+
+    def __init__(self, name: str, budget: HedgeBudget, percentile: float = 0.95, min_delay: float = 0.05,
+                 min_samples: int = 20, window: int = 200, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.budget = budget
+        self.clock = clock
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+        self._latency = LatencyHistogram(window=window)
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._latency.observe(seconds)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples to tell."""
+        with self._lock:
+            if len(self._latency.samples) < self.min_samples:
+                return None
+            return max(self.min_delay, self._latency.percentile(self.percentile))
+
+    def _start(self, timeout: Optional[float]) -> Optional[float]:
+        self.budget.deposit()
+        with self._lock:
+            self.calls += 1
+        delay = self.delay()
+        # A backup that couldn't start before the timeout would be wasted
+        if delay is None or (timeout is not None and delay >= timeout):
+            return None
+        return delay
+
+    def _observe_first_attempt(self, started_at: float, future):
+        # Failed and cancelled attempts say nothing about how long an answer takes
+        if not future.cancelled() and future.exception() is None:
+            self.observe(self.clock() - started_at)
+
+    def _hedge(self) -> bool:
+        """Claim a backup request from the budget."""
+        if not self.budget.withdraw():
+            return False
+        with self._lock:
+            self.hedges += 1
+        return True
+
+    def _won(self, backup: bool):
+        if backup:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def call(self, executor: Executor, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """Run fn on executor, hedged, waiting at most timeout seconds; raises DeadlineExceeded after that."""
+        started_at = self.clock()
+        delay = self._start(timeout)
+
+        primary = executor.submit(contextvars.copy_context().run, fn)
+        primary.add_done_callback(lambda future: self._observe_first_attempt(started_at, future))
+        attempts = [primary]
+
+        if delay is not None:
+            done, _ = wait(attempts, timeout=delay)
+            if not done and self._hedge():
+                try:
+                    attempts.append(executor.submit(contextvars.copy_context().run, fn))
+                except BulkheadFull:
+                    # The dependency is saturated; a backup would only add to it
+                    pass
+
+        try:
+            pending = set(attempts)
+            error = None
+            while pending:
+                remaining = None if timeout is None else timeout - (self.clock() - started_at)
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        self._won(future is not primary)
+                        return future.result()
+                    error = future.exception()
+            # Every attempt failed, or none finished in time
+            if error is not None and not pending:
+                raise error
+            raise DeadlineExceeded(f"No answer within {timeout:.2f}s")
+        finally:
+            for future in attempts:
+                future.cancel()
+
+    async def acall(self, coro_fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Async variant of call(); the slower attempt is cancelled."""
+        started_at = self.clock()
+        delay = self._start(timeout)
+
+        primary = asyncio.ensure_future(coro_fn())
+        primary.add_done_callback(lambda future: self._observe_first_attempt(started_at, future))
+        attempts = [primary]
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=delay)
+                if not done and self._hedge():
+                    attempts.append(asyncio.ensure_future(coro_fn()))
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                remaining = None if timeout is None else timeout - (self.clock() - started_at)
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    if future.exception() is None:
+                        self._won(future is not primary)
+                        return future.result()
+                    error = future.exception()
+            if error is not None and not pending:
+                raise error
+            raise DeadlineExceeded(f"No answer within {timeout:.2f}s")
+        finally:
+            for future in attempts:
+                if not future.done():
+                    future.cancel()
+                elif not future.cancelled():
+                    # Mark a losing attempt's exception as retrieved
+                    future.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how often calls were hedged and how often the backup answered first."""
+        delay = self.delay()
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'delay_ms': delay * 1000 if delay is not None else None,
+                'percentile': self.percentile,
+            }
@@ -0,0 +1,236 @@
+"""
+Retrieval backends for the Tohin knowledge base
+Chroma is the default; the NumPy index answers small corpora in-process, and
+the BM25 index adds exact lexical matching on top of either
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Words too common to help lexical matching
+STOPWORDS = {
+    'a', 'about', 'an', 'and', 'any', 'are', 'at', 'be', 'can', 'do', 'does', 'for', 'from', 'have',
+    'how', 'i', 'in', 'is', 'it', 'me', 'much', 'my', 'of', 'on', 'or', 'our', 'the', 'there', 'to',
+    'we', 'what', 'when', 'where', 'which', 'who', 'with', 'you', 'your'
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase content terms for BM25."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class Retriever:
+    """Interface for knowledge base search backends."""
+
+    # Collection metadata, including the embedding model the documents were built with
+    metadata: dict = {}
+
+    def search(self, query: str, query_embedding: List[float], n_results: int) -> List[str]:
+        """Return the documents most relevant to the query."""
+        raise NotImplementedError
+
+    def lexical_search(self, query: str, n_results: int) -> Optional[List[str]]:
+        """Answer from exact term matches alone, or return None if that is not confident enough."""
+        return None
+
+    def keyword_search(self, query: str, n_results: int) -> List[str]:
+        """Best lexical matches however weak, for when the query can't be embedded; empty without a lexical index."""
+        return []
+
+
+class ChromaRetriever(Retriever):
+    """Searches a ChromaDB collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.metadata = collection.metadata or {}
+
+    def search(self, query: str, query_embedding: List[float], n_results: int) -> List[str]:
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results
+        )
+        return results['documents'][0] if results['documents'] else []
+
+
+class NumpyRetriever(Retriever):
+    """Exact cosine search over a memory-mapped float32 matrix with one dot product per query."""
+
+    def __init__(self, index_dir: str):
+        # Rows are unit-normalized at export time, so a dot product is cosine similarity
+        self.embeddings = np.load(os.path.join(index_dir, 'embeddings.npy'), mmap_mode='r')
+
+        with open(os.path.join(index_dir, 'documents.json'), 'r') as f:
+            self.documents = json.load(f)
+        with open(os.path.join(index_dir, 'meta.json'), 'r') as f:
+            self.metadata = json.load(f)
+
+    def search(self, query: str, query_embedding: List[float], n_results: int) -> List[str]:
+        if not self.documents:
+            return []
+
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.embeddings @ query_vector
+
+        # Partial sort: only the top n_results need ordering
+        k = min(n_results, len(self.documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.documents[i] for i in top]
+
+
+class BM25Index:
+    """Okapi BM25 over a precomputed inverted index."""
+
+    def __init__(self, documents: List[str], postings: Dict[str, List[List[int]]],
+                 doc_lengths: List[int], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+        n_docs = len(documents)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            for term, entries in postings.items()
+        }
+
+    @classmethod
+    def build(cls, documents: List[str]) -> 'BM25Index':
+        """Build the inverted index for a list of documents."""
+        postings = defaultdict(list)
+        doc_lengths = []
+        for doc_index, document in enumerate(documents):
+            terms = tokenize(document)
+            doc_lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                postings[term].append([doc_index, frequency])
+        return cls(documents, dict(postings), doc_lengths)
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['documents'], data['postings'], data['doc_lengths'], data['k1'], data['b'])
+
+    def save(self, path: str):
+        """Persist the index, writing to a temporary file first."""
+        data = {
+            'documents': self.documents,
+            'postings': self.postings,
+            'doc_lengths': self.doc_lengths,
+            'k1': self.k1,
+            'b': self.b,
+        }
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    def score(self, terms: List[str]) -> Dict[int, float]:
+        """Return BM25 scores for every document containing at least one term."""
+        scores = defaultdict(float)
+        for term in set(terms):
+            for doc_index, frequency in self.postings.get(term, ()):
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_index] / self.avg_doc_length
+                scores[doc_index] += self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return scores
+
+    def search(self, query: str, n_results: int) -> List[Tuple[int, float]]:
+        """Return (document index, score) pairs for the best lexical matches."""
+        scores = self.score(tokenize(query))
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def confident_search(self, query: str, n_results: int, min_known_ratio: float = 0.6,
+                         min_margin: float = 1.2) -> Optional[List[str]]:
+        """Return lexical results only when the query is an unambiguous exact lookup.
+
+        The query must have at least two indexed terms making up most of its
+        content, the top document must contain all of them, and it must clearly
+        outscore the runner-up.
+        """
+        terms = set(tokenize(query))
+        known_terms = {term for term in terms if term in self.postings}
+        if len(known_terms) < 2 or len(known_terms) / len(terms) < min_known_ratio:
+            return None
+
+        ranked = self.search(query, max(n_results, 2))
+        top_index, top_score = ranked[0]
+        if any(top_index not in {doc for doc, _ in self.postings[term]} for term in known_terms):
+            return None
+        if len(ranked) > 1 and top_score < min_margin * ranked[1][1]:
+            return None
+
+        return [self.documents[doc_index] for doc_index, _ in ranked[:n_results]]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], n_results: int, k: int = 60) -> List[str]:
+    """Fuse several ranked document lists, rewarding documents ranked highly by any of them."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            scores[document] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:n_results]
+
+
+class HybridRetriever(Retriever):
+    """Fuses a vector retriever with BM25 using reciprocal rank fusion."""
+
+    def __init__(self, vector_retriever: Retriever, bm25_index: BM25Index):
+        self.vector_retriever = vector_retriever
+        self.bm25_index = bm25_index
+        self.metadata = vector_retriever.metadata
+
+    def search(self, query: str, query_embedding: List[float], n_results: int) -> List[str]:
+        # Over-fetch from both sides so fusion has candidates to reorder
+        candidates = n_results * 2
+        vector_docs = self.vector_retriever.search(query, query_embedding, candidates)
+        lexical_docs = [self.bm25_index.documents[i] for i, _ in self.bm25_index.search(query, candidates)]
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], n_results)
+
+    def lexical_search(self, query: str, n_results: int) -> Optional[List[str]]:
+        return self.bm25_index.confident_search(query, n_results)
+
+    def keyword_search(self, query: str, n_results: int) -> List[str]:
+        return [self.bm25_index.documents[i] for i, _ in self.bm25_index.search(query, n_results)]
+
+
+def export_bm25_index(collection, path: str):
+    """Build and persist the BM25 index for a Chroma collection's documents."""
+    documents = collection.get(include=['documents'])['documents']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    BM25Index.build(documents).save(path)
+
+
+def export_numpy_index(collection, index_dir: str):
+    """Write a Chroma collection's embeddings and documents out as a NumPy index."""
+    data = collection.get(include=['embeddings', 'documents'])
+
+    embeddings = np.asarray(data['embeddings'], dtype=np.float32)
+    if embeddings.size:
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+
+    os.makedirs(index_dir, exist_ok=True)
+
+    # Write each file under a temporary name, then rename it into place
+    embeddings_path = os.path.join(index_dir, 'embeddings.npy')
+    with open(f"{embeddings_path}.tmp", 'wb') as f:
+        np.save(f, embeddings)
+    os.replace(f"{embeddings_path}.tmp", embeddings_path)
+
+    for filename, payload in (('documents.json', data['documents']), ('meta.json', collection.metadata or {})):
+        path = os.path.join(index_dir, filename)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(payload, f)
+        os.replace(f"{path}.tmp", path)
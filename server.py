@@ -0,0 +1,144 @@
+"""
+HTTP API for the Tohin concierge chatbot
+Serves JSON and Server-Sent Events chat endpoints over ASGI so the chatbot can
+run behind a load balancer with several worker processes:
+
+    uvicorn server:app --host 0.0.0.0 --port 8000 --workers 4
+
+Every worker memory-maps the same read-only NumPy index exported by
+ingest.py, so the operating system keeps one copy of the vectors in its page
+cache no matter how many workers run.
+"""
+
+import os
+import json
+import uuid
+import logging
+import argparse
+from contextlib import asynccontextmanager
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from app import NapaValleyConciergeChatbot
+from tracing import iterate_in_context
+
+logger = logging.getLogger(__name__)
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+
+class ChatResponse(BaseModel):
+    response: str
+    session_id: str
+
+
+def configure_server_defaults():
+    """Prefer settings that suit several worker processes, unless .env says otherwise.
+
+    .env.example leaves these keys unset, so a copied template keeps the
+    server defaults; a .env copied from an older template may still set them.
+    """
+    load_dotenv()
+
+    # Workers share the memory-mapped index instead of each opening Chroma
+    os.environ.setdefault('RETRIEVER_BACKEND', 'numpy')
+    if os.environ['RETRIEVER_BACKEND'].lower() != 'numpy':
+        logger.warning(f"RETRIEVER_BACKEND={os.environ['RETRIEVER_BACKEND']} from the environment or .env; "
+                       f"every worker will open its own Chroma client instead of sharing the NumPy index")
+    # Concurrent requests in a worker share embedding calls
+    os.environ.setdefault('EMBEDDING_BATCHING', 'true')
+    # Metrics are served by /metrics; a per-worker port would collide
+    os.environ.pop('METRICS_PORT', None)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_server_defaults()
+    app.state.chatbot = NapaValleyConciergeChatbot(warm_up=True)
+    yield
+    await app.state.chatbot.aclose()
+
+
+app = FastAPI(title="Tohin - Napa Valley Wine Concierge", lifespan=lifespan)
+
+
+def get_chatbot() -> NapaValleyConciergeChatbot:
+    return app.state.chatbot
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest) -> ChatResponse:
+    """Answer one message; pass the returned session_id back to continue the conversation."""
+    session_id = request.session_id or uuid.uuid4().hex
+    response = await get_chatbot().achat(request.message, session_id=session_id)
+    return ChatResponse(response=response, session_id=session_id)
+
+
+@app.post("/chat/stream")
+def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """Stream the answer as Server-Sent Events: one "data" event per chunk, then a "done" event."""
+    session_id = request.session_id or uuid.uuid4().hex
+    chatbot = get_chatbot()
+
+    def events() -> Iterator[str]:
+        # Starlette iterates sync generators on its thread pool, off the event loop, in a new context per
+        # step; keep the whole stream in one so its trace and deadline hold until the last chunk
+        stream = iterate_in_context(chatbot.chat_stream(request.message, session_id=session_id))
+        for chunk in stream:
+            yield sse_event({'text': chunk})
+        yield sse_event({'session_id': session_id}, event='done')
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Session-Id': session_id}
+    )
+
+
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str) -> dict:
+    """Forget a conversation's memory."""
+    get_chatbot().end_session(session_id)
+    return {'session_id': session_id, 'ended': True}
+
+
+@app.get("/health")
+def health() -> dict:
+    """Report liveness and which backends have finished warming up."""
+    return {'status': 'ok', 'worker_pid': os.getpid(), 'backends': get_chatbot().backend_status()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> str:
+    """Per-stage latency histograms for this worker in Prometheus text format."""
+    return get_chatbot().tracer.render_prometheus()
+
+
+def main():
+    """Run the API server with uvicorn."""
+    parser = argparse.ArgumentParser(description="Serve the Tohin chatbot over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (default: 1)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,15 @@ def test_chatbot():
                 traceback.print_exc()
                 print()
         
+        print("3. Testing streaming response...")
+        try:
+            chunks = list(bot.chat_stream("What are your tasting room hours?"))
+            print(f"✅ Received {len(chunks)} chunks: {''.join(chunks)}\n")
+        except Exception as e:
+            print(f"❌ Error while streaming: {e}")
+            traceback.print_exc()
+            print()
+        
         print("=== All tests completed ===")
         
     except Exception as e:
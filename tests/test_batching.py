@@ -0,0 +1,170 @@
+"""
+Tests for micro-batching and single-flight request coalescing
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher, SingleFlight
+
+
+class RecordingBatchFn:
+    """Batch function that records every batch it is given."""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.fail_on in items:
+            raise RuntimeError(f"bad item {self.fail_on}")
+        return [item * 10 for item in items]
+
+
+def test_batch_flushes_when_full():
+    batch_fn = RecordingBatchFn()
+    # A wait far longer than the test would take if the batch only flushed on timeout
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=10000)
+
+    futures = [batcher.submit(item) for item in (1, 2, 3)]
+
+    assert [future.result(timeout=2) for future in futures] == [10, 20, 30]
+    assert batch_fn.batches == [[1, 2, 3]]
+
+
+def test_batch_flushes_after_max_wait():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=32, max_wait_ms=20)
+
+    started = time.monotonic()
+    futures = [batcher.submit(item) for item in (1, 2)]
+
+    assert [future.result(timeout=2) for future in futures] == [10, 20]
+    assert time.monotonic() - started < 1.0
+    assert batch_fn.batches == [[1, 2]]
+
+
+def test_duplicate_items_are_processed_once():
+    batch_fn = RecordingBatchFn()
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=10000)
+
+    futures = [batcher.submit(item) for item in (7, 7, 8)]
+
+    assert [future.result(timeout=2) for future in futures] == [70, 70, 80]
+    assert batch_fn.batches == [[7, 8]]
+    assert batcher.stats()['items'] == 3
+
+
+def test_batch_error_reaches_every_item():
+    batcher = MicroBatcher(RecordingBatchFn(fail_on=2), max_batch_size=2, max_wait_ms=10000)
+
+    futures = [batcher.submit(item) for item in (1, 2)]
+
+    for future in futures:
+        with pytest.raises(RuntimeError, match="bad item 2"):
+            future.result(timeout=2)
+
+
+def test_wrong_result_count_fails_the_batch():
+    batcher = MicroBatcher(lambda items: [], max_batch_size=1, max_wait_ms=10000)
+
+    with pytest.raises(ValueError, match="0 results for 1 items"):
+        batcher.submit(1).result(timeout=2)
+
+
+def start_leader(single_flight, key, fn):
+    """Run fn as the leader for key in a thread, returning once it holds the key."""
+    outcome = {}
+
+    def lead():
+        try:
+            outcome['result'] = single_flight.do(key, fn)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    while single_flight.stats()['in_flight'] == 0:
+        time.sleep(0.001)
+    return thread, outcome
+
+
+def test_followers_share_the_leaders_result():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    leader, outcome = start_leader(single_flight, 'key', lambda: release.wait() and 'answer')
+
+    follower, _ = single_flight.join('key')
+    release.set()
+    leader.join()
+
+    assert outcome['result'] == ('answer', False)
+    assert follower.result(timeout=2) == 'answer'
+    assert single_flight.stats()['coalesced'] == 1
+
+
+def test_leader_error_reaches_followers():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait()
+        raise RuntimeError("upstream down")
+
+    leader, outcome = start_leader(single_flight, 'key', fail)
+    follower, is_leader = single_flight.join('key')
+    release.set()
+    leader.join()
+
+    assert not is_leader
+    assert isinstance(outcome['error'], RuntimeError)
+    with pytest.raises(RuntimeError, match="upstream down"):
+        follower.result(timeout=2)
+
+
+@pytest.mark.parametrize('fn', [lambda: 'answer', lambda: 1 / 0])
+def test_key_is_released_after_completion(fn):
+    single_flight = SingleFlight()
+    try:
+        single_flight.do('key', fn)
+    except ZeroDivisionError:
+        pass
+
+    assert single_flight.stats()['in_flight'] == 0
+    _, is_leader = single_flight.join('key')
+    assert is_leader
+
+
+def test_follower_runs_alone_when_the_leader_is_stuck():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    leader, _ = start_leader(single_flight, 'key', lambda: release.wait() and 'leader')
+
+    try:
+        assert single_flight.do('key', lambda: 'alone', timeout=0.05) == ('alone', False)
+        assert single_flight.stats()['timed_out'] == 1
+    finally:
+        release.set()
+        leader.join()
+
+
+def test_async_leader_error_reaches_followers():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(single_flight.ado('key', fail), single_flight.ado('key', fail),
+                                    return_exceptions=True)
+
+    errors = asyncio.run(run())
+
+    assert [str(error) for error in errors] == ["upstream down"] * 2
+    assert single_flight.stats() == {'leaders': 1, 'coalesced': 1, 'coalesced_rate': 0.5, 'timed_out': 0,
+                                     'in_flight': 0}
@@ -0,0 +1,283 @@
+"""
+Tests for the response, embedding and lookup caches, driven by a fake clock
+"""
+
+import threading
+import time
+
+import pytest
+
+from cache import EmbeddingCache, SemanticCache, StaleWhileRevalidateCache, TTLCache
+from config import EMBEDDING_MODEL
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class CountingLoader:
+    """Loader that returns a new numbered value per call, optionally failing or waiting to be released."""
+
+    def __init__(self, fail=False, release=None):
+        self.calls = 0
+        self.fail = fail
+        self.release = release
+
+    def __call__(self):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait()
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return f"value {self.calls}"
+
+
+def wait_for_refreshes(cache, count):
+    """Block until count background refreshes have finished, successfully or not."""
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        stats = cache.stats()
+        if stats['refreshes'] + stats['refresh_errors'] >= count:
+            return
+        time.sleep(0.001)
+    raise AssertionError(f"expected {count} refreshes, got {cache.stats()}")
+
+
+# TTL cache
+
+def test_ttl_cache_entries_expire(clock):
+    cache = TTLCache(ttl_seconds=600, clock=clock)
+    cache.set('napa', 'sunny')
+
+    clock.advance(599.9)
+    assert cache.get('napa') == 'sunny'
+    clock.advance(0.1)
+    assert cache.get('napa', 'missing') == 'missing'
+    assert len(cache) == 0
+
+
+def test_ttl_cache_without_a_ttl_keeps_entries(clock):
+    cache = TTLCache(ttl_seconds=None, clock=clock)
+    cache.set('napa', 'sunny')
+
+    clock.advance(10 ** 9)
+    assert cache.get('napa') == 'sunny'
+
+
+def test_ttl_cache_evicts_the_least_recently_used_entry(clock):
+    cache = TTLCache(ttl_seconds=600, max_entries=2, clock=clock)
+    cache.set('napa', 'sunny')
+    cache.set('sonoma', 'foggy')
+    cache.get('napa')
+
+    cache.set('calistoga', 'hot')
+
+    assert cache.get('sonoma') is None
+    assert (cache.get('napa'), cache.get('calistoga')) == ('sunny', 'hot')
+    assert cache.stats()['evictions'] == 1
+
+
+# Embedding cache
+
+QUERY = 'retrieval_query'
+
+
+def test_embedding_cache_normalizes_case_and_spacing(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'))
+    cache.put(EMBEDDING_MODEL, "What are your hours?", QUERY, [0.5, 0.25])
+
+    assert cache.get(EMBEDDING_MODEL, "  what are  YOUR hours?\n", QUERY) == [0.5, 0.25]
+
+
+def test_embedding_cache_is_keyed_by_model_and_task(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'))
+    cache.put(EMBEDDING_MODEL, "What are your hours?", QUERY, [0.5, 0.25])
+
+    assert cache.get('models/gemini-embedding-001', "What are your hours?", QUERY) is None
+    assert cache.get(EMBEDDING_MODEL, "What are your hours?", 'retrieval_document') is None
+
+
+def test_embedding_cache_computes_each_embedding_once(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [0.5, 0.25]
+
+    for text in ("What are your hours?", "what are your hours?"):
+        assert cache.get_or_compute(EMBEDDING_MODEL, text, QUERY, compute) == [0.5, 0.25]
+    assert len(calls) == 1
+
+
+def test_embedding_cache_survives_a_restart(tmp_path):
+    EmbeddingCache(str(tmp_path / 'embeddings.db')).put(EMBEDDING_MODEL, "What are your hours?", QUERY, [0.5, 0.25])
+
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'))
+    assert cache.get(EMBEDDING_MODEL, "What are your hours?", QUERY) == [0.5, 0.25]
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_embedding_cache_trims_the_disk_store(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'embeddings.db'), max_memory_entries=1, max_disk_entries=2)
+    for n in range(3):
+        cache.put(EMBEDDING_MODEL, f"query {n}", QUERY, [float(n)])
+
+    assert cache.stats()['disk_size'] == 2
+    assert cache.get(EMBEDDING_MODEL, "query 2", QUERY) == [2.0]
+
+
+# Semantic response cache
+
+class IndexVersion:
+    """Stands in for the knowledge base version that changes on each re-ingest."""
+
+    def __init__(self):
+        self.version = 'v1'
+
+    def __call__(self) -> str:
+        return self.version
+
+
+def semantic_cache(tmp_path, clock, version_fn=None):
+    return SemanticCache(str(tmp_path / 'responses.db'), threshold=0.9, ttl_seconds=3600,
+                         version_fn=version_fn, clock=clock)
+
+
+def test_semantic_cache_matches_queries_above_the_threshold(tmp_path, clock):
+    cache = semantic_cache(tmp_path, clock)
+    cache.put([1.0, 0.0], 'hours', "We're open 10 to 5.")
+
+    # cos = 0.95 and 0.8 against the stored query
+    assert cache.get([0.95, 0.3122], 'hours') == "We're open 10 to 5."
+    assert cache.get([0.8, 0.6], 'hours') is None
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_semantic_cache_is_scoped_by_intent(tmp_path, clock):
+    cache = semantic_cache(tmp_path, clock)
+    cache.put([1.0, 0.0], 'hours', "We're open 10 to 5.")
+    cache.put([1.0, 0.0], 'wine', "Try the Cabernet.")
+
+    assert cache.get([1.0, 0.0], 'wine') == "Try the Cabernet."
+    assert cache.get([1.0, 0.0], 'tours') is None
+
+
+def test_semantic_cache_entries_expire(tmp_path, clock):
+    cache = semantic_cache(tmp_path, clock)
+    cache.put([1.0, 0.0], 'hours', "We're open 10 to 5.")
+
+    clock.advance(3601)
+    assert cache.get([1.0, 0.0], 'hours') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_semantic_cache_survives_a_restart(tmp_path, clock):
+    semantic_cache(tmp_path, clock).put([1.0, 0.0], 'hours', "We're open 10 to 5.")
+    assert semantic_cache(tmp_path, clock).get([1.0, 0.0], 'hours') == "We're open 10 to 5."
+
+
+def test_semantic_cache_is_dropped_after_a_re_ingest(tmp_path, clock):
+    version = IndexVersion()
+    cache = semantic_cache(tmp_path, clock, version_fn=version)
+    cache.put([1.0, 0.0], 'hours', "We're open 10 to 5.")
+
+    version.version = 'v2'
+    assert cache.get([1.0, 0.0], 'hours') is None
+    assert cache.stats()['size'] == 0
+
+
+def test_semantic_cache_built_on_an_old_index_is_dropped_on_restart(tmp_path, clock):
+    version = IndexVersion()
+    semantic_cache(tmp_path, clock, version_fn=version).put([1.0, 0.0], 'hours', "We're open 10 to 5.")
+
+    version.version = 'v2'
+    assert semantic_cache(tmp_path, clock, version_fn=version).get([1.0, 0.0], 'hours') is None
+
+
+# Stale-while-revalidate
+
+def swr_cache(clock):
+    return StaleWhileRevalidateCache(soft_ttl_seconds=60, hard_ttl_seconds=600, clock=clock)
+
+
+def test_swr_serves_fresh_entries_without_reloading(clock):
+    cache = swr_cache(clock)
+    loader = CountingLoader()
+
+    assert cache.get('napa', loader) == ('value 1', 'miss')
+    clock.advance(59.9)
+    assert cache.get('napa', loader) == ('value 1', 'fresh')
+    assert loader.calls == 1
+
+
+def test_swr_serves_stale_entries_while_they_refresh(clock):
+    cache = swr_cache(clock)
+    loader = CountingLoader()
+    cache.get('napa', loader)
+
+    clock.advance(60)
+    assert cache.get('napa', loader) == ('value 1', 'stale')
+    wait_for_refreshes(cache, 1)
+
+    assert cache.get('napa', loader) == ('value 2', 'fresh')
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_swr_reloads_inline_past_the_hard_ttl(clock):
+    cache = swr_cache(clock)
+    loader = CountingLoader()
+    cache.get('napa', loader)
+
+    clock.advance(600)
+    assert cache.get('napa', loader) == ('value 2', 'miss')
+    assert cache.stats()['refreshes'] == 0
+
+
+def test_swr_runs_one_refresh_per_key_at_a_time(clock):
+    cache = swr_cache(clock)
+    cache.set('napa', 'old')
+    clock.advance(60)
+    release = threading.Event()
+    loader = CountingLoader(release=release)
+
+    try:
+        for _ in range(5):
+            assert cache.get('napa', loader) == ('old', 'stale')
+        assert cache.stats()['refreshing'] == 1
+    finally:
+        release.set()
+    wait_for_refreshes(cache, 1)
+
+    assert loader.calls == 1
+    assert cache.get('napa', loader) == ('value 1', 'fresh')
+
+
+def test_swr_keeps_serving_stale_when_the_refresh_fails(clock):
+    cache = swr_cache(clock)
+    cache.set('napa', 'old')
+    clock.advance(60)
+    loader = CountingLoader(fail=True)
+
+    assert cache.get('napa', loader) == ('old', 'stale')
+    wait_for_refreshes(cache, 1)
+
+    # The failed refresh leaves the entry stale, so the next lookup tries again
+    assert cache.get('napa', loader) == ('old', 'stale')
+    wait_for_refreshes(cache, 2)
+    assert cache.stats()['refresh_errors'] == 2
+    assert loader.calls == 2
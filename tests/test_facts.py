@@ -0,0 +1,69 @@
+"""
+Tests for answering business lookups from extracted facts
+"""
+
+import os
+
+import pytest
+
+from facts import FactIndex, extract_facts
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def facts():
+    with open(os.path.join(REPO_DIR, 'data', 'business_info.txt'), 'r') as f:
+        return extract_facts(f.read())
+
+
+@pytest.fixture(scope='module')
+def index(facts):
+    return FactIndex(facts)
+
+
+def test_extracts_priced_items_hours_and_club(facts):
+    assert [(wine['name'], wine['price']) for wine in facts['wines']][0] == ('Cabernet Sauvignon Reserve 2019', 85.0)
+    assert facts['tastings'][0]['unit'] == 'per person'
+    assert (facts['hours']['opens'], facts['hours']['closes']) == ('10:00 AM', '5:00 PM')
+    assert [tier['name'] for tier in facts['club']['tiers']] == ['Gold', 'Platinum', 'Diamond']
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("What are your hours?", "We're open daily from 10:00 AM to 5:00 PM."),
+    ("When do you open?", "We're open daily from 10:00 AM to 5:00 PM."),
+    ("What are your hours today?", "We're open daily from 10:00 AM to 5:00 PM."),
+    ("What's your phone number?", "(707) 555-WINE"),
+    ("Where are you located?", "1234 Silverado Trail"),
+    ("What's your website?", "www.napavalleypremiumwines.com"),
+    ("What are the wine club tiers?", "Gold ($200/quarter)"),
+    ("How much is the Chardonnay?", "Chardonnay Estate 2021 - $45."),
+    ("How much is the pinot noir?", "Pinot Noir Russian River 2020 - $65."),
+    ("How much is a bottle of merlot?", "Merlot Napa Valley 2019 - $55."),
+    ("How much does the classic tasting cost?", "Classic Tasting - $25 per person."),
+    ("What does a private tour cost per person?", "Private Tours - $150 per person"),
+])
+def test_lookups_are_answered(index, query, expected):
+    answer = index.answer(query)
+    assert answer is not None and expected in answer
+
+
+@pytest.mark.parametrize('query', [
+    # Wines are priced by the bottle, so other units must not get the bottle price
+    "How much is a glass of merlot?",
+    "How much is a case of merlot?",
+    # "Reserve" names both the Cabernet Sauvignon Reserve and the Reserve Tasting
+    "How much is the reserve?",
+    # Only part of the question is a lookup
+    "What are your hours and can I bring my dog?",
+    "Which wine pairs with salmon?",
+    "Tell me about the Chardonnay",
+    "hello",
+])
+def test_anything_more_than_a_lookup_is_declined(index, query):
+    assert index.answer(query) is None
+
+
+def test_index_without_facts_declines_everything(tmp_path):
+    index = FactIndex.load(str(tmp_path / 'missing.json'))
+    assert index.answer("What are your hours?") is None
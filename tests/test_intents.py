@@ -0,0 +1,54 @@
+"""
+Tests for the keyword intent classifier
+"""
+
+import os
+
+import pytest
+
+from intents import IntentClassifier
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return IntentClassifier.load(os.path.join(REPO_DIR, 'intent_keywords.json'))
+
+
+def matched(classifier, query):
+    return {intent for intent, score in classifier.keyword_scores(query).items() if score > 0}
+
+
+def test_weather_for_a_wine_tour_fetches_weather(classifier):
+    assert {'weather', 'business'} <= matched(classifier, "is it raining for our wine tour today?")
+
+
+@pytest.mark.parametrize('query', [
+    "Will it be rainy tomorrow?",
+    "Is it getting hotter this afternoon?",
+    "Is Saturday warmer than Friday?",
+    "What was forecasted for the weekend?",
+    "Any forecasts for Sunday?",
+])
+def test_inflected_keywords_match(classifier, query):
+    assert 'weather' in matched(classifier, query)
+
+
+@pytest.mark.parametrize('query', [
+    "Can I take a photo in the cellar?",
+    "Is there a hotel nearby?",
+])
+def test_keywords_match_whole_words_only(classifier, query):
+    assert 'weather' not in matched(classifier, query)
+
+
+def test_phrases_count_once():
+    classifier = IntentClassifier({'business': ['tasting', 'tasting note']})
+    assert classifier.keyword_scores("send me your tasting notes")['business'] == 1.0
+
+
+def test_keyword_hits_report_the_matched_words(classifier):
+    hits = classifier.keyword_hits("What are your hours today?")
+    assert hits['news'] == ['today']
+    assert hits['weather'] == []
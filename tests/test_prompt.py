@@ -0,0 +1,70 @@
+"""
+Tests for prompt assembly: chunk deduplication and context budgets
+"""
+
+from memory import estimate_tokens
+from prompt import PromptBuilder, dedupe_chunks, strip_overlap, trim_to_budget
+
+HOURS = "Open daily: 10:00 AM - 5:00 PM"
+RESERVATIONS = "Reservations recommended, especially on weekends."
+
+
+def test_overlap_with_the_previous_chunk_is_stripped():
+    previous = f"Our tasting room welcomes guests.\n{HOURS}"
+    chunk = f"{HOURS}\n{RESERVATIONS}"
+
+    assert strip_overlap(previous, chunk) == RESERVATIONS
+
+
+def test_short_coincidental_overlap_is_kept():
+    assert strip_overlap("We pour wine", "wine tastings daily") == "wine tastings daily"
+
+
+def test_lines_repeated_in_higher_ranked_chunks_are_dropped():
+    chunks = [
+        f"HOURS & RESERVATIONS\n{HOURS}",
+        f"WINE CLUB\n{HOURS}\nJoin our exclusive wine club.",
+        HOURS,
+    ]
+
+    assert dedupe_chunks(chunks) == [
+        f"HOURS & RESERVATIONS\n{HOURS}",
+        "WINE CLUB\nJoin our exclusive wine club.",
+    ]
+
+
+def test_repeats_are_matched_ignoring_case_and_spacing():
+    chunks = [HOURS, HOURS.upper().replace(' ', '  ')]
+    assert dedupe_chunks(chunks) == [HOURS]
+
+
+def test_text_within_budget_is_untouched():
+    text = f"{HOURS}\n{RESERVATIONS}"
+    assert trim_to_budget(text, estimate_tokens(text)) == text
+
+
+def test_trimming_stops_at_a_line_boundary():
+    text = "\n".join([HOURS, RESERVATIONS, "Private group experiences available by appointment."])
+
+    trimmed = trim_to_budget(text, estimate_tokens(f"{HOURS}\n{RESERVATIONS}\n"))
+
+    assert trimmed == f"{HOURS}\n{RESERVATIONS}"
+
+
+def test_a_single_long_line_is_cut_at_a_word():
+    line = " ".join(["cabernet"] * 100)
+
+    trimmed = trim_to_budget(line, 10)
+
+    assert estimate_tokens(trimmed) <= 10
+    assert trimmed.split(" ") == ["cabernet"] * len(trimmed.split(" "))
+
+
+def test_compressed_context_fits_the_intent_budget():
+    builder = PromptBuilder(budgets={'business': 20})
+    chunks = [f"Item {n}: " + "full-bodied red with notes of cassis " * 3 for n in range(5)]
+
+    context = builder.compress_chunks(chunks, 'business')
+
+    assert context.startswith("Item 0:")
+    assert estimate_tokens(context) <= 20
@@ -0,0 +1,376 @@
+"""
+Tests for circuit breakers, deadlines and request hedging, driven by a fake clock
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN, Bulkhead, BulkheadFull, CallerDeadlineExceeded, CircuitBreaker, CircuitOpenError,
+    Deadline, DeadlineExceeded, HedgeBudget, Hedger, caller_deadline, current_deadline, deadline_scope,
+    run_with_timeout, stage_timeout
+)
+
+
+class FakeClock:
+    """A monotonic clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def fail():
+    raise RuntimeError("upstream down")
+
+
+def breaker_after_failures(clock, failures=5):
+    breaker = CircuitBreaker('test', failure_threshold=0.5, min_calls=5, open_seconds=30.0, clock=clock)
+    for _ in range(failures):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    return breaker
+
+
+def test_breaker_stays_closed_below_min_calls(clock):
+    breaker = breaker_after_failures(clock, failures=4)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_stays_closed_below_failure_threshold(clock):
+    breaker = CircuitBreaker('test', failure_threshold=0.5, min_calls=5, clock=clock)
+    for succeeds in (True, True, True, False, False, True):
+        if succeeds:
+            breaker.call(lambda: None)
+        else:
+            with pytest.raises(RuntimeError):
+                breaker.call(fail)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_opens_and_rejects_without_calling(clock):
+    breaker = breaker_after_failures(clock)
+    calls = []
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_breaker_half_opens_after_cool_down_and_closes_on_success(clock):
+    breaker = breaker_after_failures(clock)
+
+    clock.advance(29.9)
+    assert breaker.state == OPEN
+    clock.advance(0.1)
+    assert breaker.state == HALF_OPEN
+
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_breaker_lets_one_probe_through_while_half_open(clock):
+    breaker = breaker_after_failures(clock)
+    clock.advance(30.0)
+
+    breaker.acquire()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.release()
+    breaker.acquire()
+
+
+def test_failed_probe_reopens_for_another_cool_down(clock):
+    breaker = breaker_after_failures(clock)
+    clock.advance(30.0)
+
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+
+    assert breaker.state == OPEN
+    clock.advance(29.9)
+    assert breaker.state == OPEN
+    clock.advance(0.1)
+    assert breaker.state == HALF_OPEN
+    assert breaker.stats()['opened'] == 2
+
+
+def test_saturated_bulkhead_does_not_open_the_breaker(clock):
+    breaker = CircuitBreaker('test', failure_threshold=0.5, min_calls=5, clock=clock)
+    bulkhead = Bulkhead('test', max_workers=1, max_queued=0)
+    release = threading.Event()
+    try:
+        busy = breaker.call(lambda: bulkhead.submit(release.wait))
+        for _ in range(10):
+            with pytest.raises(BulkheadFull):
+                breaker.call(lambda: run_with_timeout(bulkhead, lambda: 'ok', timeout=1.0))
+    finally:
+        release.set()
+        busy.result(timeout=2)
+        bulkhead.shutdown()
+
+    assert breaker.state == CLOSED
+    assert breaker.stats()['failures'] == 0
+    assert bulkhead.stats()['rejected'] == 10
+
+
+def test_queued_call_that_times_out_frees_its_slot():
+    bulkhead = Bulkhead('test', max_workers=1, max_queued=1)
+    release = threading.Event()
+    try:
+        busy = bulkhead.submit(release.wait)
+        with pytest.raises(DeadlineExceeded):
+            run_with_timeout(bulkhead, lambda: 'queued', timeout=0.01)
+
+        queued = bulkhead.submit(lambda: 'next')
+        with pytest.raises(BulkheadFull):
+            bulkhead.submit(lambda: 'refused')
+    finally:
+        release.set()
+    assert queued.result(timeout=2) == 'next'
+    assert busy.result(timeout=2) is True
+    bulkhead.shutdown()
+
+
+def test_rejections_while_half_open_give_the_probe_back(clock):
+    breaker = breaker_after_failures(clock)
+    clock.advance(30.0)
+
+    with pytest.raises(BulkheadFull):
+        with breaker.guard():
+            raise BulkheadFull("full")
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_timeouts_cut_short_by_the_request_deadline_are_not_failures(clock, executor):
+    breaker = CircuitBreaker('test', failure_threshold=0.5, min_calls=5, clock=clock)
+    release = threading.Event()
+
+    def attempt():
+        # The request only had 0.01s left of a call that may take 20s
+        with caller_deadline(0.01, 20.0):
+            return run_with_timeout(executor, release.wait, timeout=0.01)
+
+    try:
+        for _ in range(5):
+            with pytest.raises(CallerDeadlineExceeded):
+                breaker.call(attempt)
+    finally:
+        release.set()
+
+    assert breaker.state == CLOSED
+
+
+def test_timeouts_at_the_dependencys_own_limit_are_failures(clock, executor):
+    breaker = CircuitBreaker('test', failure_threshold=0.5, min_calls=5, clock=clock)
+    release = threading.Event()
+
+    def attempt():
+        with caller_deadline(0.01, 0.01):
+            return run_with_timeout(executor, release.wait, timeout=0.01)
+
+    try:
+        for _ in range(5):
+            with pytest.raises(DeadlineExceeded) as raised:
+                breaker.call(attempt)
+            assert not isinstance(raised.value, CallerDeadlineExceeded)
+    finally:
+        release.set()
+
+    assert breaker.state == OPEN
+
+
+def test_deadline_counts_down_with_the_clock(clock):
+    deadline = Deadline(2.0, clock=clock)
+
+    assert deadline.remaining() == 2.0
+    clock.advance(1.5)
+    assert deadline.remaining() == 0.5
+    assert not deadline.expired()
+    clock.advance(1.0)
+    assert deadline.remaining() == 0.0
+    assert deadline.expired()
+
+
+def test_deadline_scope_never_extends_the_outer_deadline():
+    assert current_deadline() is None
+    with deadline_scope(1.0) as outer:
+        with deadline_scope(60.0) as inner:
+            assert inner.seconds <= 1.0
+            assert current_deadline() is inner
+        with deadline_scope(None) as unchanged:
+            assert unchanged is outer
+        assert current_deadline() is outer
+    assert current_deadline() is None
+
+
+def test_stage_timeout_takes_its_share_of_the_time_left():
+    assert stage_timeout(5.0) == 5.0
+    with deadline_scope(10.0):
+        assert 3.9 < stage_timeout(None, share=0.4) <= 4.0
+        assert stage_timeout(2.0, share=0.4) == 2.0
+
+
+def test_run_with_timeout_returns_the_result(executor):
+    assert run_with_timeout(executor, lambda: 'ok', timeout=1.0) == 'ok'
+
+
+def test_run_with_timeout_raises_the_calls_error(executor):
+    with pytest.raises(RuntimeError, match="upstream down"):
+        run_with_timeout(executor, fail, timeout=1.0)
+
+
+def test_run_with_timeout_gives_up_on_a_hung_call(executor):
+    release = threading.Event()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            run_with_timeout(executor, release.wait, timeout=0.05)
+    finally:
+        release.set()
+
+
+def test_hedge_budget_refills_per_call_and_denies_when_spent():
+    budget = HedgeBudget(max_rate=0.25, burst=2.0)
+
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    for _ in range(3):
+        budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+    assert budget.stats() == {'max_rate': 0.25, 'calls': 4, 'hedges': 3, 'denied': 2, 'hedge_rate': 0.75}
+
+
+def test_hedge_budget_caps_tokens_at_burst():
+    budget = HedgeBudget(max_rate=1.0, burst=2.0)
+    for _ in range(10):
+        budget.deposit()
+
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+
+
+def warmed_hedger(clock, budget=None, samples=20, latency=0.01):
+    hedger = Hedger('test', budget or HedgeBudget(max_rate=1.0, burst=5.0), percentile=0.95, min_delay=0.01,
+                    min_samples=20, clock=clock)
+    for _ in range(samples):
+        hedger.observe(latency)
+    return hedger
+
+
+class SlowFirstAttempt:
+    """Upstream whose first attempt hangs until released and whose later attempts answer at once."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.attempts += 1
+            attempt = self.attempts
+        if attempt == 1:
+            self.release.wait()
+            return 'primary'
+        return 'backup'
+
+
+def test_hedger_waits_for_enough_samples(clock):
+    hedger = warmed_hedger(clock, samples=19)
+    assert hedger.delay() is None
+    hedger.observe(0.01)
+    assert hedger.delay() == pytest.approx(0.01)
+
+
+def test_hedger_uses_the_percentile_latency(clock):
+    hedger = warmed_hedger(clock, latency=0.2)
+    assert hedger.delay() == pytest.approx(0.2)
+
+
+def test_hedger_sends_a_backup_when_the_first_attempt_is_slow(clock, executor):
+    hedger = warmed_hedger(clock)
+    upstream = SlowFirstAttempt()
+    try:
+        assert hedger.call(executor, upstream) == 'backup'
+    finally:
+        upstream.release.set()
+
+    stats = hedger.stats()
+    assert (stats['calls'], stats['hedges'], stats['hedge_wins']) == (1, 1, 1)
+
+
+def test_hedger_does_not_hedge_without_budget(clock, executor):
+    hedger = warmed_hedger(clock, budget=HedgeBudget(max_rate=0.0, burst=0.0))
+    upstream = SlowFirstAttempt()
+    threading.Timer(0.1, upstream.release.set).start()
+
+    assert hedger.call(executor, upstream) == 'primary'
+    assert upstream.attempts == 1
+    assert hedger.budget.stats()['denied'] == 1
+
+
+def test_hedger_does_not_hedge_fast_calls(clock, executor):
+    hedger = warmed_hedger(clock, latency=5.0)
+
+    assert hedger.call(executor, lambda: 'fast') == 'fast'
+    assert hedger.stats()['hedges'] == 0
+
+
+def test_hedger_skips_a_backup_that_could_not_beat_the_timeout(clock, executor):
+    hedger = warmed_hedger(clock, latency=5.0)
+    upstream = SlowFirstAttempt()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            hedger.call(executor, upstream, timeout=0.05)
+    finally:
+        upstream.release.set()
+    assert upstream.attempts == 1
+
+
+def test_hedger_raises_when_every_attempt_fails(clock, executor):
+    hedger = warmed_hedger(clock)
+    with pytest.raises(RuntimeError, match="upstream down"):
+        hedger.call(executor, fail)
+
+
+def test_hedger_measures_successful_first_attempts_only(clock, executor):
+    hedger = Hedger('test', HedgeBudget(), min_samples=1, clock=clock)
+
+    def slow_by_the_clock():
+        clock.advance(0.3)
+        return 'ok'
+
+    hedger.call(executor, slow_by_the_clock)
+    with pytest.raises(RuntimeError):
+        hedger.call(executor, fail)
+    # Attempts are measured from a done callback, which may still be running on the worker
+    executor.shutdown(wait=True)
+
+    assert hedger.delay() == pytest.approx(0.3)
@@ -0,0 +1,61 @@
+"""
+Tests for carrying a request's context across the steps of a stream
+"""
+
+import contextvars
+
+from tracing import iterate_in_context
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def stream():
+    """Sets a context variable on its first step, as chat_stream() enters its trace and deadline."""
+    token = request_id.set('abc')
+    try:
+        for _ in range(3):
+            yield request_id.get()
+    finally:
+        try:
+            request_id.reset(token)
+        except ValueError:
+            # Finished in a different context than it started in
+            pass
+
+
+def step_like_starlette(iterator):
+    """Advance iterator with each step in a fresh copy of the context, as Starlette's thread pool does."""
+    items = []
+    while True:
+        try:
+            items.append(contextvars.copy_context().run(next, iterator))
+        except StopIteration:
+            return items
+
+
+def test_a_fresh_context_per_step_loses_what_the_first_step_set():
+    assert step_like_starlette(stream()) == ['abc', None, None]
+
+
+def test_context_set_by_the_first_step_holds_for_every_step():
+    assert step_like_starlette(iterate_in_context(stream())) == ['abc', 'abc', 'abc']
+    assert request_id.get() is None
+
+
+def test_closing_early_closes_the_stream_in_its_context():
+    closed = []
+
+    def tracked():
+        token = request_id.set('abc')
+        try:
+            yield 'first'
+            yield 'second'
+        finally:
+            closed.append(request_id.get())
+            request_id.reset(token)
+
+    events = iterate_in_context(tracked())
+    assert contextvars.copy_context().run(next, events) == 'first'
+    contextvars.copy_context().run(events.close)
+
+    assert closed == ['abc']
@@ -0,0 +1,280 @@
+"""
+Latency tracing for the Tohin concierge chatbot
+Each chat turn is recorded as a trace of timed stage spans (classify, embed,
+retrieve, weather, news, generate, ...). Finished traces are appended to a
+JSONL file and every span feeds a per-stage latency histogram that can be
+scraped in Prometheus text format.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Quantiles reported per stage
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Trace of the chat turn running in the current thread or task
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('tohin_trace', default=None)
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a window of recent samples for percentiles."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 2048):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, quantile: float) -> float:
+        """Return the given quantile of recent samples (nearest rank)."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(quantile * len(ordered))) - 1))
+        return ordered[index]
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        """Attach an attribute such as a cache-hit flag."""
+        self.attributes[key] = value
+
+
+class Trace:
+    """All spans recorded while handling one chat turn."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.timestamp = time.time()
+        self.started_at = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span):
+        # Spans can finish concurrently on the context fetch pool
+        with self._lock:
+            self.spans.append(span)
+
+    def to_record(self, duration: float) -> Dict[str, Any]:
+        with self._lock:
+            spans = [
+                {
+                    'name': span.name,
+                    'offset_ms': round((span.started_at - self.started_at) * 1000, 3),
+                    'duration_ms': round(span.duration * 1000, 3),
+                    'attributes': span.attributes,
+                    **({'error': span.error} if span.error else {}),
+                }
+                for span in sorted(self.spans, key=lambda span: span.started_at)
+            ]
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'timestamp': self.timestamp,
+            'duration_ms': round(duration * 1000, 3),
+            'attributes': self.attributes,
+            'spans': spans,
+        }
+
+
+class Tracer:
+    """Records traces and per-stage latency histograms.
+
+    trace_path=None disables the JSONL file; histograms are always kept. The
+    file is rotated to "<path>.1" once it grows past max_file_bytes.
+    """
+
+    def __init__(self, trace_path: Optional[str] = None, max_file_bytes: int = 10 * 1024 * 1024,
+                 buckets=DEFAULT_BUCKETS):
+        self.trace_path = trace_path
+        self.max_file_bytes = max_file_bytes
+        self.buckets = buckets
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self.metrics_server = None
+
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+
+    @contextmanager
+    def trace(self, name: str, **attributes) -> Iterator[Trace]:
+        """Trace one chat turn; spans opened inside it, in any thread or task it spawns, are attached."""
+        current = Trace(name, attributes)
+        token = _current_trace.set(current)
+        try:
+            yield current
+        finally:
+            duration = time.perf_counter() - current.started_at
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # A streaming generator closed from a different context
+                pass
+            self.observe(name, duration)
+            self._write(current.to_record(duration))
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time one stage and attach it to the current trace, if any."""
+        span = Span(name, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.started_at
+            self.observe(name, span.duration)
+            current = _current_trace.get()
+            if current is not None:
+                current.add_span(span)
+
+    @staticmethod
+    def annotate(**attributes):
+        """Attach attributes such as intents or cache hits to the current trace."""
+        current = _current_trace.get()
+        if current is not None:
+            current.attributes.update(attributes)
+
+    def observe(self, stage: str, seconds: float):
+        """Record a latency sample for a stage."""
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def _write(self, record: Dict[str, Any]):
+        if not self.trace_path:
+            return
+
+        line = json.dumps(record, default=str) + "\n"
+        with self._file_lock:
+            try:
+                if os.path.exists(self.trace_path) and os.path.getsize(self.trace_path) > self.max_file_bytes:
+                    os.replace(self.trace_path, f"{self.trace_path}.1")
+                with open(self.trace_path, 'a') as f:
+                    f.write(line)
+            except OSError:
+                # Tracing must never break a chat turn
+                pass
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return count, mean and p50/p95/p99 latency in milliseconds per stage."""
+        with self._lock:
+            return {
+                stage: {
+                    'count': histogram.count,
+                    'mean_ms': histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                    **{f"p{int(q * 100)}_ms": histogram.percentile(q) * 1000 for q in QUANTILES},
+                }
+                for stage, histogram in sorted(self.histograms.items())
+            }
+
+    def render_prometheus(self) -> str:
+        """Render stage histograms and recent-sample quantiles in Prometheus text format."""
+        lines = [
+            "# HELP tohin_stage_duration_seconds Time spent in each chat pipeline stage.",
+            "# TYPE tohin_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            for stage, histogram in histograms:
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f'tohin_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'tohin_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'tohin_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'tohin_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append("# HELP tohin_stage_latency_seconds Latency quantiles over recent samples per stage.")
+            lines.append("# TYPE tohin_stage_latency_seconds summary")
+            for stage, histogram in histograms:
+                for q in QUANTILES:
+                    lines.append(
+                        f'tohin_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {histogram.percentile(q):.6f}'
+                    )
+                lines.append(f'tohin_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'tohin_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port: int, host: str = '127.0.0.1'):
+        """Serve /metrics from a background thread."""
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = tracer.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.metrics_server.serve_forever, name='metrics', daemon=True).start()
+        return self.metrics_server
+
+
+def in_context(fn):
+    """Bind fn to a copy of the caller's context so spans it records in a worker thread join the caller's trace."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def iterate_in_context(iterator: Iterator[Any]) -> Iterator[Any]:
+    """Advance iterator inside one copied context throughout.
+
+    Starlette steps a sync generator on its thread pool in a fresh copy of the
+    request's context each time, which would drop the trace and deadline a
+    generator like chat_stream() enters on its first step.
+    """
+    context = contextvars.copy_context()
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            context.run(close)